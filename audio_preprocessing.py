@@ -0,0 +1,160 @@
+from functools import lru_cache
+from math import gcd
+
+import numpy as np
+
+# --- Microphone pre-processing for speech recognition ---
+# Browsers record at 44.1/48 kHz, sometimes in stereo or as float samples,
+# with silence before and after the user speaks. Azure recognizes 16 kHz mono
+# just as well, so recordings are downmixed, resampled with a polyphase FIR
+# filter and trimmed with a frame-energy VAD before upload. That is 3-6x fewer
+# bytes to send and to recognize.
+
+STT_SAMPLE_RATE = 16000
+
+RESAMPLER_ZERO_CROSSINGS = 10  # Filter half-length, in zero crossings of the sinc at the lower rate
+RESAMPLER_KAISER_BETA = 6.0  # About 60 dB of stopband attenuation
+RESAMPLER_CHUNK_SAMPLES = 16384  # Output samples computed per vectorized block, bounds the temporary matrix
+
+VAD_FRAME_SECONDS = 0.02
+VAD_ABSOLUTE_FLOOR_DB = -55.0  # Frames quieter than this (dBFS) are always silence
+VAD_NOISE_MARGIN_DB = 10.0  # Speech is at least this much louder than the noise floor...
+VAD_PEAK_RANGE_DB = 25.0  # ...but the threshold never gets closer than this to the loudest frame
+VAD_PADDING_SECONDS = 0.2  # Kept around the detected speech so word onsets and endings are not clipped
+
+
+def to_float_mono(audio_data):
+    """Converts any Gradio microphone array (int or float, mono or channels-last) to float32 mono in [-1, 1]."""
+    samples = np.asarray(audio_data)
+    if np.issubdtype(samples.dtype, np.integer):
+        info = np.iinfo(samples.dtype)
+        # Unsigned formats are offset by half their range
+        offset = (int(info.max) + 1) // 2 if info.min == 0 else 0
+        scale = 1.0 / max(int(info.max) + 1 - offset, 1)
+        samples = (samples.astype(np.float32) - offset) * np.float32(scale)
+    else:
+        samples = samples.astype(np.float32, copy=False)
+    if samples.ndim == 2:
+        samples = samples.mean(axis=1, dtype=np.float32)
+    return samples
+
+
+def to_int16_pcm(samples):
+    return (np.clip(samples, -1.0, 1.0) * 32767.0).astype(np.int16)
+
+
+@lru_cache(maxsize=16)
+def _polyphase_filter(up, down):
+    """Kaiser-windowed sinc low-pass for resampling by up/down, split into `up` phases."""
+    max_factor = max(up, down)
+    half_length = RESAMPLER_ZERO_CROSSINGS * max_factor
+    taps = np.arange(-half_length, half_length + 1, dtype=np.float64)
+    cutoff = 1.0 / max_factor  # Nyquist of the lower of the two rates, relative to the upsampled rate
+    prototype = cutoff * np.sinc(cutoff * taps) * np.kaiser(len(taps), RESAMPLER_KAISER_BETA) * up
+    # Pad to whole phases: phases[p, m] = prototype[p + m * up]
+    taps_per_phase = -(-len(prototype) // up)
+    padded = np.zeros(taps_per_phase * up)
+    padded[:len(prototype)] = prototype
+    return padded.reshape(taps_per_phase, up).T.astype(np.float32), half_length
+
+
+class Resampler:
+    """
+    Streaming polyphase resampler. Keeps enough input history between calls that chunked
+    input produces exactly the same output as one long call.
+    """
+
+    def __init__(self, from_rate, to_rate):
+        divisor = gcd(from_rate, to_rate)
+        self.up, self.down = to_rate // divisor, from_rate // divisor
+        self.phases, self.delay = _polyphase_filter(self.up, self.down)
+        self.taps_per_phase = self.phases.shape[1]
+        history_length = self.taps_per_phase - 1
+        self._history = np.zeros(history_length, dtype=np.float32)
+        self._history_start = -history_length  # Input index of _history[0]
+        self._next_output = 0
+
+    def process(self, samples):
+        if self.up == self.down:
+            return np.asarray(samples, dtype=np.float32)
+        buffer = np.concatenate((self._history, np.asarray(samples, dtype=np.float32)))
+        last_input = self._history_start + len(buffer) - 1
+        # Output n needs input up to (n * down) // up; the filter only looks backwards
+        end_output = ((last_input + 1) * self.up - 1) // self.down + 1
+        output = np.empty(max(end_output - self._next_output, 0), dtype=np.float32)
+        offsets = np.arange(self.taps_per_phase)
+        for block_start in range(0, len(output), RESAMPLER_CHUNK_SAMPLES):
+            n = np.arange(self._next_output + block_start,
+                          min(self._next_output + block_start + RESAMPLER_CHUNK_SAMPLES, end_output))
+            upsampled_position = n * self.down
+            base = upsampled_position // self.up - self._history_start
+            window = buffer[base[:, None] - offsets[None, :]]
+            output[block_start:block_start + len(n)] = np.einsum(
+                "ij,ij->i", self.phases[upsampled_position % self.up], window
+            )
+        self._next_output = max(end_output, self._next_output)
+
+        keep = self.taps_per_phase - 1
+        if keep:
+            self._history = buffer[-keep:]
+            self._history_start = last_input - keep + 1
+        else:
+            self._history = buffer[:0]
+            self._history_start = last_input + 1
+        return output
+
+
+def resample(samples, from_rate, to_rate):
+    """One-shot resampling, with the filter's delay removed so the output lines up with the input."""
+    if from_rate == to_rate:
+        return np.asarray(samples, dtype=np.float32)
+    resampler = Resampler(from_rate, to_rate)
+    # The filter delay is `delay` samples at the upsampled rate; flush it with trailing zeros
+    delay_out = resampler.delay // resampler.down
+    flush = np.zeros(-(-resampler.delay // resampler.up) + 1, dtype=np.float32)
+    output = np.concatenate((resampler.process(samples), resampler.process(flush)))
+    expected = len(samples) * to_rate // from_rate
+    return output[delay_out:delay_out + expected]
+
+
+def trim_silence(samples, sample_rate):
+    """
+    Cuts leading and trailing silence, found with a frame-energy VAD. Returns an empty array
+    if no frame looks like speech. Pauses inside the utterance are kept.
+    """
+    frame_length = int(sample_rate * VAD_FRAME_SECONDS)
+    frame_count = len(samples) // frame_length
+    if frame_count == 0:
+        return samples
+    frames = samples[:frame_count * frame_length].reshape(frame_count, frame_length)
+    energy_db = 10 * np.log10(np.mean(frames * frames, axis=1) + 1e-12)
+    noise_floor_db = np.percentile(energy_db, 10)
+    threshold_db = max(
+        VAD_ABSOLUTE_FLOOR_DB, min(noise_floor_db + VAD_NOISE_MARGIN_DB, energy_db.max() - VAD_PEAK_RANGE_DB)
+    )
+    voiced = np.flatnonzero(energy_db > threshold_db)
+    if len(voiced) == 0:
+        return samples[:0]
+    padding = int(VAD_PADDING_SECONDS * sample_rate)
+    start = max(voiced[0] * frame_length - padding, 0)
+    end = min((voiced[-1] + 1) * frame_length + padding, len(samples))
+    return samples[start:end]
+
+
+def preprocess_recording(audio_data, sample_rate, target_rate=STT_SAMPLE_RATE, trim=True):
+    """A whole microphone recording -> int16 mono PCM at `target_rate`, with silence trimmed."""
+    samples = resample(to_float_mono(audio_data), sample_rate, target_rate)
+    if trim:
+        samples = trim_silence(samples, target_rate)
+    return to_int16_pcm(samples)
+
+
+class MicrophoneStreamPreprocessor:
+    """Per-utterance state for streamed microphone chunks: dtype, downmix and resampling (no trimming)."""
+
+    def __init__(self, sample_rate, target_rate=STT_SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self.resampler = Resampler(sample_rate, target_rate)
+
+    def process(self, audio_data):
+        return to_int16_pcm(self.resampler.process(to_float_mono(audio_data)))
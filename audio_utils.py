@@ -0,0 +1,120 @@
+import re
+import struct
+
+import numpy as np
+
+# --- Raw PCM audio handling ---
+# TTS is requested as headerless 16-bit mono PCM, so a reply made of several
+# segments (sentence chunks, a validation enhancement, the crisis message) is
+# a plain concatenation of samples. Segments are kept as memoryviews and
+# joined once, straight into the int16 array handed to Gradio.
+
+PCM_SAMPLE_WIDTH = 2  # Bytes per 16-bit sample
+_RAW_PCM_FORMAT = re.compile(r"^Raw(\d+)Khz16BitMonoPcm$")
+
+
+def pcm_sample_rate(output_format):
+    """Sample rate of an Azure raw PCM output format name, e.g. "Raw24Khz16BitMonoPcm" -> 24000."""
+    match = _RAW_PCM_FORMAT.match(output_format)
+    if match is None:
+        raise ValueError(f"'{output_format}' is not a 16-bit mono raw PCM output format")
+    return int(match.group(1)) * 1000
+
+
+def pcm_array(pcm):
+    """Zero-copy int16 view of PCM bytes. A trailing odd byte, if any, is ignored."""
+    return np.frombuffer(pcm, dtype=np.int16, count=len(pcm) // PCM_SAMPLE_WIDTH)
+
+
+def pcm_to_wav(pcm, sample_rate):
+    """
+    Wraps PCM in a WAV header, for outputs that need a self-describing file
+    (the streaming gr.Audio decodes each chunk on its own).
+    """
+    data_size = len(pcm) - len(pcm) % PCM_SAMPLE_WIDTH
+    header = struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + data_size, b"WAVE", b"fmt ", 16, 1, 1, sample_rate,
+        sample_rate * PCM_SAMPLE_WIDTH, PCM_SAMPLE_WIDTH, 8 * PCM_SAMPLE_WIDTH, b"data", data_size,
+    )
+    return b"".join((header, memoryview(pcm)[:data_size]))
+
+
+class PCMBuffer:
+    """Ordered PCM segments of one clip, joined only when the whole clip is needed."""
+
+    def __init__(self, sample_rate, *segments):
+        self.sample_rate = sample_rate
+        self._segments = []
+        self.num_bytes = 0
+        for segment in segments:
+            self.append(segment)
+
+    def append(self, segment):
+        """Adds a segment (bytes-like or another PCMBuffer); empty or missing segments are skipped."""
+        if isinstance(segment, PCMBuffer):
+            for view in segment._segments:
+                self.append(view)
+            return
+        if not segment:
+            return
+        view = memoryview(segment)
+        # Keep whole samples only, so one odd-sized segment can't shift every sample after it
+        view = view[:len(view) - len(view) % PCM_SAMPLE_WIDTH]
+        self._segments.append(view)
+        self.num_bytes += len(view)
+
+    def __bool__(self):
+        return self.num_bytes > 0
+
+    @property
+    def duration(self):
+        return self.num_bytes / PCM_SAMPLE_WIDTH / self.sample_rate
+
+    def to_array(self):
+        """One int16 array of the whole clip: a view for a single segment, otherwise one copy."""
+        if len(self._segments) == 1:
+            return pcm_array(self._segments[0])
+        samples = np.empty(self.num_bytes // PCM_SAMPLE_WIDTH, dtype=np.int16)
+        position = 0
+        for view in self._segments:
+            count = len(view) // PCM_SAMPLE_WIDTH
+            samples[position:position + count] = np.frombuffer(view, dtype=np.int16)
+            position += count
+        return samples
+
+    def to_gradio(self):
+        """(sample_rate, int16 array) for a gr.Audio output, or None if there is no audio."""
+        return (self.sample_rate, self.to_array()) if self else None
+
+
+def split_tail(pcm, seconds, sample_rate):
+    """(body, tail) views of a clip, the tail being its last `seconds`."""
+    view = memoryview(pcm)
+    tail_bytes = min(int(seconds * sample_rate) * PCM_SAMPLE_WIDTH, len(view) - len(view) % PCM_SAMPLE_WIDTH)
+    split_at = len(view) - len(view) % PCM_SAMPLE_WIDTH - tail_bytes
+    return view[:split_at], view[split_at:split_at + tail_bytes]
+
+
+def fade_out(pcm):
+    """The clip with a linear fade to silence over its whole length."""
+    samples = pcm_array(pcm).astype(np.float32)
+    samples *= np.linspace(1.0, 0.0, len(samples), dtype=np.float32)
+    return samples.astype(np.int16).tobytes()
+
+
+def crossfade(tail, head):
+    """
+    Overlaps the end of one clip (`tail`) with the start of the next (`head`), with equal-power
+    gain curves so the loudness doesn't dip in the middle. Returns the blended clip.
+    """
+    tail_samples = pcm_array(tail).astype(np.float32)
+    head_samples = pcm_array(head) if head else np.zeros(0, dtype=np.int16)
+    overlap = len(tail_samples)
+    mixed = np.zeros(max(overlap, len(head_samples)), dtype=np.float32)
+    ramp = np.linspace(0.0, np.pi / 2, overlap, dtype=np.float32)
+    mixed[:overlap] = tail_samples * np.cos(ramp)
+    blend_length = min(overlap, len(head_samples))
+    mixed[:blend_length] += head_samples[:blend_length] * np.sin(ramp[:blend_length])
+    mixed[overlap:] = head_samples[overlap:]
+    return np.clip(mixed, -32768, 32767).astype(np.int16).tobytes()
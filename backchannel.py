@@ -0,0 +1,99 @@
+import random
+import re
+import threading
+
+from crisis_detector import normalize_arabic
+
+# --- Backchannel acknowledgments ---
+# Between the final transcript and the first reply audio the user would hear
+# several seconds of silence, which in a voice-only support chat sounds like
+# nobody is listening. A short acknowledgment ("إيه، فاهمتك…") is played right
+# away instead. Phrases are synthesized once at startup and kept here, so
+# playing one never waits on TTS. Which phrase is used depends on the language
+# of the transcript and on a rough reading of what the user said.
+
+ARABIC = "ar"
+ENGLISH = "en"
+
+DEFAULT = "default"  # Plain acknowledgment
+DISTRESS = "distress"  # The user describes a difficult feeling
+QUESTION = "question"  # The user asked something
+
+BACKCHANNEL_PHRASES = {
+    (ARABIC, DEFAULT): ["إيه، فاهمتك…", "أسمعك…", "إيه نعم…", "زين، فهمت عليك…"],
+    (ARABIC, DISTRESS): ["خذ راحتك…", "الله يعينك، أنا معك…", "أفهم إحساسك…"],
+    (ARABIC, QUESTION): ["سؤال حلو، خلني أفكر…", "طيب، خلني أشوف…"],
+    (ENGLISH, DEFAULT): ["Mm-hmm, I hear you…", "I see…"],
+    (ENGLISH, DISTRESS): ["Take your time…", "I'm here with you…"],
+    (ENGLISH, QUESTION): ["Good question, let me think…"],
+}
+
+# Written in normalized form (see crisis_detector.normalize_arabic)
+DISTRESS_WORDS = frozenset([
+    "تعبان", "تعبانه", "تعب", "حزين", "حزينه", "زعلان", "زعلانه", "قلق", "قلقان", "خايف", "خايفه",
+    "متضايق", "متضايقه", "ضايق", "ضيقه", "وحيد", "وحيده", "مكتئب", "مكتئبه", "ابكي", "تعبت",
+    "tired", "sad", "anxious", "worried", "scared", "lonely", "depressed", "upset", "stressed",
+])
+QUESTION_WORDS = frozenset(["ليش", "كيف", "شو", "متى", "وين", "هل", "why", "how", "what", "when", "where"])
+
+_ARABIC_LETTERS = re.compile(r"[ء-ي]")
+
+
+def classify_utterance(text):
+    """(language, context) of a transcript, for picking a phrase."""
+    language = ARABIC if _ARABIC_LETTERS.search(text) else ENGLISH
+    words = normalize_arabic(text).split()
+    if DISTRESS_WORDS.intersection(words):
+        return language, DISTRESS
+    if text.rstrip().endswith(("?", "؟")) or (words and words[0] in QUESTION_WORDS):
+        return language, QUESTION
+    return language, DEFAULT
+
+
+class BackchannelBank:
+    """
+    Pre-synthesized acknowledgments. `load` fills the bank (at startup); `select` never
+    synthesizes, it only returns what is already loaded.
+    """
+
+    def __init__(self, phrases=BACKCHANNEL_PHRASES, rng=None):
+        self.phrases = phrases
+        self.rng = rng or random.Random()
+        self._audio = {}  # phrase -> PCM bytes
+        self._last_used = None  # Avoids the same phrase twice in a row
+        self._lock = threading.Lock()
+        self._metrics = {"played": 0, "not_loaded": 0}
+
+    def all_phrases(self):
+        return [phrase for group in self.phrases.values() for phrase in group]
+
+    def load(self, synthesize):
+        """Synthesizes every phrase with `synthesize(text) -> PCM bytes or None`."""
+        for phrase in self.all_phrases():
+            audio_data = synthesize(phrase)
+            if audio_data:
+                with self._lock:
+                    self._audio[phrase] = audio_data
+        print(f"[Backchannel]: {len(self._audio)}/{len(self.all_phrases())} phrases ready.")
+
+    def select(self, user_text):
+        """Returns (phrase, audio) suited to the transcript, or None if no suitable phrase is loaded."""
+        language, context = classify_utterance(user_text)
+        with self._lock:
+            candidates = [
+                phrase for phrase in self.phrases.get((language, context)) or self.phrases[(language, DEFAULT)]
+                if phrase in self._audio
+            ]
+            if not candidates:
+                self._metrics["not_loaded"] += 1
+                return None
+            if len(candidates) > 1 and self._last_used in candidates:
+                candidates.remove(self._last_used)
+            phrase = self.rng.choice(candidates)
+            self._last_used = phrase
+            self._metrics["played"] += 1
+            return phrase, self._audio[phrase]
+
+    def metrics(self):
+        with self._lock:
+            return {**self._metrics, "loaded": len(self._audio)}
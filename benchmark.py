@@ -0,0 +1,310 @@
+import argparse
+import asyncio
+import os
+import random
+import resource
+import statistics
+import time
+import tracemalloc
+import types
+from contextlib import nullcontext, redirect_stdout
+
+import numpy as np
+
+from audio_preprocessing import STT_SAMPLE_RATE, Resampler, preprocess_recording, resample, to_float_mono
+from crisis_detector import CRISIS_PHRASES, HIGH, CrisisDetector
+
+# --- Offline benchmarks ---
+# Usage: python benchmark.py crisis [--iterations N]
+#        python benchmark.py load [--sessions N] [--turns M] [--streaming] ...
+#        python benchmark.py preprocess [--iterations N]
+
+# Everyday Omani utterances that must NOT trigger the crisis fast path.
+# Several contain near-misses such as "الموتر" (the car) or "قتلني الضحك".
+ROUTINE_UTTERANCES = [
+    "أهلاً سكينة، اليوم كان يوم طويل في الدوام",
+    "ركبت الموتر ورحت البحر مع العيال",
+    "قتلني الضحك من اخوي أمس",
+    "أحس بالقلق من الامتحانات الأسبوع الجاي",
+    "ما نمت زين البارحة، فكري مشغول",
+    "أمي تعبانة شوي وأنا خايف عليها",
+    "أبغى أتعلم كيف أرتاح قبل النوم",
+    "الشغل وايد ضغط وما عندي وقت لنفسي",
+    "تضايقت من صاحبي لأنه ما رد علي",
+    "I feel a bit stressed about work today",
+    "My brother killed it at the football match",
+    "I am dying to see my family this weekend",
+    "شو رايك أروح أتمشى شوي؟",
+    "الحمدلله أحسن من أمس",
+    "أبوي قال لي لازم أصبر",
+]
+
+# Frames for positive utterances; "{}" is replaced by a crisis phrase
+CRISIS_FRAMES = [
+    "{}",
+    "والله تعبت، {}",
+    "أحياناً أحس إني {} وما أعرف ليش",
+    "صار لي أسبوع {}",
+    "{} خلاص ما أقدر",
+    "honestly sometimes I {} and I don't know why",
+]
+
+# Spelling noise a real transcript can carry: hamza forms, diacritics and tatweel
+SPELLING_VARIANTS = [("ا", "أ"), ("ي", "ى"), ("ه", "ة"), ("ت", "تـ"), ("و", "وْ")]
+
+
+def _crisis_corpus(rng):
+    positives = []
+    for category, (severity, phrases) in CRISIS_PHRASES.items():
+        if severity != HIGH:
+            continue
+        for phrase in phrases:
+            noisy = phrase
+            plain, variant = rng.choice(SPELLING_VARIANTS)
+            noisy = noisy.replace(plain, variant, 1)
+            positives.append(rng.choice(CRISIS_FRAMES).format(noisy))
+    return positives, ROUTINE_UTTERANCES
+
+
+def benchmark_crisis(iterations):
+    rng = random.Random(7)
+
+    build_start = time.perf_counter()
+    detector = CrisisDetector()
+    build_seconds = time.perf_counter() - build_start
+
+    positives, negatives = _crisis_corpus(rng)
+    missed = [text for text in positives if not detector.is_emergency(text)]
+    false_alarms = [text for text in negatives if detector.is_emergency(text)]
+
+    corpus = positives + negatives
+    timings = []
+    for _ in range(iterations):
+        for text in corpus:
+            start = time.perf_counter()
+            detector.find(text)
+            timings.append(time.perf_counter() - start)
+    timings.sort()
+
+    def percentile(p):
+        return timings[min(len(timings) - 1, int(p / 100 * len(timings)))] * 1e6
+
+    print("--- CRISIS DETECTOR BENCHMARK ---")
+    print(f"automaton build: {build_seconds * 1000:.2f} ms")
+    print(f"corpus: {len(positives)} crisis utterances, {len(negatives)} routine utterances")
+    print(f"recall (high severity): {1 - len(missed) / len(positives):.3f}")
+    print(f"false alarms on routine utterances: {len(false_alarms)}")
+    for text in missed:
+        print(f"  MISSED: {text}")
+    for text in false_alarms:
+        print(f"  FALSE ALARM: {text}")
+    print(f"latency per utterance over {len(timings)} runs:")
+    print(f"  mean {statistics.mean(timings) * 1e6:.1f} us | p50 {percentile(50):.1f} us | "
+          f"p99 {percentile(99):.1f} us | max {timings[-1] * 1e6:.1f} us")
+    print("---------------------------------")
+
+
+def synthetic_recording(sample_rate=48000, channels=2, speech_seconds=3.0, silence_seconds=(0.8, 1.2), seed=7):
+    """
+    A browser-like microphone recording: int16, `channels` channels, leading and trailing room noise
+    around a voiced, amplitude-modulated harmonic signal standing in for speech.
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(speech_seconds * sample_rate)) / sample_rate
+    pitch = 140 + 30 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 12)) * (0.5 + 0.5 * np.sin(2 * np.pi * 4 * t) ** 2)
+    speech = 0.25 * voiced / np.abs(voiced).max()
+    lead, tail = (rng.normal(0, 0.002, int(seconds * sample_rate)) for seconds in silence_seconds)
+    mono = np.concatenate((lead, speech + rng.normal(0, 0.002, len(speech)), tail))
+    samples = (np.clip(mono, -1, 1) * 32767).astype(np.int16)
+    return np.repeat(samples[:, None], channels, axis=1) if channels > 1 else samples
+
+
+def benchmark_preprocess(iterations):
+    print("--- MICROPHONE PRE-PROCESSING BENCHMARK ---")
+    for sample_rate, channels in ((48000, 2), (48000, 1), (44100, 1), (16000, 1)):
+        recording = synthetic_recording(sample_rate, channels)
+        duration = len(recording) / sample_rate
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            pcm = preprocess_recording(recording, sample_rate)
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        print(f"{sample_rate} Hz x{channels}, {duration:.1f}s: {recording.nbytes / 1024:.0f} KB -> "
+              f"{pcm.nbytes / 1024:.0f} KB ({recording.nbytes / max(pcm.nbytes, 1):.1f}x fewer bytes), "
+              f"kept {len(pcm) / STT_SAMPLE_RATE:.2f}s | p50 {timings[len(timings) // 2] * 1000:.2f} ms "
+              f"({timings[len(timings) // 2] / duration * 1000:.2f} ms per audio second)")
+
+    # Resampler quality: a 1 kHz tone should come out clean, a 10 kHz tone should be filtered out
+    for sample_rate in (48000, 44100):
+        t = np.arange(sample_rate) / sample_rate
+        tone = resample(0.5 * np.sin(2 * np.pi * 1000 * t), sample_rate, STT_SAMPLE_RATE)[200:-200]
+        ideal = 0.5 * np.sin(2 * np.pi * 1000 * (np.arange(len(tone)) + 200) / STT_SAMPLE_RATE)
+        snr = 10 * np.log10(np.mean(ideal ** 2) / np.mean((tone - ideal) ** 2))
+        alias = resample(0.5 * np.sin(2 * np.pi * 10000 * t), sample_rate, STT_SAMPLE_RATE)[200:-200]
+        rejection = 20 * np.log10(0.5 / np.sqrt(2) / np.sqrt(np.mean(alias ** 2)))
+        print(f"resampler {sample_rate} -> {STT_SAMPLE_RATE}: 1 kHz SNR {snr:.1f} dB, 10 kHz rejection {rejection:.1f} dB")
+
+    # Streamed 0.2s chunks must cost about the same as one pass
+    recording = to_float_mono(synthetic_recording(48000, 1))
+    chunks = np.array_split(recording, len(recording) // 9600)
+    start = time.perf_counter()
+    resampler = Resampler(48000, STT_SAMPLE_RATE)
+    for chunk in chunks:
+        resampler.process(chunk)
+    print(f"streamed resampling: {(time.perf_counter() - start) / len(chunks) * 1000:.3f} ms per 0.2s chunk")
+    print("-------------------------------------------")
+
+
+def _percentiles(values):
+    values = sorted(values)
+    if not values:
+        return "no samples"
+    def at(p):
+        return values[min(len(values) - 1, int(p / 100 * len(values)))]
+    return f"p50 {at(50):.3f}s | p95 {at(95):.3f}s | p99 {at(99):.3f}s | max {values[-1]:.3f}s"
+
+
+async def _speak(chatbot, mic_input, request):
+    """Feeds the recording to the live transcriber in real time, as the browser does while recording."""
+    sample_rate, samples = mic_input
+    step = int(chatbot.STT_STREAM_EVERY_SECONDS * sample_rate)
+    for start in range(0, len(samples), step):
+        await chatbot.stream_microphone_chunk((sample_rate, samples[start:start + step]), request)
+        await asyncio.sleep(chatbot.STT_STREAM_EVERY_SECONDS)
+
+
+async def _simulate_session(chatbot, session_index, turns, streaming, stream_microphone, think_time,
+                            turn_latencies, first_audio_latencies):
+    request = types.SimpleNamespace(session_hash=f"load-{session_index:05d}")
+    chat_history = []
+    # A browser-like recording, so pre-processing runs as it would in production
+    mic_input = (48000, synthetic_recording(48000, 1, seed=session_index))
+    for _ in range(turns):
+        if stream_microphone:
+            await _speak(chatbot, mic_input, request)
+        # Latencies count from the end of the recording
+        start_time = time.perf_counter()
+        if streaming:
+            first_audio = None
+            async for chat_history, audio_chunk in chatbot.gradio_interface_streaming(mic_input, chat_history, request):
+                if audio_chunk and first_audio is None:
+                    first_audio = time.perf_counter() - start_time
+            if first_audio is not None:
+                first_audio_latencies.append(first_audio)
+        else:
+            chat_history, _ = await chatbot.gradio_interface(mic_input, chat_history, request)
+        turn_latencies.append(time.perf_counter() - start_time)
+        if think_time:
+            await asyncio.sleep(think_time)
+    await chatbot.end_session(request)
+
+
+async def _run_load(chatbot, sessions, turns, streaming, stream_microphone, think_time, turn_latencies,
+                    first_audio_latencies):
+    await asyncio.gather(*(
+        _simulate_session(chatbot, i, turns, streaming, stream_microphone, think_time, turn_latencies,
+                          first_audio_latencies)
+        for i in range(sessions)
+    ))
+
+
+def benchmark_load(sessions, turns, streaming, latency_scale, failure_rate, think_time, seed, keep_tts_cache,
+                   backchannel, stream_microphone, speculation, trace_memory, verbose):
+    # Must be set before chatbot is imported, so no real client is ever configured
+    os.environ["PROVIDER_BACKEND"] = "fake"
+    from providers import create_fake_providers
+
+    with open(os.devnull, "w") as devnull, nullcontext() if verbose else redirect_stdout(devnull):
+        import chatbot
+    chatbot.install_providers(*create_fake_providers(latency_scale, failure_rate, seed=seed))
+    if backchannel:
+        # The app does this in render_fixed_phrases at startup
+        with open(os.devnull, "w") as devnull, nullcontext() if verbose else redirect_stdout(devnull):
+            chatbot.backchannel_bank.load(lambda text: asyncio.run(chatbot.synthesize_speech(text)))
+    else:
+        chatbot.BACKCHANNEL_ENABLED = False
+    chatbot.SPECULATIVE_REPLIES = speculation
+    if not keep_tts_cache:
+        # Canned replies repeat, so a warm cache would hide almost all synthesis work
+        chatbot.tts_cache.max_bytes = 0
+
+    turn_latencies, first_audio_latencies = [], []
+    if trace_memory:
+        tracemalloc.start()
+    start_time = time.perf_counter()
+    with open(os.devnull, "w") as devnull, nullcontext() if verbose else redirect_stdout(devnull):
+        asyncio.run(_run_load(chatbot, sessions, turns, streaming, stream_microphone, think_time, turn_latencies,
+                              first_audio_latencies))
+    elapsed = time.perf_counter() - start_time
+    traced_peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+    if trace_memory:
+        tracemalloc.stop()
+
+    snapshot = chatbot.telemetry.snapshot()
+    print("--- LOAD BENCHMARK (offline stand-ins) ---")
+    print(f"{sessions} sessions x {turns} turns, {'streaming' if streaming else 'batch'} handler, "
+          f"latency scale {latency_scale}, failure rate {failure_rate}"
+          + (f", live microphone, speculation {'on' if speculation else 'off'}" if stream_microphone else ""))
+    print(f"completed {len(turn_latencies)} turns in {elapsed:.2f}s -> {len(turn_latencies) / elapsed:.1f} turns/s")
+    print(f"end-to-end turn latency: {_percentiles(turn_latencies)}")
+    if streaming:
+        print(f"time to first audio:     {_percentiles(first_audio_latencies)}")
+    print("per-stage latency (from the app's histograms):")
+    for stage, stats in sorted(snapshot["stages"].items()):
+        print(f"  {stage:34s} n={stats['count']:<6d} p50 {stats['p50']:.3f}s | p95 {stats['p95']:.3f}s | "
+              f"p99 {stats['p99']:.3f}s | max {stats['max']:.3f}s")
+    print("counters:")
+    for name, value in sorted(snapshot["counters"].items()):
+        print(f"  {name}: {value}")
+    if stream_microphone and speculation:
+        print("speculative replies:", ", ".join(f"{k}={v}" for k, v in chatbot.speculator.metrics().items()))
+    print(f"peak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB")
+    if traced_peak is not None:
+        print(f"peak Python heap during the run: {traced_peak / 1024 / 1024:.1f} MB")
+    print("------------------------------------------")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the Sakina voice pipeline.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    crisis = subcommands.add_parser("crisis", help="Crisis detector accuracy and per-utterance latency")
+    crisis.add_argument("--iterations", type=int, default=200, help="Passes over the phrase corpus")
+
+    load = subcommands.add_parser("load", help="Concurrent simulated sessions against local provider stand-ins")
+    load.add_argument("--sessions", type=int, default=50, help="Concurrent simulated users")
+    load.add_argument("--turns", type=int, default=5, help="Turns per session")
+    load.add_argument("--streaming", action="store_true", help="Drive the streaming handler instead of the batch one")
+    load.add_argument("--latency-scale", type=float, default=1.0,
+                      help="Multiplier for the stand-ins' latencies (0 measures pure app overhead)")
+    load.add_argument("--failure-rate", type=float, default=0.0, help="Probability that any provider call fails")
+    load.add_argument("--think-time", type=float, default=0.0, help="Seconds each user waits between turns")
+    load.add_argument("--seed", type=int, default=7)
+    load.add_argument("--keep-tts-cache", action="store_true", help="Let repeated replies hit the TTS cache")
+    load.add_argument("--no-backchannel", action="store_true", help="Don't play acknowledgments (streaming only)")
+    load.add_argument("--stream-microphone", action="store_true",
+                      help="Stream each recording to the live transcriber in real time first (latencies count from its end)")
+    load.add_argument("--no-speculation", action="store_true",
+                      help="Don't start replies on interim transcripts (with --streaming --stream-microphone)")
+    load.add_argument("--trace-memory", action="store_true", help="Also report the tracemalloc peak (slower)")
+    load.add_argument("--verbose", action="store_true", help="Show the app's per-turn logs")
+
+    preprocess = subcommands.add_parser("preprocess", help="Microphone downmix/resample/trim cost and quality")
+    preprocess.add_argument("--iterations", type=int, default=50)
+
+    args = parser.parse_args()
+    if args.command == "crisis":
+        benchmark_crisis(args.iterations)
+    elif args.command == "load":
+        benchmark_load(args.sessions, args.turns, args.streaming, args.latency_scale, args.failure_rate,
+                       args.think_time, args.seed, args.keep_tts_cache, not args.no_backchannel, args.stream_microphone,
+                       not args.no_speculation, args.trace_memory, args.verbose)
+    elif args.command == "preprocess":
+        benchmark_preprocess(args.iterations)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,32 @@
 import os
-import openai
+import asyncio
 from dotenv import load_dotenv
-import azure.cognitiveservices.speech as speechsdk
 import time
-import anthropic
 from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 import gradio as gr
 import numpy as np
-import wavio # Used for handling audio data
+from session_store import SessionStore
+from session_backends import MEMORY, REDIS, SQLITE, create_session_backend
+from speech_pool import RecognizerConfigs, SynthesizerPool
+from streaming_stt import StreamingTranscriber
+from tts_cache import TTSCache
+from validation_policy import BLOCKING, DEFERRED, contains_risk_terms, create_validation_policy
+from crisis_detector import CrisisDetector
+from prompt_context import PromptCacheStats, build_anthropic_request
+from metrics import PROMETHEUS_CONTENT_TYPE, Telemetry
+from providers import FAKE, LIVE, LazyClient, LazyModule, create_fake_providers
+from audio_utils import PCMBuffer, crossfade, fade_out, pcm_sample_rate, pcm_to_wav, split_tail
+from audio_preprocessing import STT_SAMPLE_RATE, MicrophoneStreamPreprocessor, preprocess_recording
+from provider_router import AllProvidersFailed, ProviderRouter
+from rate_limiter import (CRISIS_FOLLOWUP, LIVE_REPLY, SUMMARY, VALIDATION, RateLimited, RateLimiter, retry_after_seconds,
+                          split_limits)
+from backchannel import BackchannelBank
+from startup import WarmUp
+from speculation import ABANDONED, CRISIS, RESTARTED, Speculator
+
+# The provider SDKs are imported on first use; PROVIDER_BACKEND=fake never needs them
+speechsdk = LazyModule("azure.cognitiveservices.speech")
 
 print("Loading chatbot...")
 
@@ -15,12 +34,55 @@ print("Loading chatbot...")
 
 # Load API keys and settings from the .env file
 load_dotenv()
-performance_log = []
 
-# OpenAI Configuration
-openai.api_key = os.getenv("OPENAI_API_KEY")
-client = openai.OpenAI()
-claude_client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+# Provider timeouts in seconds. Slow calls are abandoned instead of holding the turn.
+GPT_TIMEOUT_SECONDS = 10
+CLAUDE_TIMEOUT_SECONDS = 15
+SUMMARY_TIMEOUT_SECONDS = 30
+AZURE_SPEECH_TIMEOUT_SECONDS = 15
+PROVIDER_MAX_RETRIES = 1
+
+# Latency budget per turn. LLM calls on the critical path get whatever is left of it
+# (minus time kept back for TTS) instead of a fixed timeout each.
+TURN_LATENCY_BUDGET_SECONDS = 10.0
+TTS_RESERVE_SECONDS = 1.5
+MIN_PROVIDER_TIMEOUT_SECONDS = 2.0  # Even a late turn gives a call this long rather than fail it outright
+
+# Provider names used by the router (see provider_router.py)
+OPENAI = "openai"
+ANTHROPIC = "anthropic"
+
+GPT_MODEL = "gpt-4o"
+CLAUDE_MODEL = "claude-opus-4-20250514"
+
+# Instrumentation: Prometheus text is served at /metrics next to the Gradio app.
+# Set METRICS_TRACE_FILE to also append every finished turn to a JSONL file.
+METRICS_TRACE_FILE = os.getenv("METRICS_TRACE_FILE")
+SERVER_HOST = os.getenv("GRADIO_SERVER_NAME", "127.0.0.1")
+SERVER_PORT = int(os.getenv("GRADIO_SERVER_PORT", "7860"))
+WARM_UP_TIMEOUT_SECONDS = 20  # Per warm-up check attempt; /ready reports 503 until all checks pass
+
+# "live" uses OpenAI, Anthropic and Azure; "fake" uses the offline stand-ins in providers.py
+PROVIDER_BACKEND = os.getenv("PROVIDER_BACKEND", LIVE)
+
+# OpenAI Configuration (long-lived async clients shared by all sessions, created on first use)
+def create_openai_client():
+    import openai
+    return openai.AsyncOpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"), timeout=GPT_TIMEOUT_SECONDS, max_retries=PROVIDER_MAX_RETRIES
+    )
+
+def create_anthropic_client():
+    import anthropic
+    return anthropic.AsyncAnthropic(
+        api_key=os.getenv("ANTHROPIC_API_KEY"), timeout=CLAUDE_TIMEOUT_SECONDS, max_retries=PROVIDER_MAX_RETRIES
+    )
+
+client = LazyClient(create_openai_client)
+claude_client = LazyClient(create_anthropic_client)
+speech_stand_in = None  # A providers.FakeSpeech to use instead of Azure Speech
+if PROVIDER_BACKEND == FAKE:
+    client, claude_client, speech_stand_in = create_fake_providers()
 
 # Azure Speech Services Configuration
 AZURE_SPEECH_KEY = os.getenv("AZURE_SPEECH_KEY")
@@ -28,13 +90,73 @@ AZURE_SPEECH_REGION = os.getenv("AZURE_SPEECH_REGION")
 OMANI_ARABIC_LOCALE = "ar-OM"
 ENGLISH_US_LOCALE = "en-US"
 AZURE_TTS_VOICE_NAME = "ar-OM-AyshaNeural"
-
-# Audio settings
-SAMPLE_RATE = 16000  # 16kHz is standard for speech services
+# Name of a speechsdk.SpeechSynthesisOutputFormat member. Raw PCM has no header, so segments concatenate cleanly.
+AZURE_TTS_OUTPUT_FORMAT = "Raw24Khz16BitMonoPcm"
+TTS_SAMPLE_RATE = pcm_sample_rate(AZURE_TTS_OUTPUT_FORMAT)
+
+# The Azure Speech SDK only offers blocking futures; they are awaited on this shared pool
+AZURE_EXECUTOR_WORKERS = 64
+
+# Speech client pooling
+TTS_POOL_SIZE = 8  # Warm synthesizers shared by all sessions
+TTS_POOL_CHECKOUT_TIMEOUT = 5.0  # Seconds to wait for a free synthesizer
+
+# Shared rate limits per provider and model (see rate_limiter.py). Set them to the account's quotas;
+# with RATE_LIMIT_PROCESSES app processes on one account, each process enforces an equal share.
+OPENAI_LIMIT_KEY = f"{OPENAI}:{GPT_MODEL}"
+ANTHROPIC_LIMIT_KEY = f"{ANTHROPIC}:{CLAUDE_MODEL}"
+AZURE_TTS_LIMIT_KEY = "azure:tts"
+AZURE_STT_LIMIT_KEY = "azure:stt"
+PROVIDER_RATE_LIMITS = {
+    OPENAI_LIMIT_KEY: {"requests_per_minute": 5000, "tokens_per_minute": 800_000, "max_concurrency": 200},
+    ANTHROPIC_LIMIT_KEY: {"requests_per_minute": 2000, "tokens_per_minute": 200_000, "max_concurrency": 100},
+    AZURE_TTS_LIMIT_KEY: {"requests_per_minute": 12000, "max_concurrency": 200},
+    AZURE_STT_LIMIT_KEY: {"requests_per_minute": 6000, "max_concurrency": 100},
+}
+RATE_LIMIT_PROCESSES = int(os.getenv("RATE_LIMIT_PROCESSES", "1"))  # App processes using the same accounts
+
+# TTS audio cache
+TTS_CACHE_MAX_BYTES = 32 * 1024 * 1024  # In-memory LRU tier
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR")  # Optional on-disk copy of the fixed phrases only, survives restarts
+TTS_PRESYNTH_PHRASES_FILE = os.getenv("TTS_PRESYNTH_PHRASES_FILE")  # Optional extra phrases, one per line
 
 # Conversation Management Settings
-SUMMARY_TRIGGER_COUNT = 6
+PROMPT_TOKEN_BUDGET = 2500  # Estimated prompt tokens (system prompt included) before compaction starts
+CHARS_PER_TOKEN_ESTIMATE = 3.0  # Rough GPT-4o tokenizer ratio for mixed Arabic/English text
 RECENT_TURNS_TO_KEEP = 4
+SUMMARY_PREFIX = "ملخص المحادثة حتى الآن: "
+
+# Streaming Settings
+STREAMING_MODE = True  # Stream GPT-4o tokens into sentence-sized TTS chunks
+SENTENCE_BOUNDARIES = ".؟،!?\n"  # Arabic and English sentence/clause endings
+MIN_TTS_CHUNK_CHARS = 12  # Avoid sending tiny fragments (e.g. "طيب،") to TTS on their own
+STREAMING_STT = True  # Recognize speech while the user is still talking
+STT_STREAM_EVERY_SECONDS = 0.2  # How often the browser sends microphone chunks
+STT_FINAL_RESULT_TIMEOUT = 3.0  # Max wait for the last final result after recording stops
+SPECULATIVE_REPLIES = True  # Start the reply on a stable interim transcript while still recording (see speculation.py)
+SPECULATION_PAUSE_SECONDS = 0.4  # No new interim result for this long counts as a pause
+# Normalized edit distance up to which the final transcript keeps the speculative reply.
+# Kept low: an added negation ("ما") in a short sentence is already above it.
+SPECULATION_MAX_DISTANCE = 0.1
+BACKCHANNEL_ENABLED = True  # Play a short acknowledgment while the reply is generated (see backchannel.py)
+BACKCHANNEL_CROSSFADE_SECONDS = 0.15  # End of the acknowledgment that is blended into the first reply audio
+BACKCHANNEL_BLEND_MARGIN_SECONDS = 0.1  # The blended chunk must reach the browser before the acknowledgment ends
+
+# Validation policy for Claude Opus: "always", "sampled", "risk_gated" or "async".
+# Crisis-adjacent turns are always validated in full, whatever the mode.
+VALIDATION_MODE = "risk_gated"
+VALIDATION_SAMPLE_RATE = 0.2  # Fraction of routine turns validated in "sampled" mode
+
+# Session Settings
+MAX_SESSIONS = 1000  # Least recently used sessions are evicted beyond this
+SESSION_IDLE_TTL_SECONDS = 30 * 60
+SESSION_MAX_MESSAGES = 40  # Hard cap per session, on top of the rolling summary
+SESSION_MAX_BYTES = 64 * 1024
+# Where session state is persisted: "memory" (this process only), "sqlite" (processes on one host)
+# or "redis" (processes on any host). Needed to run more than one process or survive restarts.
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", MEMORY)
+SESSION_SQLITE_PATH = os.getenv("SESSION_SQLITE_PATH", "sessions.db")
+SESSION_REDIS_URL = os.getenv("SESSION_REDIS_URL", "redis://127.0.0.1:6379/0")
 
 SYSTEM_PROMPT = """
 
@@ -101,16 +223,106 @@ SYSTEM_PROMPT = """
 
 """
 
-# The initial state for the Gradio app
-INITIAL_HISTORY = [{"role": "system", "content": SYSTEM_PROMPT}]
+WELCOME_MESSAGE = "أهلاً بك، أنا سكينة. كيف أقدر أساعدك اليوم؟"
+FALLBACK_APOLOGY = "عذرًا، أواجه صعوبة فنية. هل يمكننا المحاولة مرة أخرى؟"
+NO_SPEECH_MESSAGE = "Sorry, I couldn't hear you. Please try again."
+CRISIS_HOTLINES_MESSAGE = (
+    "حياتك غالية ومهمة وايد. لو تفكر تأذي نفسك، كلم حد تثق فيه الحين، "
+    "واتصل بخط المساعدة النفسية على +968 24 607 555، أو الطوارئ على 9999، "
+    "أو مستشفى السلطان قابوس على 24144625."
+)
+# Added to the LLM context when the emergency message was already played by the crisis fast path
+CRISIS_FOLLOWUP_INSTRUCTION = (
+    "ملاحظة: المستخدم سمع للتو رسالة فيها أرقام الطوارئ. لا تكرري الأرقام. "
+    "تابعي معه بتعاطف عميق، واطمني على سلامته الحين، واطلبي منه يبقى مع ناس يثق فيهم."
+)
+
+# Phrases spoken verbatim, synthesized once at startup and served from the TTS cache
+TTS_PRESYNTH_PHRASES = [WELCOME_MESSAGE, FALLBACK_APOLOGY, NO_SPEECH_MESSAGE, CRISIS_HOTLINES_MESSAGE]
+if TTS_PRESYNTH_PHRASES_FILE:
+    with open(TTS_PRESYNTH_PHRASES_FILE, encoding="utf-8") as f:
+        TTS_PRESYNTH_PHRASES += [line.strip() for line in f if line.strip()]
+
+# The initial state for every new session (copied, never mutated)
+INITIAL_HISTORY = [
+    {"role": "system", "content": SYSTEM_PROMPT},
+    {"role": "assistant", "content": WELCOME_MESSAGE},
+]
+
+# Conversation state, one entry per Gradio session
+session_backend_options = {
+    MEMORY: {"max_entries": MAX_SESSIONS},
+    SQLITE: {"path": SESSION_SQLITE_PATH},
+    REDIS: {"url": SESSION_REDIS_URL},
+}.get(SESSION_BACKEND, {})
+sessions = SessionStore(
+    INITIAL_HISTORY, max_sessions=MAX_SESSIONS, idle_ttl_seconds=SESSION_IDLE_TTL_SECONDS,
+    max_messages=SESSION_MAX_MESSAGES, max_bytes=SESSION_MAX_BYTES,
+    backend=create_session_backend(
+        SESSION_BACKEND, ttl_seconds=SESSION_IDLE_TTL_SECONDS, **session_backend_options
+    )
+)
+
+def create_speech_config():
+    return speechsdk.SpeechConfig(subscription=AZURE_SPEECH_KEY, region=AZURE_SPEECH_REGION)
+
+def create_tts_speech_config():
+    speech_config = create_speech_config()
+    speech_config.speech_synthesis_voice_name = AZURE_TTS_VOICE_NAME
+    speech_config.set_speech_synthesis_output_format(
+        getattr(speechsdk.SpeechSynthesisOutputFormat, AZURE_TTS_OUTPUT_FORMAT)
+    )
+    return speech_config
+
+# Shared Azure Speech clients; connections are opened ahead of the first turn
+tts_pool = SynthesizerPool(
+    create_tts_speech_config, size=TTS_POOL_SIZE, checkout_timeout=TTS_POOL_CHECKOUT_TIMEOUT
+)
+stt_configs = RecognizerConfigs(create_speech_config, [OMANI_ARABIC_LOCALE, ENGLISH_US_LOCALE])
+tts_cache = TTSCache(max_bytes=TTS_CACHE_MAX_BYTES, disk_dir=TTS_CACHE_DIR)
+crisis_detector = CrisisDetector()
+backchannel_bank = BackchannelBank()
+
+def is_risky_text(text):
+    # Crisis phrases in the user's words, or hotline numbers/risk terms in the reply
+    return crisis_detector.is_risky(text) or contains_risk_terms(text)
+
+validation_policy = create_validation_policy(
+    VALIDATION_MODE, risk_scorer=is_risky_text,
+    **({"sample_rate": VALIDATION_SAMPLE_RATE} if VALIDATION_MODE == "sampled" else {})
+)
+prompt_cache_stats = PromptCacheStats()
+telemetry = Telemetry(trace_path=METRICS_TRACE_FILE)
+process_rate_limits = split_limits(PROVIDER_RATE_LIMITS, RATE_LIMIT_PROCESSES)
+# No more syntheses than pooled synthesizers, or the extra ones hold executor threads blocked in checkout
+process_rate_limits[AZURE_TTS_LIMIT_KEY]["max_concurrency"] = min(
+    process_rate_limits[AZURE_TTS_LIMIT_KEY]["max_concurrency"], TTS_POOL_SIZE
+)
+rate_limiter = RateLimiter(process_rate_limits, telemetry=telemetry)
+# A call shed by the rate limiter never reached the provider, so it doesn't count against its breaker
+router = ProviderRouter([OPENAI, ANTHROPIC], telemetry=telemetry, ignored_errors=(RateLimited,))
+summary_tasks = {}  # Gradio session hash -> background summarization task
+live_transcribers = {}  # Gradio session hash -> StreamingTranscriber for the utterance in progress
+live_preprocessors = {}  # Gradio session hash -> MicrophoneStreamPreprocessor for the same utterance
+shed_recordings = {}  # Gradio session hash -> (sample_rate, chunks) of an utterance streamed without a live transcriber
+speculations = {}  # Gradio session hash -> SpeculativeReply for the utterance in progress
+speculator = Speculator(
+    lambda messages: estimate_prompt_tokens(messages), chars_per_token=CHARS_PER_TOKEN_ESTIMATE,
+    pause_seconds=SPECULATION_PAUSE_SECONDS, max_distance=SPECULATION_MAX_DISTANCE, telemetry=telemetry
+)
+azure_executor = ThreadPoolExecutor(max_workers=AZURE_EXECUTOR_WORKERS, thread_name_prefix="azure-speech")
+
+def install_providers(openai_client, anthropic_client, speech=None):
+    """Swaps the provider backends, e.g. for stand-ins with a given latency profile (see benchmark.py)."""
+    global client, claude_client, speech_stand_in
+    client, claude_client, speech_stand_in = openai_client, anthropic_client, speech
 
 print("Chatbot loaded successfully!")
 
 
 # --- 2. CORE BOT LOGIC (Largely unchanged, handles text processing) ---
 
-def create_conversation_summary(previous_summary: str, new_messages_text: str) -> str:
-    # This function is unchanged
+async def create_conversation_summary(previous_summary: str, new_messages_text: str) -> str:
     summary_prompt = f"""
     أنت خبير في تلخيص محادثات الدعم النفسي. مهمتك هي إنشاء ملخص متكامل ومحدث.
     
@@ -135,82 +347,275 @@ def create_conversation_summary(previous_summary: str, new_messages_text: str) -
     الملخص المحدث:
     """
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o", messages=[{"role": "user", "content": summary_prompt}],
-            temperature=0.2, max_tokens=300
-        )
-        summary = response.choices[0].message.content.strip()
-        print(f"\n[SUMMARY UPDATED]: {summary}")
+        # Nobody waits on the summary, so it fails over without hedging
+        provider, summary = await router.call("summary", [
+            (OPENAI, lambda timeout: openai_completion(
+                [{"role": "user", "content": summary_prompt}], max_tokens=300, temperature=0.2, timeout=timeout,
+                priority=SUMMARY
+            )),
+            (ANTHROPIC, lambda timeout: anthropic_completion(
+                [], max_tokens=300, temperature=0.2, timeout=timeout, trailing_user_message=summary_prompt,
+                priority=SUMMARY
+            )),
+        ], deadline=time.monotonic() + SUMMARY_TIMEOUT_SECONDS, hedge=False)
+        print(f"\n[SUMMARY UPDATED ({provider})]: {summary}")
         return summary
-    except Exception as e:
+    except AllProvidersFailed as e:
+        # None (rather than the old summary) tells the caller to keep the unsummarized messages
         print(f"Error creating summary: {e}")
-        return previous_summary
+        return None
 
-def manage_conversation_history(conv_history, conv_summary, turns_since_summary):
-    # This function now takes state as arguments and returns updated state
-    turns_since_summary += 1
-    print(f"[History Check]: Turns since last summary: {turns_since_summary}")
+def estimate_prompt_tokens(conv_history):
+    # Cheap estimate; about 4 tokens of per-message overhead in the chat format
+    return int(sum(len(msg['content']) for msg in conv_history) / CHARS_PER_TOKEN_ESTIMATE) + 4 * len(conv_history)
+
+def build_summary_input(messages):
+    lines = []
+    for msg in messages:
+        if msg['role'] in ['user', 'assistant']:
+            role = "المستخدم" if msg['role'] == 'user' else "سكينة"
+            lines.append(f"{role}: {msg['content']}")
+    return "\n".join(lines)
+
+async def summarize_in_background(previous_summary, messages_to_summarize):
+    start_time = time.time()
+    new_summary = await create_conversation_summary(previous_summary, build_summary_input(messages_to_summarize))
+    telemetry.observe('6_summary_latency', time.time() - start_time)
+    return new_summary, messages_to_summarize
+
+def schedule_background_summary(session):
+    """
+    Starts compacting the session's older messages in the background once the estimated
+    prompt size exceeds PROMPT_TOKEN_BUDGET. Nothing on the turn waits for it.
+    Must be called with session.lock held.
+    """
+    session.turns_since_summary += 1
+    if session.session_id in summary_tasks:
+        return  # One summary at a time; the running one is applied first
+
+    estimated_tokens = estimate_prompt_tokens(session.history)
+    print(f"[History Check]: ~{estimated_tokens} prompt tokens, {session.turns_since_summary} turns since last summary")
+    if estimated_tokens <= PROMPT_TOKEN_BUDGET:
+        return
+
+    conversation = [msg for msg in session.history[1:] if not is_summary_message(msg)]
+    messages_to_keep_count = RECENT_TURNS_TO_KEEP * 2
+    if len(conversation) <= messages_to_keep_count:
+        return
+    print("\n--- Managing History: Token budget exceeded, summarizing in the background ---")
+    summary_tasks[session.session_id] = asyncio.create_task(
+        summarize_in_background(session.summary, conversation[:-messages_to_keep_count])
+    )
 
-    if turns_since_summary >= SUMMARY_TRIGGER_COUNT:
-        print(f"\n--- Managing History: Trigger count reached ---")
-        actual_conversation = conv_history[1:]
-        messages_to_keep_count = RECENT_TURNS_TO_KEEP * 2
-        
-        if len(actual_conversation) > messages_to_keep_count:
-            messages_to_summarize = actual_conversation[:-messages_to_keep_count]
-            recent_messages = actual_conversation[-messages_to_keep_count:]
-            
-            summary_text = ""
-            for msg in messages_to_summarize:
-                if msg['role'] in ['user', 'assistant']:
-                    role = "المستخدم" if msg['role'] == 'user' else "سكينة"
-                    summary_text += f"{role}: {msg['content']}\n"
-
-            new_summary = create_conversation_summary(conv_summary, summary_text)
-            new_history = [
-                conv_history[0],
-                {"role": "system", "content": f"ملخص المحادثة حتى الآن: {new_summary}"}
-            ] + recent_messages
-            
-            print("--- History Managed: Summary created and history pruned. ---")
-            return new_history, new_summary, 0  # Reset counter
-
-    return conv_history, conv_summary, turns_since_summary # Return unchanged state
-
-def get_gpt_response(conv_history):
-    # This function now takes history as an argument
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o", messages=conv_history, temperature=0.7, max_tokens=100
-        )
-        gpt_response = response.choices[0].message.content.strip()
-        print(f"[GPT-4o response]: {gpt_response}")
-        return gpt_response
-    except Exception as e:
-        print(f"GPT-4o failed: {e}")
-        return None
+def apply_background_summary(session):
+    """
+    Swaps in a finished background summary: the summarized messages are replaced by one
+    summary message right after the system prompt. Must be called with session.lock held.
+    """
+    task = summary_tasks.get(session.session_id)
+    if task is None or not task.done():
+        return
+    del summary_tasks[session.session_id]
+    if task.cancelled() or task.exception() is not None:
+        return
+    new_summary, summarized_messages = task.result()
+    if new_summary is None:
+        return
+
+    # Messages are matched by identity, so turns added while the summary ran are kept
+    summarized_ids = {id(msg) for msg in summarized_messages}
+    if not summarized_ids <= {id(msg) for msg in session.history}:
+        return  # The history was reloaded from the session backend meanwhile; summarize again later
+    remaining = [
+        msg for msg in session.history[1:]
+        if id(msg) not in summarized_ids and not is_summary_message(msg)
+    ]
+    session.history = [
+        session.history[0],
+        {"role": "system", "content": f"{SUMMARY_PREFIX}{new_summary}"}
+    ] + remaining
+    session.summary = new_summary
+    session.turns_since_summary = 0
+    print("--- History Managed: Summary swapped in and history pruned. ---")
+
+def is_summary_message(msg):
+    return msg['role'] == 'system' and msg['content'].startswith(SUMMARY_PREFIX)
+
+def call_deadline(turn_deadline, timeout):
+    """
+    Absolute deadline (time.monotonic()) for an LLM call: its own timeout, capped by what is
+    left of the turn once TTS_RESERVE_SECONDS is kept back, but never under MIN_PROVIDER_TIMEOUT_SECONDS.
+    """
+    now = time.monotonic()
+    if turn_deadline is None:
+        return now + timeout
+    return now + min(timeout, max(turn_deadline - TTS_RESERVE_SECONDS - now, MIN_PROVIDER_TIMEOUT_SECONDS))
+
+def note_throttling(limit_key, error):
+    """Pauses the rate limiter's queue for a provider that answered HTTP 429."""
+    retry_after = retry_after_seconds(error)
+    if retry_after is not None:
+        print(f"[RateLimiter]: {limit_key} throttled us, pausing for {retry_after or 'a moment'}s")
+        rate_limiter.throttled(limit_key, retry_after)
+
+async def openai_completion(messages, max_tokens, temperature, timeout, priority=LIVE_REPLY):
+    """One GPT-4o chat completion. Raises on failure; the router decides what happens next."""
+    async with rate_limiter.acquire(OPENAI_LIMIT_KEY, priority, tokens=estimate_prompt_tokens(messages) + max_tokens):
+        try:
+            response = await client.chat.completions.create(
+                model=GPT_MODEL, messages=messages, temperature=temperature, max_tokens=max_tokens,
+                timeout=min(timeout, GPT_TIMEOUT_SECONDS)
+            )
+        except Exception as e:
+            note_throttling(OPENAI_LIMIT_KEY, e)
+            raise
+    prompt_cache_stats.record_openai(GPT_MODEL, response.usage)
+    return response.choices[0].message.content.strip()
+
+async def anthropic_completion(conv_history, max_tokens, temperature, timeout, trailing_user_message=None,
+                               priority=LIVE_REPLY):
+    """One Claude message for the same history. Raises on failure."""
+    system_blocks, messages = build_anthropic_request(conv_history, trailing_user_message=trailing_user_message)
+    prompt_tokens = estimate_prompt_tokens(conv_history) + len(trailing_user_message or "") / CHARS_PER_TOKEN_ESTIMATE
+    async with rate_limiter.acquire(ANTHROPIC_LIMIT_KEY, priority, tokens=int(prompt_tokens) + max_tokens):
+        try:
+            response = await claude_client.messages.create(
+                model=CLAUDE_MODEL, max_tokens=max_tokens, temperature=temperature,
+                messages=messages, timeout=min(timeout, CLAUDE_TIMEOUT_SECONDS),
+                **({"system": system_blocks} if system_blocks else {})
+            )
+        except Exception as e:
+            note_throttling(ANTHROPIC_LIMIT_KEY, e)
+            raise
+    prompt_cache_stats.record_anthropic(CLAUDE_MODEL, response.usage)
+    return response.content[0].text.strip()
 
-def get_claude_fallback_response(conv_history):
-    # This function now takes history as an argument
+async def get_reply(conv_history, turn_deadline=None, priority=LIVE_REPLY):
+    """
+    The bot's reply to the last message: GPT-4o, with Claude hedged in if GPT-4o is slower
+    than its recent p95, failing, or has its circuit breaker open.
+    `priority` is the rate limiter class (CRISIS_FOLLOWUP after the crisis fast path).
+    Returns (provider, reply), or (None, FALLBACK_APOLOGY) if neither answered in time.
+    """
     try:
-        system_messages = [msg for msg in conv_history if msg['role'] == 'system']
-        other_messages = [msg for msg in conv_history if msg['role'] != 'system']
-        combined_system = "\n\n".join([msg['content'] for msg in system_messages])
-        
-        response = claude_client.messages.create(
-            model="claude-opus-4-20250514", max_tokens=150, temperature=0.7,
-            system=combined_system, messages=other_messages
-        )
-        claude_response = response.content[0].text.strip()
-        print(f"[Claude fallback response]: {claude_response}")
-        return claude_response
+        provider, reply = await router.call("reply", [
+            (OPENAI, lambda timeout: openai_completion(
+                conv_history, max_tokens=100, temperature=0.7, timeout=timeout, priority=priority
+            )),
+            (ANTHROPIC, lambda timeout: anthropic_completion(
+                conv_history, max_tokens=150, temperature=0.7, timeout=timeout, priority=priority
+            )),
+        ], deadline=call_deadline(turn_deadline, CLAUDE_TIMEOUT_SECONDS))
+    except AllProvidersFailed as e:
+        print(f"No reply: {e}")
+        return None, FALLBACK_APOLOGY
+    print(f"[{provider} response]: {reply}")
+    return provider, reply
+
+def split_complete_sentences(text_buffer):
+    """
+    Splits a partially streamed reply into sentence chunks that are ready for TTS.
+    Returns (complete_chunks, remainder) where the remainder is still being generated.
+    """
+    chunks = []
+    chunk_start = 0
+    for i, char in enumerate(text_buffer):
+        if char in SENTENCE_BOUNDARIES and i + 1 - chunk_start >= MIN_TTS_CHUNK_CHARS:
+            chunk = text_buffer[chunk_start:i + 1].strip()
+            if chunk:
+                chunks.append(chunk)
+            chunk_start = i + 1
+    return chunks, text_buffer[chunk_start:]
+
+async def stream_gpt_response(conv_history, timeout=GPT_TIMEOUT_SECONDS, priority=LIVE_REPLY):
+    """
+    Streams the GPT-4o reply and yields it one sentence chunk at a time,
+    as soon as each chunk is complete. Raises if the stream fails.
+    The rate limiter slot is held until the stream ends.
+    """
+    text_buffer = ""
+    stream = None
+    async with rate_limiter.acquire(OPENAI_LIMIT_KEY, priority, tokens=estimate_prompt_tokens(conv_history) + 100):
+        try:
+            stream = await client.chat.completions.create(
+                model=GPT_MODEL, messages=conv_history, temperature=0.7, max_tokens=100, stream=True,
+                stream_options={"include_usage": True}, timeout=min(timeout, GPT_TIMEOUT_SECONDS)
+            )
+            async for event in stream:
+                # With include_usage the last event has no choices, only token usage
+                if event.usage is not None:
+                    prompt_cache_stats.record_openai(GPT_MODEL, event.usage)
+                if not event.choices:
+                    continue
+                text_buffer += event.choices[0].delta.content or ""
+                chunks, text_buffer = split_complete_sentences(text_buffer)
+                for chunk in chunks:
+                    yield chunk
+        except Exception as e:
+            note_throttling(OPENAI_LIMIT_KEY, e)
+            raise
+        finally:
+            # Stop generating tokens nobody will hear (e.g. the user left mid-reply)
+            if stream is not None:
+                await stream.close()
+    # Whatever is left after the last boundary is the final chunk
+    if text_buffer.strip():
+        yield text_buffer.strip()
+
+async def open_gpt_stream(conv_history, timeout, priority=LIVE_REPLY):
+    """
+    Starts the GPT-4o stream and waits for its first sentence chunk, which is what the router
+    times and hedges on. Returns (first_chunk, the rest of the chunk generator).
+    """
+    chunks = stream_gpt_response(conv_history, timeout, priority)
+    try:
+        return await chunks.__anext__(), chunks
+    except StopAsyncIteration:
+        raise RuntimeError("GPT-4o stream ended without any text")
+    except BaseException:
+        # Lost the hedge or failed: close the HTTP stream now rather than at garbage collection
+        await chunks.aclose()
+        raise
+
+async def stream_reply(conv_history, turn_deadline=None, priority=LIVE_REPLY):
+    """
+    Streaming counterpart of get_reply. Yields (provider, sentence_chunk). GPT-4o streams;
+    Claude, if it wins the hedge, answers in one piece that is then split into sentences.
+    Yields (None, FALLBACK_APOLOGY) if neither answered in time.
+    """
+    try:
+        provider, result = await router.call("reply_stream", [
+            (OPENAI, lambda timeout: open_gpt_stream(conv_history, timeout, priority)),
+            (ANTHROPIC, lambda timeout: anthropic_completion(
+                conv_history, max_tokens=150, temperature=0.7, timeout=timeout, priority=priority
+            )),
+        ], deadline=call_deadline(turn_deadline, CLAUDE_TIMEOUT_SECONDS))
+    except AllProvidersFailed as e:
+        print(f"No reply: {e}")
+        yield None, FALLBACK_APOLOGY
+        return
+
+    if provider != OPENAI:
+        print(f"[{provider} response]: {result}")
+        chunks, remainder = split_complete_sentences(result)
+        for chunk in chunks + ([remainder.strip()] if remainder.strip() else []):
+            yield provider, chunk
+        return
+
+    first_chunk, chunks = result
+    yield provider, first_chunk
+    try:
+        async for chunk in chunks:
+            yield provider, chunk
     except Exception as e:
-        print(f"Claude failed: {e}")
-        return "عذرًا، أواجه صعوبة فنية. هل يمكننا المحاولة مرة أخرى؟"
-
-
-def validate_response_with_claude(gpt_response, user_query, conv_history):
-    # This function now takes history as an argument
+        # The router only saw the first chunk; a stream that breaks later still counts against GPT-4o
+        print(f"GPT-4o stream failed: {e}")
+        router.record_failure(OPENAI)
+    finally:
+        await chunks.aclose()
+
+async def validate_response_with_claude(gpt_response, user_query, conv_history, turn_deadline=None):
+    """Returns "good", or sentences to append to the reply. A deadline of None means no turn is waiting."""
     validation_prompt = f"""
     أنت خبير في تقييم استجابات الدعم النفسي باللهجة العمانية. مهمتك هي تقييم استجابة GPT-4o وتحسينها إذا لزم الأمر.
 معايير التقييم:
@@ -245,90 +650,184 @@ def validate_response_with_claude(gpt_response, user_query, conv_history):
 
 استجابتك:
 """
+    # The validation prompt goes last so the conversation before it is read from cache.
+    # Claude validates; in a Claude brownout GPT-4o reviews with the same prompt rather than skipping it.
     try:
-        system_messages = [msg for msg in conv_history if msg['role'] == 'system']
-        other_messages = [msg for msg in conv_history if msg['role'] != 'system']
-        combined_system = "\n\n".join([msg['content'] for msg in system_messages])
-        
-        response = claude_client.messages.create(
-            model="claude-opus-4-20250514", max_tokens=100, temperature=0.7,
-            system=combined_system, messages=other_messages + [{"role": "user", "content": validation_prompt}]
-        )
-        validation_result = response.content[0].text.strip()
-        print(f"[Claude validation]: {validation_result}")
-        return validation_result
-    except Exception as e:
-        print(f"Claude validation failed: {e}")
+        provider, validation_result = await router.call("validation", [
+            (ANTHROPIC, lambda timeout: anthropic_completion(
+                conv_history, max_tokens=100, temperature=0.7, timeout=timeout,
+                trailing_user_message=validation_prompt, priority=VALIDATION
+            )),
+            (OPENAI, lambda timeout: openai_completion(
+                conv_history + [{"role": "user", "content": validation_prompt}],
+                max_tokens=100, temperature=0.7, timeout=timeout, priority=VALIDATION
+            )),
+        ], deadline=call_deadline(turn_deadline, CLAUDE_TIMEOUT_SECONDS))
+    except AllProvidersFailed as e:
+        print(f"Validation failed: {e}")
+        telemetry.increment("validations", result="failed")
         return "good"
+    print(f"[{provider} validation]: {validation_result}")
+    telemetry.increment("validations", result="good" if validation_result.lower() == "good" else "enhanced")
+    return validation_result
 
 # --- 3. GRADIO-SPECIFIC AUDIO AND ORCHESTRATION FUNCTIONS ---
 
-def text_to_speech_to_memory(text):
+async def run_blocking(func, *args):
+    """Runs a blocking Azure Speech SDK call on the shared executor."""
+    return await asyncio.get_running_loop().run_in_executor(azure_executor, func, *args)
+
+async def await_azure_future(result_future, timeout=AZURE_SPEECH_TIMEOUT_SECONDS):
+    """
+    Makes an Azure Speech SDK ResultFuture awaitable, with a timeout. The SDK can't cancel
+    a `.get()`, so on timeout the executor thread stays blocked until the caller closes the
+    connection behind the future (or the SDK gives up on it); timeouts are counted.
+    """
+    try:
+        return await asyncio.wait_for(run_blocking(result_future.get), timeout)
+    except asyncio.TimeoutError:
+        telemetry.increment("azure_future_timeouts")
+        raise
+
+async def timed(awaitable):
+    """Awaits and returns (result, seconds taken), for per-stage metrics of concurrent tasks."""
+    start_time = time.time()
+    result = await awaitable
+    return result, time.time() - start_time
+
+async def text_to_speech_to_memory(text, priority=LIVE_REPLY):
     """
     REVISED: Converts text to speech and returns the audio data as bytes.
+    Repeated phrases are served from the TTS cache without calling Azure.
+    """
+    cached_audio = tts_cache.get(text, AZURE_TTS_VOICE_NAME, AZURE_TTS_OUTPUT_FORMAT)
+    if cached_audio is not None:
+        print(f"[TTS cache hit]: '{text[:50]}...'")
+        return cached_audio
+    return await synthesize_speech(text, priority)
+
+async def synthesize_speech(text, priority=LIVE_REPLY):
+    """Synthesizes text once the rate limiter grants a TTS slot for `priority`; None if the call was shed."""
+    try:
+        async with rate_limiter.acquire(AZURE_TTS_LIMIT_KEY, priority):
+            return await synthesize_with_pool(text)
+    except RateLimited as e:
+        print(f"TTS skipped: {e}")
+        return None
+
+async def checkout_synthesizer():
+    """
+    Checks a synthesizer out of the pool on the executor. If the caller is cancelled meanwhile
+    (a lost hedge, a discarded speculation, a client that left), the thread still finishes its
+    checkout, and that synthesizer is handed back as soon as it does.
+    """
+    checkout = asyncio.get_running_loop().run_in_executor(azure_executor, tts_pool.checkout)
+    try:
+        return await asyncio.shield(checkout)
+    except asyncio.CancelledError:
+        checkout.add_done_callback(return_abandoned_checkout)
+        raise
+
+def return_abandoned_checkout(checkout):
+    # A fresh checkout is healthy, so checkin only puts it back on the idle queue
+    if not checkout.cancelled() and checkout.exception() is None:
+        tts_pool.checkin(checkout.result())
+
+async def synthesize_with_pool(text):
+    """
+    Synthesizes text with a pooled Azure synthesizer and caches the result.
     This version correctly handles in-memory synthesis without audio output config.
     """
-    print(f"--- Azure TTS (Optimized) ---")
+    if speech_stand_in is not None:
+        audio_data = await speech_stand_in.synthesize(text)
+        if audio_data is None:
+            telemetry.increment("provider_errors", provider="azure", call="tts")
+            return None
+        tts_cache.put(text, AZURE_TTS_VOICE_NAME, AZURE_TTS_OUTPUT_FORMAT, audio_data)
+        return audio_data
+
+    print("--- Azure TTS (Pooled) ---")
     print(f"Attempting to synthesize text: '{text[:50]}...'")
+    pooled = None
     try:
-        speech_config = speechsdk.SpeechConfig(subscription=AZURE_SPEECH_KEY, region=AZURE_SPEECH_REGION)
-        speech_config.speech_synthesis_voice_name = AZURE_TTS_VOICE_NAME
-        synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=None)
-        
-        result = synthesizer.speak_text_async(text).get()
-        
+        pooled = await checkout_synthesizer()
+        try:
+            result = await await_azure_future(pooled.synthesizer.speak_text_async(text))
+        except BaseException:
+            # Timed out or cancelled mid-synthesis: the connection may still be busy. It is never
+            # reused; checkin closes it, which also ends the `.get()` still blocking a thread.
+            pooled.healthy = False
+            raise
+
         if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
             audio_data = result.audio_data
             print(f"Successfully synthesized {len(audio_data)} bytes of audio.")
             print("---------------------------")
+            tts_cache.put(text, AZURE_TTS_VOICE_NAME, AZURE_TTS_OUTPUT_FORMAT, audio_data)
             return audio_data
         else:
+            # Don't hand a broken connection to the next caller
+            pooled.healthy = False
             cancellation = result.cancellation_details
             print(f"ERROR: Speech synthesis CANCELED: {cancellation.reason}")
+            telemetry.increment("provider_errors", provider="azure", call="tts")
             if cancellation.reason == speechsdk.CancellationReason.Error:
                 print(f"Azure Error Details: {cancellation.error_details}")
             print("---------------------------")
             return None
-            
+
     except Exception as e:
-        print(f"CRITICAL ERROR in text_to_speech_to_memory: {e}")
+        print(f"CRITICAL ERROR in text_to_speech_to_memory: {e!r}")
+        telemetry.increment("provider_errors", provider="azure", call="tts")
         print("---------------------------")
         return None
-
-def transcribe_audio_data(audio_data, sample_rate):
+    finally:
+        if pooled is not None and pooled.healthy:
+            tts_pool.checkin(pooled)
+        elif pooled is not None:
+            # Closing and reconnecting are blocking SDK calls; not awaited, so this also runs
+            # when the turn was cancelled
+            asyncio.get_running_loop().run_in_executor(azure_executor, tts_pool.checkin, pooled)
+
+async def transcribe_audio_data(audio_data, sample_rate):
     """
     MODIFIED: Transcribes audio data with multi-language (Arabic/English) support.
     """
     if audio_data is None:
         return None
-        
-    try:
-        # Azure expects bytes, so we convert the numpy array
-        audio_bytes = audio_data.astype(np.int16).tobytes()
 
-        speech_config = speechsdk.SpeechConfig(subscription=AZURE_SPEECH_KEY, region=AZURE_SPEECH_REGION)
+    # Downmix, resample to 16 kHz and trim silence before anything is uploaded (CPU-bound, so off the event loop)
+    pcm = await asyncio.to_thread(preprocess_recording, audio_data, sample_rate)
+    if len(pcm) == 0:
+        print("[STT preprocessing]: No speech detected, skipping recognition.")
+        telemetry.increment("stt_skipped_silence")
+        return None
+    print(f"[STT preprocessing]: {audio_data.nbytes} -> {pcm.nbytes} bytes")
+    async with rate_limiter.acquire(AZURE_STT_LIMIT_KEY, LIVE_REPLY):
+        return await recognize_speech(pcm)
+
+async def recognize_speech(pcm):
+    """One-shot recognition of preprocessed 16 kHz mono PCM. Returns the text or None."""
+    if speech_stand_in is not None:
+        return await speech_stand_in.transcribe(pcm, STT_SAMPLE_RATE)
 
-        # 2. Create a configuration for auto-detecting the language from a list.
-        auto_detect_source_language_config = speechsdk.AutoDetectSourceLanguageConfig(
-            languages=[OMANI_ARABIC_LOCALE, ENGLISH_US_LOCALE]
-        )
-        # Create an audio stream from the bytes
+    try:
+        # Azure expects bytes
+        audio_bytes = pcm.tobytes()
+
+        # Create an audio stream for the bytes
         stream = speechsdk.audio.PushAudioInputStream(
-            stream_format=speechsdk.audio.AudioStreamFormat(samples_per_second=sample_rate, bits_per_sample=16, channels=1)
+            stream_format=speechsdk.audio.AudioStreamFormat(samples_per_second=STT_SAMPLE_RATE, bits_per_sample=16, channels=1)
         )
+        audio_config = speechsdk.audio.AudioConfig(stream=stream)
+
+        # Initialize the recognizer with the shared speech and auto-detect (ar-OM/en-US) configs
+        recognizer = stt_configs.create_recognizer(audio_config)
+
         stream.write(audio_bytes)
         stream.close() # Signal the end of the stream
 
-        audio_config = speechsdk.audio.AudioConfig(stream=stream)
-        
-        # 3. Initialize the recognizer with the auto-detect config
-        recognizer = speechsdk.SpeechRecognizer(
-            speech_config=speech_config, 
-            auto_detect_source_language_config=auto_detect_source_language_config,
-            audio_config=audio_config
-        )
-        
-        result = recognizer.recognize_once_async().get()
+        result = await await_azure_future(recognizer.recognize_once_async())
         
         if result.reason == speechsdk.ResultReason.RecognizedSpeech:
             recognized_text = result.text
@@ -336,6 +835,7 @@ def transcribe_audio_data(audio_data, sample_rate):
             return recognized_text
         else:
             print(f"Speech recognition failed: {result.reason}")
+            telemetry.increment("stt_no_result", reason=result.reason.name)
             # If it fails, you can inspect the cancellation details
             if result.reason == speechsdk.ResultReason.Canceled:
                 cancellation_details = result.cancellation_details
@@ -344,168 +844,659 @@ def transcribe_audio_data(audio_data, sample_rate):
                     print(f"Error details: {cancellation_details.error_details}")
             return None
     except Exception as e:
-        print(f"An error occurred during speech-to-text: {e}")
+        print(f"An error occurred during speech-to-text: {e!r}")
+        telemetry.increment("provider_errors", provider="azure", call="stt")
+        return None
+
+async def stream_microphone_chunk(mic_chunk, request: gr.Request):
+    """
+    Called by Gradio for every microphone chunk while the user is recording.
+    Pushes the chunk into this session's live transcriber, starting one on the first chunk.
+    """
+    if mic_chunk is None:
+        return
+    sample_rate, audio_data = mic_chunk
+    if request.session_hash in shed_recordings:
+        shed_recordings[request.session_hash][1].append(audio_data)
+        return
+    transcriber = live_transcribers.get(request.session_hash)
+    if transcriber is None:
+        transcriber = start_live_transcriber()
+        if transcriber is None:
+            # This utterance is recognized in one go once recording stops. With a streamed microphone
+            # the turn handler's input need not hold the whole recording, so the chunks are kept here
+            shed_recordings[request.session_hash] = (sample_rate, [audio_data])
+            return
+        live_transcribers[request.session_hash] = transcriber
+        live_preprocessors[request.session_hash] = MicrophoneStreamPreprocessor(sample_rate)
+    # Chunks are small, so downmixing and resampling inline is cheap
+    transcriber.push(live_preprocessors[request.session_hash].process(audio_data).tobytes())
+    maybe_speculate(request.session_hash, transcriber)
+
+def start_live_transcriber():
+    """
+    A streaming transcriber holding one of Azure's STT slots, which is released once it is finished
+    or cancelled. None if there is no STT capacity right now or the recognizer could not start.
+    """
+    if not rate_limiter.try_acquire(AZURE_STT_LIMIT_KEY, LIVE_REPLY):
+        return None
+    try:
+        if speech_stand_in is not None:
+            return speech_stand_in.create_transcriber(STT_SAMPLE_RATE)
+        return StreamingTranscriber(stt_configs, STT_SAMPLE_RATE)
+    except Exception as e:
+        print(f"Could not start streaming speech-to-text: {e!r}")
+        rate_limiter.release(AZURE_STT_LIMIT_KEY)
+        return None
+
+def close_live_transcriber(session_id):
+    """Forgets the session's utterance in progress. Returns its transcriber, whose STT slot the caller releases."""
+    live_preprocessors.pop(session_id, None)
+    return live_transcribers.pop(session_id, None)
+
+def maybe_speculate(session_id, transcriber):
+    """
+    Starts a speculative reply once the speaker pauses on a stable interim hypothesis, replacing
+    one started for an earlier hypothesis. Skipped while the previous turn still holds the session,
+    and for hypotheses that would take the crisis fast path.
+    """
+    if not (SPECULATIVE_REPLIES and STREAMING_MODE) or transcriber.last_result_time is None:
+        return
+    hypothesis = transcriber.text
+    current = speculations.get(session_id)
+    if not speculator.should_start(hypothesis, time.time() - transcriber.last_result_time, current):
+        return
+    session = sessions.get(session_id)
+    if session.lock.locked() or crisis_detector.is_emergency(hypothesis):
+        return
+    speculator.discard(speculations.pop(session_id, None), RESTARTED)
+    print(f"[Speculation]: Starting on '{hypothesis[:40]}'")
+    speculations[session_id] = speculator.start(hypothesis, session.history, stream_reply, text_to_speech_to_memory)
+
+async def transcribe_user_turn(mic_input, session_id):
+    """
+    Returns the transcript for this turn. Uses the live transcriber when the microphone
+    was streamed, so only the tail of the utterance is left to recognize; otherwise
+    falls back to transcribing the whole recording.
+    """
+    transcriber = close_live_transcriber(session_id)
+    if transcriber is not None:
+        try:
+            recognized_text = await run_blocking(transcriber.finish, STT_FINAL_RESULT_TIMEOUT)
+            print(f"أنت (User): {recognized_text}")
+            return recognized_text
+        except Exception as e:
+            print(f"An error occurred during streaming speech-to-text: {e!r}")
+            telemetry.increment("provider_errors", provider="azure", call="stt_stream")
+            return None
+        finally:
+            rate_limiter.release(AZURE_STT_LIMIT_KEY)
+    shed_recording = shed_recordings.pop(session_id, None)
+    if shed_recording is not None:
+        sample_rate, chunks = shed_recording
+        return await transcribe_audio_data(np.concatenate(chunks), sample_rate)
+    if mic_input is None:
         return None
+    return await transcribe_audio_data(mic_input[1], mic_input[0])
+
+def detect_crisis(user_text, current_turn_metrics):
+    """Runs the local crisis detector on the transcript. Returns True if the fast path should play."""
+    detection_start_time = time.time()
+    crisis_matches = crisis_detector.find(user_text)
+    current_turn_metrics['1b_crisis_detection_latency'] = time.time() - detection_start_time
+    if crisis_matches:
+        print(f"[Crisis detector]: {crisis_matches}")
+    is_emergency = crisis_detector.is_emergency(user_text, crisis_matches)
+    current_turn_metrics.attributes['crisis'] = is_emergency
+    if is_emergency:
+        telemetry.increment("crisis_fast_path")
+    return is_emergency
+
+async def crisis_message_audio():
+    """
+    The emergency message's audio, pinned in the TTS cache at startup so the fast path never
+    waits on Azure. Synthesized here only if warm-up could not render it.
+    """
+    cached_audio = tts_cache.get(CRISIS_HOTLINES_MESSAGE, AZURE_TTS_VOICE_NAME, AZURE_TTS_OUTPUT_FORMAT)
+    if cached_audio is not None:
+        return cached_audio
+    telemetry.increment("crisis_audio_not_cached")
+    return await synthesize_speech(CRISIS_HOTLINES_MESSAGE)
+
+def crisis_followup_history(conv_history):
+    """History for the LLM follow-up once the emergency message has been played."""
+    return conv_history[:-1] + [{"role": "system", "content": CRISIS_FOLLOWUP_INSTRUCTION}, conv_history[-1]]
 
-def generate_bot_response_and_audio(conv_history):
+async def generate_bot_response_and_audio(conv_history, turn_deadline=None, priority=LIVE_REPLY):
     """
     REFACTORED: Generates the full bot response, including validation,
-    and returns the final text and a single, combined audio file.
+    and returns the final text and the reply's audio as one PCMBuffer.
+    LLM calls are given what is left of the turn before `turn_deadline` (time.monotonic()).
+    `priority` is the rate limiter class of the reply and its audio.
     """
 
     metrics = {}
     # Get initial response
     gpt_start_time = time.time()
-    gpt_response = get_gpt_response(conv_history)
+    provider, gpt_response = await get_reply(conv_history, turn_deadline, priority)
     metrics['2_gpt4o_latency'] = time.time() - gpt_start_time
-    if gpt_response is None:
-        claude_response = get_claude_fallback_response(conv_history)
-        audio_data = text_to_speech_to_memory(claude_response)
-        return claude_response, audio_data
+    if provider != OPENAI:
+        # Claude's fallback reply (or the apology) is spoken as is, like before
+        audio_data = await text_to_speech_to_memory(gpt_response, priority)
+        return gpt_response, PCMBuffer(TTS_SAMPLE_RATE, audio_data), metrics
 
-    # Perform validation in parallel while generating audio for the first part
     user_query = conv_history[-1]['content']
     final_response_for_history = gpt_response
-    
-    parallel_start_time = time.time()
 
-    with ThreadPoolExecutor(max_workers=2) as executor:
-        # Start generating audio for the main response
+    # Deferred validation needs a follow-up audio segment, which only the streaming path has
+    validation_decision = validation_policy.decide(user_query, gpt_response)
+    print(f"[Validation policy]: {validation_policy.name} -> {validation_decision}")
+    if validation_decision != BLOCKING:
         tts_start_time = time.time()
-        tts_future = executor.submit(text_to_speech_to_memory, gpt_response)
-        # Start validation
-        claude_start_time = time.time()
-        validation_future = executor.submit(validate_response_with_claude, gpt_response, user_query, conv_history)
-        
-        # Get results
-        gpt_audio_data = tts_future.result()
+        gpt_audio_data = await text_to_speech_to_memory(gpt_response, priority)
         metrics['3a_azure_tts1_latency'] = time.time() - tts_start_time
-        
-        validation_result = validation_future.result()
-        metrics['3b_claude_validation_latency'] = time.time() - claude_start_time
+        return final_response_for_history, PCMBuffer(TTS_SAMPLE_RATE, gpt_audio_data), metrics
 
-        metrics['3_parallel_block_latency'] = time.time() - parallel_start_time
-        
-        combined_audio_data = gpt_audio_data
-        
-        if validation_result.strip().lower() != "good":
-            enhancement_tts_start_time = time.time()
-            print("[Validation]: GPT response enhanced. Generating enhancement audio.")
-            enhancement_audio_data = text_to_speech_to_memory(validation_result)
-            metrics['4_azure_tts2_enhancement_latency'] = time.time() - enhancement_tts_start_time
-            if gpt_audio_data and enhancement_audio_data:
-                # Combine audio clips
-                # The first 44 bytes of a WAV file are the header, we strip it from the second file
-                combined_audio_data = gpt_audio_data + enhancement_audio_data[44:]
-            
-            final_response_for_history = f"{gpt_response} {validation_result}"
+    # Perform validation concurrently while generating audio for the first part
+    parallel_start_time = time.time()
+    tts_task = asyncio.create_task(timed(text_to_speech_to_memory(gpt_response, priority)))
+    validation_task = asyncio.create_task(timed(
+        validate_response_with_claude(gpt_response, user_query, conv_history, turn_deadline)
+    ))
+    try:
+        gpt_audio_data, metrics['3a_azure_tts1_latency'] = await tts_task
+        validation_result, metrics['3b_claude_validation_latency'] = await validation_task
+    finally:
+        # If the turn is abandoned (client gone), don't leave provider calls running
+        for task in (tts_task, validation_task):
+            task.cancel()
+    metrics['3_parallel_block_latency'] = time.time() - parallel_start_time
+
+    combined_audio_data = PCMBuffer(TTS_SAMPLE_RATE, gpt_audio_data)
+
+    if validation_result.strip().lower() != "good":
+        enhancement_tts_start_time = time.time()
+        print("[Validation]: GPT response enhanced. Generating enhancement audio.")
+        enhancement_audio_data = await text_to_speech_to_memory(validation_result, priority)
+        metrics['4_azure_tts2_enhancement_latency'] = time.time() - enhancement_tts_start_time
+        combined_audio_data.append(enhancement_audio_data)
+
+        final_response_for_history = f"{gpt_response} {validation_result}"
 
     return final_response_for_history, combined_audio_data, metrics
 
+async def stream_bot_response_and_audio(conv_history, metrics, deferred_validations=None, turn_deadline=None,
+                                        priority=LIVE_REPLY, speculation=None):
+    """
+    Streaming counterpart of generate_bot_response_and_audio.
+    Yields (reply_text_so_far, audio_chunk) as soon as each sentence is synthesized,
+    so playback starts after the first sentence instead of after the whole reply.
+    Latencies are written into the given metrics dict. When the validation policy defers,
+    (gpt_response, user_query, history_snapshot) is appended to `deferred_validations`
+    for the caller to run after the turn. A kept `speculation` (speculation.SpeculativeReply)
+    supplies the reply, and the audio of its first sentence, instead of a new LLM call.
+    """
+    start_time = time.time()
+    provider = None
+    spoken_chunks = []
+    pending_tts = []  # TTS tasks in playback order
+    validation_task = None
+
+    try:
+        replies = speculation.replay() if speculation is not None else stream_reply(conv_history, turn_deadline, priority)
+        async for provider, chunk in replies:
+            if not spoken_chunks:
+                metrics['2_gpt4o_first_chunk_latency'] = time.time() - start_time
+            if not spoken_chunks and speculation is not None and speculation.first_audio is not None:
+                pending_tts.append(speculation.first_audio)
+            else:
+                pending_tts.append(asyncio.create_task(text_to_speech_to_memory(chunk, priority)))
+            spoken_chunks.append(chunk)
+            # Hand over every chunk whose audio is ready, without blocking the token stream
+            while pending_tts and pending_tts[0].done():
+                yield " ".join(spoken_chunks), pending_tts.pop(0).result()
+        metrics['2_gpt4o_latency'] = time.time() - start_time
+
+        gpt_response = " ".join(spoken_chunks)
+        if provider != OPENAI:
+            # Claude's fallback reply (or the apology) is not validated, like before
+            while pending_tts:
+                yield gpt_response, await pending_tts.pop(0)
+            return
+
+        user_query = conv_history[-1]['content']
+        validation_decision = validation_policy.decide(user_query, gpt_response)
+        print(f"[Validation policy]: {validation_policy.name} -> {validation_decision}")
+        if validation_decision == BLOCKING:
+            validation_task = asyncio.create_task(timed(
+                validate_response_with_claude(gpt_response, user_query, conv_history, turn_deadline)
+            ))
+        elif validation_decision == DEFERRED and deferred_validations is not None:
+            deferred_validations.append((gpt_response, user_query, list(conv_history)))
+
+        while pending_tts:
+            yield gpt_response, await pending_tts.pop(0)
+        metrics['3a_azure_tts1_latency'] = time.time() - start_time
+
+        if validation_task is None:
+            return
+        validation_result, metrics['3b_claude_validation_latency'] = await validation_task
+    finally:
+        # The generator is closed early when the client disconnects; drop work nobody will hear
+        for task in pending_tts + [validation_task]:
+            if task is not None:
+                task.cancel()
+
+    if validation_result.strip().lower() != "good":
+        enhancement_tts_start_time = time.time()
+        print("[Validation]: GPT response enhanced. Streaming enhancement audio.")
+        enhancement_audio_data = await text_to_speech_to_memory(validation_result, priority)
+        metrics['4_azure_tts2_enhancement_latency'] = time.time() - enhancement_tts_start_time
+        yield f"{gpt_response} {validation_result}", enhancement_audio_data
+
+async def crossfade_into_reply(reply_updates, backchannel_tail, blend_by):
+    """
+    Passes through the (text, audio) updates of stream_bot_response_and_audio, blending the
+    held-back end of the backchannel into the first reply audio. If that audio is not ready by
+    `blend_by` (time.monotonic(), when the rest of the backchannel has played), the end is
+    faded out on its own instead and yielded first as (None, audio).
+    """
+    first_update = asyncio.ensure_future(reply_updates.__anext__())
+    try:
+        done, _ = await asyncio.wait({first_update}, timeout=max(blend_by - time.monotonic(), 0))
+        if not done:
+            yield None, fade_out(backchannel_tail)
+            backchannel_tail = None
+        try:
+            final_text, audio_chunk = await first_update
+        except StopAsyncIteration:
+            if backchannel_tail is not None:
+                yield None, fade_out(backchannel_tail)
+            return
+        if backchannel_tail is not None:
+            audio_chunk = crossfade(backchannel_tail, audio_chunk)
+        yield final_text, audio_chunk
+        async for update in reply_updates:
+            yield update
+    finally:
+        # The reply generator can't be closed while its first step is still running
+        if not first_update.done():
+            first_update.cancel()
+            await asyncio.wait({first_update})
+        await reply_updates.aclose()
+
+async def run_deferred_validation(gpt_response, user_query, conv_history, metrics):
+    """
+    Validates a reply that has already been played.
+    Returns (enhancement_text, enhancement_audio), or (None, None) if the reply was good
+    or its audio was shed by the rate limiter (text nobody heard is not added to the history).
+    """
+    validation_result, metrics['3b_claude_validation_latency'] = await timed(
+        validate_response_with_claude(gpt_response, user_query, conv_history)
+    )
+    if validation_result.strip().lower() == "good":
+        return None, None
+    enhancement_tts_start_time = time.time()
+    print("[Validation]: Deferred validation enhanced the reply. Queuing follow-up audio.")
+    enhancement_audio_data = await text_to_speech_to_memory(validation_result, VALIDATION)
+    metrics['4_azure_tts2_enhancement_latency'] = time.time() - enhancement_tts_start_time
+    if enhancement_audio_data is None:
+        return None, None
+    return validation_result, enhancement_audio_data
+
 
 # --- 4. GRADIO INTERFACE AND MAIN APP LOGIC ---
 
-def gradio_interface(mic_input, chat_history_state, summary_state, turns_state):
+def manage_session_history(session):
+    """
+    Swaps in a finished summary, schedules the next one if the history is over budget
+    and applies the per-session message budget. Must be called with session.lock held.
+    """
+    apply_background_summary(session)
+    schedule_background_summary(session)
+    sessions.enforce_budget(session)
+
+async def gradio_interface(mic_input, chat_history_state, request: gr.Request):
     """
     The main function called by Gradio on each interaction.
     """
     turn_start_time = time.time()
-    current_turn_metrics = {}
+    turn_deadline = time.monotonic() + TURN_LATENCY_BUDGET_SECONDS
+    current_turn_metrics = telemetry.start_turn(request.session_hash)
     # 1. Transcribe User's Speech
     stt_start_time = time.time()
-    user_text = transcribe_audio_data(mic_input[1], mic_input[0])
+    user_text = await transcribe_user_turn(mic_input, request.session_hash)
     current_turn_metrics['1_stt_latency'] = time.time() - stt_start_time
     
     if not user_text:
+        telemetry.increment("no_speech_turns")
+        telemetry.finish_turn(current_turn_metrics)
         # If transcription fails, just return the current state
-        # Add a message to the user in the chat
-        chat_history_state.append((None, "Sorry, I couldn't hear you. Please try again."))
-        return chat_history_state, None, summary_state, turns_state
-
-    # 2. Update Conversation History with User's Message
-    chat_history_state.append((user_text))
+        # Add a message to the user in the chat, and say it (served from the TTS cache)
+        chat_history_state.append((None, NO_SPEECH_MESSAGE))
+        no_speech_audio = await text_to_speech_to_memory(NO_SPEECH_MESSAGE)
+        return chat_history_state, PCMBuffer(TTS_SAMPLE_RATE, no_speech_audio).to_gradio()
+
+    is_emergency = detect_crisis(user_text, current_turn_metrics)
+    # Fetched before waiting for the session, so the emergency message is never held up by it
+    crisis_audio_data = await crisis_message_audio() if is_emergency else None
+
+    session = sessions.get(request.session_hash)
+    async with session.lock:
+        # Another worker may have served this session since, or the process restarted
+        await sessions.load(session)
+        # A summary finished since the last turn is swapped in before building the prompt
+        apply_background_summary(session)
+
+        # 2. Update Conversation History with User's Message
+        chat_history_state.append((user_text))
+
+        # Also update this session's message list for the LLM
+        session.history.append({"role": "user", "content": user_text})
+
+        # 3. Generate Bot's Response (Text and Audio)
+        if is_emergency:
+            # The batch path returns one clip per turn, so the emergency message leads the reply and
+            # plays only once the follow-up is ready; STREAMING_MODE plays it before any LLM call
+            final_text, final_audio_data, response_gen_metrics = await generate_bot_response_and_audio(
+                crisis_followup_history(session.history), turn_deadline, CRISIS_FOLLOWUP
+            )
+            final_text = f"{CRISIS_HOTLINES_MESSAGE} {final_text}"
+            final_audio_data = PCMBuffer(TTS_SAMPLE_RATE, crisis_audio_data, final_audio_data)
+        else:
+            final_text, final_audio_data, response_gen_metrics = await generate_bot_response_and_audio(session.history, turn_deadline)
+        current_turn_metrics.update(response_gen_metrics)
 
-    # Also update the internal message list for the LLM
-    INITIAL_HISTORY.append({"role": "user", "content": user_text})
+        # 4. Update History and State with Bot's Message
+        session.history.append({"role": "assistant", "content": final_text})
+        chat_history_state[-1] = (user_text, final_text)
 
-    # 3. Generate Bot's Response (Text and Audio)
-    final_text, final_audio_data, response_gen_metrics = generate_bot_response_and_audio(INITIAL_HISTORY)
-    current_turn_metrics.update(response_gen_metrics)
-    
-    # 4. Update History and State with Bot's Message
-    INITIAL_HISTORY.append({"role": "assistant", "content": final_text})
-    chat_history_state[-1] = (user_text, final_text)
-
-    # 5. Manage history (summarization)
-    summary_start_time = time.time()
-    new_hist, new_summary, new_turns = manage_conversation_history(
-        INITIAL_HISTORY, summary_state, turns_state
-    )
-    current_turn_metrics['6_summary_latency'] = time.time() - summary_start_time
-    # Update the master history list with the potentially pruned version
-    INITIAL_HISTORY[:] = new_hist
+        # 5. Manage history (summarization) and persist the session
+        manage_session_history(session)
+        await sessions.save(session)
 
     current_turn_metrics['total_turn_latency'] = time.time() - turn_start_time
 
     # Log the metrics for this turn
-    performance_log.append(current_turn_metrics)
-    print("\n--- PERFORMANCE METRICS FOR THIS TURN ---")
-    for key, value in current_turn_metrics.items():
-        print(f"{key}: {value:.4f} seconds")
-    print("-----------------------------------------\n")
+    telemetry.finish_turn(current_turn_metrics)
 
     # 6. Return values to Gradio components
-    # The audio component expects a tuple: (sample_rate, numpy_array)
-    if final_audio_data:
-        # Convert audio bytes back to numpy array for Gradio
-        audio_np = np.frombuffer(final_audio_data, dtype=np.int16)
-        bot_audio_output = (SAMPLE_RATE, audio_np)
+    # The audio component expects a tuple: (sample_rate, numpy_array), built without copying single segments
+    return chat_history_state, final_audio_data.to_gradio()
+
+def stream_chunk(pcm):
+    # The streaming audio output decodes every chunk on its own, so each one needs a WAV header
+    return pcm_to_wav(pcm, TTS_SAMPLE_RATE) if pcm else None
+
+async def gradio_interface_streaming(mic_input, chat_history_state, request: gr.Request):
+    """
+    Streaming version of gradio_interface. Yields one update per synthesized sentence,
+    so the streaming audio output starts playing while the rest of the reply is generated.
+    """
+    turn_start_time = time.time()
+    turn_deadline = time.monotonic() + TURN_LATENCY_BUDGET_SECONDS
+    current_turn_metrics = telemetry.start_turn(request.session_hash)
+    # 1. Transcribe User's Speech
+    stt_start_time = time.time()
+    user_text = await transcribe_user_turn(mic_input, request.session_hash)
+    current_turn_metrics['1_stt_latency'] = time.time() - stt_start_time
+    speculation = speculations.pop(request.session_hash, None)
+
+    if not user_text:
+        speculator.discard(speculation, ABANDONED)
+        telemetry.increment("no_speech_turns")
+        telemetry.finish_turn(current_turn_metrics)
+        chat_history_state.append((None, NO_SPEECH_MESSAGE))
+        yield chat_history_state, stream_chunk(await text_to_speech_to_memory(NO_SPEECH_MESSAGE))
+        return
+
+    is_emergency = detect_crisis(user_text, current_turn_metrics)
+    session = sessions.get(request.session_hash)
+    if is_emergency:
+        speculation = speculator.discard(speculation, CRISIS)
     else:
-        bot_audio_output = None
-
-    return chat_history_state, bot_audio_output, new_summary, new_turns
-
-# Build the Gradio UI
-with gr.Blocks(theme=gr.themes.Soft()) as demo:
-    gr.Markdown("# 🤖 Sakina - Omani AI Mental Health Companion")
-    gr.Markdown("Click the 'Record from microphone' button and speak. The bot will listen and respond with voice.")
-
-    # State variables to hold the conversation memory
-    conversation_history_state = gr.State(INITIAL_HISTORY)
-    conversation_summary_state = gr.State("")
-    turns_since_last_summary_state = gr.State(0)
-
-    with gr.Row():
-        with gr.Column(scale=2):
-            # The visual chatbot display (in Arabic)
-            chatbot_display = gr.Chatbot(
-                label="Conversation",
-                rtl=True, # Right-to-Left for Arabic
-                value=[(None, "أهلاً بك، أنا سكينة. كيف أقدر أساعدك اليوم؟")]
-            )
-            # The audio output for the bot's voice
-            bot_audio_output = gr.Audio(
-                label="Bot Response",
-                autoplay=True,
-                interactive=False,
-                # Use visible=False to hide the player if you want a pure voice-only experience
-                #visible=False
-            )
-        with gr.Column(scale=1):
-            # The microphone input component
-            mic_input = gr.Audio(
-                label="Speak Here",
-                sources=["microphone"],
-                type="numpy" # Provides (sample_rate, numpy_array)
+        # Checked against the in-process history without the lock, so a reply that is already
+        # under way is known before choosing a backchannel; it is checked again once locked
+        speculation = speculator.check(speculation, user_text, session.history)
+    chat_history_state.append((user_text, ""))
+
+    # Backchannel: acknowledge the user at once, before waiting for the session or any LLM.
+    # The emergency message plays just as fast on its own, and a speculative reply is already
+    # waiting, so neither kind of turn gets one.
+    backchannel_tail = None
+    backchannel = (
+        backchannel_bank.select(user_text)
+        if BACKCHANNEL_ENABLED and not is_emergency and speculation is None else None
+    )
+    if backchannel is not None:
+        phrase, backchannel_audio = backchannel
+        print(f"[Backchannel]: {phrase}")
+        telemetry.increment("backchannels")
+        backchannel_body, backchannel_tail = split_tail(
+            backchannel_audio, BACKCHANNEL_CROSSFADE_SECONDS, TTS_SAMPLE_RATE
+        )
+        backchannel_blend_by = time.monotonic() + max(
+            PCMBuffer(TTS_SAMPLE_RATE, backchannel_body).duration - BACKCHANNEL_BLEND_MARGIN_SECONDS, 0
+        )
+        current_turn_metrics['perceived_time_to_first_audio'] = time.time() - turn_start_time
+        yield chat_history_state, stream_chunk(backchannel_body)
+
+    # Crisis fast path: play the pre-rendered emergency message before the session or any LLM call
+    if is_emergency:
+        crisis_start_time = time.time()
+        chat_history_state[-1] = (user_text, CRISIS_HOTLINES_MESSAGE)
+        crisis_audio_data = await crisis_message_audio()
+        current_turn_metrics['time_to_first_audio'] = time.time() - crisis_start_time
+        current_turn_metrics['perceived_time_to_first_audio'] = time.time() - turn_start_time
+        yield chat_history_state, stream_chunk(crisis_audio_data)
+
+    deferred_validations = []
+    async with session.lock:
+        # Another worker may have served this session since, or the process restarted
+        await sessions.load(session)
+        # A summary finished since the last turn is swapped in before building the prompt
+        apply_background_summary(session)
+        # A reply speculatively started on the interim transcript is kept if it still fits
+        speculation = speculator.resolve(speculation, user_text, session.history)
+        current_turn_metrics.attributes['speculation_hit'] = speculation is not None
+
+        # 2. Update Conversation History with User's Message
+        session.history.append({"role": "user", "content": user_text})
+        response_start_time = time.time()
+        generation_history = session.history
+        spoken_prefix = ""
+        priority = LIVE_REPLY
+
+        # The emergency message has already played; the LLM follows up on it
+        if is_emergency:
+            spoken_prefix = f"{CRISIS_HOTLINES_MESSAGE} "
+            generation_history = crisis_followup_history(session.history)
+            priority = CRISIS_FOLLOWUP
+
+        # 3. Stream Bot's Response (Text and Audio), one sentence at a time
+        final_text = ""
+        reply_updates = stream_bot_response_and_audio(
+            generation_history, current_turn_metrics, deferred_validations, turn_deadline, priority, speculation
+        )
+        if backchannel_tail is not None:
+            reply_updates = crossfade_into_reply(reply_updates, backchannel_tail, backchannel_blend_by)
+        async for reply_text, audio_chunk in reply_updates:
+            if reply_text is None:
+                # The reply was too slow to blend with the backchannel, whose end plays on its own
+                yield chat_history_state, stream_chunk(audio_chunk)
+                continue
+            final_text = spoken_prefix + reply_text
+            chat_history_state[-1] = (user_text, final_text)
+            if audio_chunk and 'time_to_first_audio' not in current_turn_metrics:
+                current_turn_metrics['time_to_first_audio'] = time.time() - response_start_time
+                current_turn_metrics.setdefault('perceived_time_to_first_audio', time.time() - turn_start_time)
+            yield chat_history_state, stream_chunk(audio_chunk)
+
+        # 4. Update History with Bot's Message
+        assistant_message = {"role": "assistant", "content": final_text}
+        session.history.append(assistant_message)
+
+        # 5. Manage history (summarization) and persist the session
+        manage_session_history(session)
+        await sessions.save(session)
+
+    current_turn_metrics['total_turn_latency'] = time.time() - turn_start_time
+
+    # 6. Deferred validation runs after the turn, so it never delays the reply.
+    # Any enhancement is played as a follow-up segment.
+    for gpt_response, user_query, history_snapshot in deferred_validations:
+        enhancement, enhancement_audio = await run_deferred_validation(
+            gpt_response, user_query, history_snapshot, current_turn_metrics
+        )
+        if enhancement:
+            # No await between read and write, so this can't interleave with the next turn
+            assistant_message['content'] = f"{assistant_message['content']} {enhancement}"
+            chat_history_state[-1] = (user_text, assistant_message['content'])
+            await sessions.save(session)
+            yield chat_history_state, stream_chunk(enhancement_audio)
+
+    telemetry.finish_turn(current_turn_metrics)
+
+async def end_session(request: gr.Request):
+    # Free the session's memory (and its stored state) as soon as the browser tab goes away
+    await sessions.remove(request.session_hash)
+    summary_task = summary_tasks.pop(request.session_hash, None)
+    if summary_task is not None:
+        summary_task.cancel()
+    transcriber = close_live_transcriber(request.session_hash)
+    if transcriber is not None:
+        transcriber.cancel()
+        rate_limiter.release(AZURE_STT_LIMIT_KEY)
+    shed_recordings.pop(request.session_hash, None)
+    speculator.discard(speculations.pop(request.session_hash, None), ABANDONED)
+
+def build_demo():
+    """Builds the Gradio UI."""
+    with gr.Blocks(theme=gr.themes.Soft()) as demo:
+        gr.Markdown("# 🤖 Sakina - Omani AI Mental Health Companion")
+        gr.Markdown("Click the 'Record from microphone' button and speak. The bot will listen and respond with voice.")
+
+        with gr.Row():
+            with gr.Column(scale=2):
+                # The visual chatbot display (in Arabic)
+                chatbot_display = gr.Chatbot(
+                    label="Conversation",
+                    rtl=True, # Right-to-Left for Arabic
+                    value=[(None, WELCOME_MESSAGE)]
+                )
+                # The audio output for the bot's voice
+                bot_audio_output = gr.Audio(
+                    label="Bot Response",
+                    autoplay=True,
+                    interactive=False,
+                    streaming=STREAMING_MODE, # Play sentence chunks as they arrive
+                    # Use visible=False to hide the player if you want a pure voice-only experience
+                    #visible=False
+                )
+            with gr.Column(scale=1):
+                # The microphone input component
+                mic_input = gr.Audio(
+                    label="Speak Here",
+                    sources=["microphone"],
+                    type="numpy", # Provides (sample_rate, numpy_array)
+                    streaming=STREAMING_STT # Send chunks while recording for live recognition
+                )
+        # Connect the components. Conversation memory lives in `sessions`, keyed by the Gradio session.
+        if STREAMING_STT:
+            mic_input.stream(
+                fn=stream_microphone_chunk,
+                inputs=[mic_input],
+                outputs=None,
+                stream_every=STT_STREAM_EVERY_SECONDS,
+                concurrency_limit=None # Cheap and non-blocking; never queue one user's audio behind another's
             )
-    # Connect the components
-    mic_input.stop_recording(
-        fn=gradio_interface,
-        inputs=[mic_input, chatbot_display, conversation_summary_state, turns_since_last_summary_state],
-        outputs=[chatbot_display, bot_audio_output, conversation_summary_state, turns_since_last_summary_state]
+        mic_input.stop_recording(
+            fn=gradio_interface_streaming if STREAMING_MODE else gradio_interface,
+            inputs=[mic_input, chatbot_display],
+            outputs=[chatbot_display, bot_audio_output],
+            concurrency_limit=None # Turns are async; sessions must not wait for each other
+        )
+        demo.unload(end_session)
+    return demo
+
+# --- 5. STARTUP WARM-UP AND SERVING ---
+
+async def warm_up_openai():
+    # A one-token completion leaves DNS, TLS and the client's connection pool ready for the first turn
+    await openai_completion(
+        [{"role": "user", "content": "ping"}], max_tokens=1, temperature=0, timeout=WARM_UP_TIMEOUT_SECONDS
+    )
+
+async def warm_up_anthropic():
+    await anthropic_completion(
+        [], max_tokens=1, temperature=0, timeout=WARM_UP_TIMEOUT_SECONDS, trailing_user_message="ping"
+    )
+
+async def warm_up_speech():
+    if speech_stand_in is not None:
+        return
+    await asyncio.to_thread(tts_pool.warm_up)
+    # Connections open asynchronously; wait for the first completed handshake
+    while tts_pool.connected_count() == 0:
+        await asyncio.sleep(0.05)
+
+async def render_fixed_phrases():
+    failed = await tts_cache.presynthesize(
+        TTS_PRESYNTH_PHRASES + backchannel_bank.all_phrases(), synthesize_speech,
+        AZURE_TTS_VOICE_NAME, AZURE_TTS_OUTPUT_FORMAT
     )
+    backchannel_bank.load(lambda text: tts_cache.get(text, AZURE_TTS_VOICE_NAME, AZURE_TTS_OUTPUT_FORMAT))
+    if failed:
+        raise RuntimeError(f"{len(failed)} fixed phrases could not be synthesized")
+
+warm_up = WarmUp(timeout_seconds=WARM_UP_TIMEOUT_SECONDS)
+warm_up.add("openai", warm_up_openai)
+warm_up.add("anthropic", warm_up_anthropic)
+warm_up.add("speech", warm_up_speech)
+warm_up.add("fixed_phrases", render_fixed_phrases)
+
+telemetry.register_gauges("sessions", sessions.metrics)
+telemetry.register_gauges("tts_pool", tts_pool.metrics)
+telemetry.register_gauges("tts_cache", tts_cache.metrics)
+telemetry.register_gauges("validation_policy", validation_policy.metrics)
+telemetry.register_gauges("prompt_cache", prompt_cache_stats.metrics, label="model")
+telemetry.register_gauges("circuit_breaker", router.metrics, label="provider")
+telemetry.register_gauges("rate_limiter", rate_limiter.metrics, label="key")
+telemetry.register_gauges("backchannel", backchannel_bank.metrics)
+telemetry.register_gauges("speculation", speculator.metrics)
+telemetry.register_gauges("warm_up", warm_up.metrics)
+
+@asynccontextmanager
+async def lifespan(app):
+    # Runs in every server process. The server accepts connections at once while the
+    # warm-up checks run concurrently in the background; /ready turns 200 when they pass.
+    warm_up_task = asyncio.create_task(warm_up.run())
+    yield
+    warm_up_task.cancel()
+    await asyncio.to_thread(telemetry.close)
+
+def create_app():
+    """The Gradio app plus /metrics and /ready, served from one FastAPI server."""
+    # Only the server needs FastAPI; importing this module (e.g. from benchmark.py) doesn't
+    from fastapi import FastAPI
+    from fastapi.responses import JSONResponse, PlainTextResponse
+
+    app = FastAPI(lifespan=lifespan)
+
+    @app.get("/metrics")
+    async def metrics_endpoint():
+        # On the event loop, like every other user of the rate limiter (which takes no locks)
+        return PlainTextResponse(telemetry.render_prometheus(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+    @app.get("/ready")
+    def ready_endpoint():
+        status = warm_up.status()
+        return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+    return gr.mount_gradio_app(app, build_demo(), path="/")
 
 if __name__ == "__main__":
-    # Add the initial welcome message to the history for the LLM
-    INITIAL_HISTORY.append({"role": "assistant", "content": "أهلاً بك، أنا سكينة. كيف أقدر أساعدك اليوم؟"})
-    demo.launch(debug=True)
\ No newline at end of file
+    import uvicorn
+    # One process per port: Gradio's queue and the live transcribers, speculations and summary tasks
+    # are in-process state, so scale out with more processes behind a sticky load balancer instead
+    uvicorn.run(create_app(), host=SERVER_HOST, port=SERVER_PORT)
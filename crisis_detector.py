@@ -0,0 +1,170 @@
+import re
+from collections import deque
+
+# --- Local crisis-indicator detection ---
+# Runs on the STT transcript before any LLM call, so a user at risk hears the
+# emergency numbers immediately instead of after the GPT-4o + Opus + TTS round
+# trip. Phrases are matched with an Aho-Corasick automaton over normalized
+# text: one pass over the utterance regardless of how many phrases there are.
+
+HIGH = "high"  # Play the emergency response immediately
+MEDIUM = "medium"  # No fast path, but the turn gets full validation
+
+# Category -> (severity, phrases). Phrases are written in normalized form (see normalize_arabic).
+CRISIS_PHRASES = {
+    "suicidal_ideation": (HIGH, [
+        "ابي اموت", "ابغى اموت", "ابغي اموت", "ودي اموت", "اريد اموت", "اتمنى اموت", "اتمنى الموت",
+        "انتحر", "انتحار", "انتحاري", "بنتحر", "بقتل نفسي", "اقتل نفسي", "ابي اقتل نفسي",
+        "اذبح نفسي", "بذبح نفسي", "انهي حياتي", "بنهي حياتي", "اخلص على نفسي", "بخلص على نفسي",
+        "ما ابي اعيش", "ما ابغى اعيش", "مابي اعيش", "مابغى اعيش", "ما ودي اعيش", "ما اريد اعيش",
+        "الموت ارحم", "الموت احسن", "ابي ارتاح من الدنيا", "ماله داعي اعيش", "ما له داعي اعيش",
+        "الكل بيرتاح مني", "الكل احسن بدوني", "ارمي نفسي",
+        "kill myself", "killing myself", "suicide", "suicidal", "end my life", "end it all",
+        "want to die", "wanna die", "dont want to live", "do not want to live", "better off dead",
+        "better off without me", "no reason to live",
+    ]),
+    "disappearing": (HIGH, [
+        "ابي اختفي", "ابغى اختفي", "ودي اختفي", "اتمنى اختفي", "ابي اختفي من الدنيا",
+        "want to disappear", "wish i could disappear",
+    ]),
+    "self_harm": (HIGH, [
+        "اجرح نفسي", "بجرح نفسي", "جرحت نفسي", "اذي نفسي", "باذي نفسي", "اذيت نفسي", "اضر نفسي",
+        "اضرب نفسي", "اقطع يدي", "قطعت يدي", "شربت حبوب", "بشرب كل الحبوب", "باخذ كل الحبوب",
+        "اخذت حبوب وايد",
+        "hurt myself", "hurting myself", "cut myself", "cutting myself", "self harm", "harm myself",
+        "overdose", "took all the pills",
+    ]),
+    "harm_to_others": (HIGH, [
+        "ابي اقتله", "بقتله", "بقتلهم", "ابي اقتلهم", "بذبحه", "ابي اذيه", "باذيه", "باذي احد",
+        "kill him", "kill her", "kill them", "hurt someone",
+    ]),
+    "imminent_danger": (HIGH, [
+        "معي سكين", "معي حبل", "جهزت الحبوب", "كتبت رساله وداع", "هذي اخر مره",
+        "i have a knife", "i have a rope", "goodbye letter", "suicide note",
+    ]),
+    "substance_abuse": (MEDIUM, [
+        "مخدرات", "حشيش", "شبو", "كحول", "اسكر", "سكران", "جرعه زايده", "ادمان", "مدمن",
+        "drugs", "drunk", "alcohol", "addicted",
+    ]),
+    "hopelessness": (MEDIUM, [
+        "ما في امل", "مافي امل", "فاقد الامل", "ما فيني حيل", "حياتي ما لها معنى", "حياتي مالها معنى",
+        "ما احد بيفتقدني", "تعبت من الحياه", "تعبت من كل شي", "يأس", "ياس", "ميؤوس",
+        "hopeless", "no hope", "give up on life", "cant go on", "can not go on",
+    ]),
+}
+
+# Clitics allowed around an Arabic phrase, e.g. "بالانتحار" or "انتحرت", while "الموتر" (the car)
+# must not match "الموت". English phrases must match whole words.
+ARABIC_PREFIXES = frozenset(["", "و", "ف", "ب", "ل", "ال", "وال", "بال", "فال", "لل", "ول", "وب", "فب"])
+ARABIC_SUFFIXES = frozenset(["", "ت", "ي", "ه", "ها", "هم", "ك", "نا", "ين", "وا", "ون", "ني"])
+
+_ARABIC_LETTERS = re.compile(r"[ء-ي]")
+_NON_WORD = re.compile(r"[^\w]+")
+_NORMALIZATION_TABLE = str.maketrans({
+    **{char: None for char in "ًٌٍَُِّْٰـ"},  # Harakat, superscript alef, tatweel
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+    "ؤ": "و", "ئ": "ي", "ى": "ي", "ی": "ي", "ة": "ه", "ک": "ك",
+    "’": "", "'": "",  # "don't" -> "dont"
+    **{chr(0x0660 + digit): str(digit) for digit in range(10)},  # Arabic-Indic digits
+})
+
+
+def normalize_arabic(text):
+    """
+    Folds spelling variants that STT output and users mix freely:
+    alef/hamza forms, ta marbuta, alef maqsura, diacritics, tatweel, digits, case and punctuation.
+    """
+    text = text.lower().translate(_NORMALIZATION_TABLE)
+    return " ".join(_NON_WORD.sub(" ", text).split())
+
+
+class CrisisMatch:
+    __slots__ = ("phrase", "category", "severity", "start", "end")
+
+    def __init__(self, phrase, category, severity, start, end):
+        self.phrase = phrase
+        self.category = category
+        self.severity = severity
+        self.start = start
+        self.end = end
+
+    def __repr__(self):
+        return f"CrisisMatch({self.phrase!r}, {self.category}, {self.severity})"
+
+
+class CrisisDetector:
+    """Aho-Corasick multi-pattern matcher over normalized transcripts."""
+
+    def __init__(self, phrases=CRISIS_PHRASES):
+        self._goto = [{}]  # state -> {char: next state}
+        self._fail = [0]
+        self._outputs = [[]]  # state -> [(phrase, category, severity, is_arabic)]
+        for category, (severity, category_phrases) in phrases.items():
+            for phrase in category_phrases:
+                self._add(normalize_arabic(phrase), category, severity)
+        self._build_failure_links()
+
+    def _add(self, phrase, category, severity):
+        state = 0
+        for char in phrase:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append([])
+            state = next_state
+        output = (phrase, category, severity, bool(_ARABIC_LETTERS.search(phrase)))
+        # Spelling variants (e.g. "ابغى"/"ابغي") collapse to one phrase after normalization
+        if output not in self._outputs[state]:
+            self._outputs[state].append(output)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._outputs[next_state] = self._outputs[next_state] + self._outputs[self._fail[next_state]]
+
+    def find(self, text, normalized=False):
+        """Returns every CrisisMatch in the text (normalized first unless already normalized)."""
+        if not normalized:
+            text = normalize_arabic(text)
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        matches = []
+        state = 0
+        for i, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for phrase, category, severity, is_arabic in outputs[state]:
+                start, end = i + 1 - len(phrase), i + 1
+                if _at_word_boundary(text, start, end, is_arabic):
+                    matches.append(CrisisMatch(phrase, category, severity, start, end))
+        return matches
+
+    def is_emergency(self, text, matches=None):
+        """Whether the text calls for the emergency fast path. Pass `matches` if find() already ran on it."""
+        if matches is None:
+            matches = self.find(text)
+        return any(match.severity == HIGH for match in matches)
+
+    def is_risky(self, text):
+        return bool(self.find(text))
+
+
+def _at_word_boundary(text, start, end, is_arabic):
+    word_start = text.rfind(" ", 0, start) + 1
+    word_end = text.find(" ", end)
+    if word_end == -1:
+        word_end = len(text)
+    prefix, suffix = text[word_start:start], text[end:word_end]
+    if is_arabic:
+        return prefix in ARABIC_PREFIXES and suffix in ARABIC_SUFFIXES
+    return not prefix and not suffix
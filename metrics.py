@@ -0,0 +1,217 @@
+import bisect
+import json
+import queue
+import threading
+import time
+
+# --- Turn instrumentation ---
+# Every turn gets a TurnTrace: a dict of stage name -> seconds, filled in by
+# the pipeline as each stage finishes. When the turn ends, its spans feed
+# per-stage latency histograms with fixed buckets, so memory stays flat no
+# matter how many turns are served. Counters track failures, fallbacks and
+# validation outcomes. Everything is exported as Prometheus text, and each
+# finished trace can also be appended to a JSONL file by a writer thread.
+
+# Bucket upper bounds in seconds: 1 ms to about 60 s, growing by 25% per bucket
+DEFAULT_BUCKETS = tuple(round(0.001 * 1.25 ** i, 6) for i in range(50))
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class LatencyHistogram:
+    """Fixed-bucket histogram. Percentiles are interpolated within the bucket they fall in."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last slot counts values above the largest bucket
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q):
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / bucket_count, self.max)
+            seen += bucket_count
+        return self.max
+
+
+class TurnTrace(dict):
+    """
+    Spans of one turn (stage name -> seconds). A plain dict to the pipeline, so stage
+    helpers can keep writing `metrics['2_gpt4o_latency'] = ...`.
+    """
+
+    def __init__(self, session_id):
+        super().__init__()
+        self.session_id = session_id
+        self.started_at = time.time()
+        self.attributes = {}  # Non-latency facts about the turn, e.g. whether the crisis path ran
+
+
+class Telemetry:
+    """
+    Thread-safe registry of stage histograms and counters for the whole app.
+    """
+
+    def __init__(self, namespace="sakina", buckets=DEFAULT_BUCKETS, trace_path=None):
+        self.namespace = namespace
+        self.buckets = buckets
+        self.trace_path = trace_path
+        self._histograms = {}  # stage -> LatencyHistogram
+        self._counters = {}  # (name, sorted label items) -> count
+        self._gauge_sources = []  # (name, callable, label name or None)
+        self._lock = threading.Lock()
+        self._trace_queue = None  # Lines for the trace writer thread, started by the first trace
+        self._trace_writer = None
+
+    def start_turn(self, session_id):
+        return TurnTrace(session_id)
+
+    def finish_turn(self, trace):
+        """Feeds the turn's spans into the histograms, prints them and writes the trace."""
+        for stage, seconds in trace.items():
+            self.observe(stage, seconds)
+        self.increment("turns")
+
+        print("\n--- PERFORMANCE METRICS FOR THIS TURN ---")
+        for key, value in trace.items():
+            print(f"{key}: {value:.4f} seconds")
+        print("-----------------------------------------\n")
+
+        if self.trace_path:
+            record = {
+                "session": trace.session_id[:8], "started_at": trace.started_at,
+                "spans": dict(trace), **trace.attributes,
+            }
+            self._queue_trace(json.dumps(record, ensure_ascii=False))
+
+    def _queue_trace(self, line):
+        # finish_turn runs on the event loop, so a writer thread does the file I/O
+        with self._lock:
+            if self._trace_writer is None:
+                self._trace_queue = queue.SimpleQueue()
+                self._trace_writer = threading.Thread(target=self._write_traces, name="telemetry-traces", daemon=True)
+                self._trace_writer.start()
+        self._trace_queue.put(line)
+
+    def _write_traces(self):
+        with open(self.trace_path, "a", encoding="utf-8") as trace_file:
+            while True:
+                line = self._trace_queue.get()
+                if line is None:
+                    return
+                trace_file.write(line + "\n")
+                trace_file.flush()
+
+    def close(self):
+        """Waits for queued traces to reach the file. Call once, at shutdown."""
+        with self._lock:
+            writer, self._trace_writer = self._trace_writer, None
+        if writer is not None:
+            self._trace_queue.put(None)
+            writer.join()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = LatencyHistogram(self.buckets)
+            histogram.observe(seconds)
+
+    def increment(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def register_gauges(self, name, source, label=None):
+        """
+        Exports the numbers returned by `source()` (e.g. a component's `metrics()`) as gauges.
+        With `label`, `source()` returns {label value: {key: number}} instead.
+        """
+        self._gauge_sources.append((name, source, label))
+
+    def snapshot(self):
+        """Counts, p50/p95/p99 and max per stage, plus all counters."""
+        with self._lock:
+            stages = {
+                stage: {"count": h.count, "p50": h.percentile(0.5), "p95": h.percentile(0.95),
+                        "p99": h.percentile(0.99), "max": h.max}
+                for stage, h in self._histograms.items()
+            }
+            counters = {_series_name(name, labels): value for (name, labels), value in self._counters.items()}
+        return {"stages": stages, "counters": counters}
+
+    def render_prometheus(self):
+        ns = self.namespace
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+
+            lines.append(f"# HELP {ns}_stage_latency_seconds Latency of each turn stage.")
+            lines.append(f"# TYPE {ns}_stage_latency_seconds histogram")
+            for stage, h in histograms:
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, h.counts):
+                    cumulative += bucket_count
+                    lines.append(f'{ns}_stage_latency_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{ns}_stage_latency_seconds_bucket{{stage="{stage}",le="+Inf"}} {h.count}')
+                lines.append(f'{ns}_stage_latency_seconds_sum{{stage="{stage}"}} {h.sum}')
+                lines.append(f'{ns}_stage_latency_seconds_count{{stage="{stage}"}} {h.count}')
+
+            lines.append(f"# HELP {ns}_stage_latency_quantile_seconds Estimated p50/p95/p99 per stage.")
+            lines.append(f"# TYPE {ns}_stage_latency_quantile_seconds gauge")
+            for stage, h in histograms:
+                for q in (0.5, 0.95, 0.99):
+                    lines.append(f'{ns}_stage_latency_quantile_seconds{{stage="{stage}",quantile="{q}"}} {h.percentile(q)}')
+
+        declared = set()
+        for (name, labels), value in counters:
+            metric = f"{ns}_{name}_total"
+            if metric not in declared:
+                declared.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{_format_labels(labels)} {value}")
+
+        # Gauge sources take their own locks, so they are read outside ours
+        for name, source, label in self._gauge_sources:
+            try:
+                values = source()
+            except Exception as e:
+                print(f"[Telemetry]: Gauge source '{name}' failed: {e}")
+                continue
+            series = values.items() if label else [(None, values)]
+            for label_value, group in series:
+                for key, value in group.items():
+                    if not isinstance(value, (int, float)):
+                        continue
+                    metric = f"{ns}_{name}_{key}"
+                    if metric not in declared:
+                        declared.add(metric)
+                        lines.append(f"# TYPE {metric} gauge")
+                    labels = ((label, label_value),) if label else ()
+                    lines.append(f"{metric}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+def _series_name(name, labels):
+    return name + _format_labels(labels)
@@ -0,0 +1,90 @@
+import threading
+
+# --- Prompt context assembly and prompt-cache accounting ---
+# Both providers reuse work for a prompt prefix they have seen recently:
+# OpenAI automatically (prompts over 1024 tokens), Anthropic at explicit
+# `cache_control` breakpoints. A hit needs the prefix to be byte-identical,
+# so the context is always laid out as: system prompt, rolling summary,
+# then the conversation turns, with anything turn-specific at the very end.
+
+EPHEMERAL = {"type": "ephemeral"}
+
+
+def split_history(conv_history):
+    """
+    Splits a session history into (leading system messages, turns, notes).
+    Leading system messages are the system prompt and the rolling summary; notes are
+    system messages further down (e.g. the crisis follow-up instruction).
+    """
+    leading = 0
+    while leading < len(conv_history) and conv_history[leading]['role'] == 'system':
+        leading += 1
+    turns = [msg for msg in conv_history[leading:] if msg['role'] != 'system']
+    notes = [msg['content'] for msg in conv_history[leading:] if msg['role'] == 'system']
+    return conv_history[:leading], turns, notes
+
+
+def build_anthropic_request(conv_history, trailing_user_message=None):
+    """
+    Returns the `system` and `messages` arguments for messages.create.
+    The system prompt and the summary are separate cached blocks, so a new summary does not
+    invalidate the system prompt, and the last history message carries a breakpoint so the
+    next turn reads the whole conversation so far from cache.
+    Anthropic allows four breakpoints per request; this uses at most three.
+    """
+    leading, turns, notes = split_history(conv_history)
+    system = [{"type": "text", "text": msg['content'], "cache_control": EPHEMERAL} for msg in leading[:2]]
+    # Notes change from turn to turn, so they go after the cached blocks
+    uncached_system = [msg['content'] for msg in leading[2:]] + notes
+    if uncached_system:
+        system.append({"type": "text", "text": "\n\n".join(uncached_system)})
+
+    messages = [{"role": msg['role'], "content": msg['content']} for msg in turns]
+    if messages:
+        messages[-1]['content'] = [{"type": "text", "text": messages[-1]['content'], "cache_control": EPHEMERAL}]
+    if trailing_user_message is not None:
+        messages.append({"role": "user", "content": trailing_user_message})
+    return system, messages
+
+
+class PromptCacheStats:
+    """Running totals of prompt tokens and prompt-cache hits, per model."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {}  # model -> {"calls", "input_tokens", "cached_tokens", "cache_write_tokens"}
+
+    def record(self, model, input_tokens, cached_tokens, cache_write_tokens=0):
+        with self._lock:
+            totals = self._totals.setdefault(
+                model, {"calls": 0, "input_tokens": 0, "cached_tokens": 0, "cache_write_tokens": 0}
+            )
+            totals["calls"] += 1
+            totals["input_tokens"] += input_tokens
+            totals["cached_tokens"] += cached_tokens
+            totals["cache_write_tokens"] += cache_write_tokens
+        print(f"[Prompt cache] {model}: {cached_tokens}/{input_tokens} input tokens cached"
+              + (f", {cache_write_tokens} written" if cache_write_tokens else ""))
+
+    def record_openai(self, model, usage):
+        """`usage` from a chat completion (or the last chunk of a stream with include_usage)."""
+        if usage is None:
+            return
+        details = usage.prompt_tokens_details
+        cached = (details.cached_tokens or 0) if details is not None else 0
+        self.record(model, usage.prompt_tokens, cached)
+
+    def record_anthropic(self, model, usage):
+        """Anthropic reports uncached, cache-read and cache-write input tokens separately."""
+        if usage is None:
+            return
+        cached = usage.cache_read_input_tokens or 0
+        written = usage.cache_creation_input_tokens or 0
+        self.record(model, usage.input_tokens + cached + written, cached, written)
+
+    def metrics(self):
+        with self._lock:
+            return {
+                model: {**totals, "hit_ratio": totals["cached_tokens"] / totals["input_tokens"] if totals["input_tokens"] else 0.0}
+                for model, totals in self._totals.items()
+            }
@@ -0,0 +1,253 @@
+import asyncio
+import threading
+import time
+from collections import deque
+
+# --- Deadline-aware routing between GPT-4o and Claude ---
+# Every LLM call (reply, streamed reply, validation, summary) names an
+# ordered list of providers. The router skips providers whose circuit
+# breaker is open, gives each attempt only the time left before the call's
+# deadline, and hedges: if the first provider has not answered within its
+# recent p95 latency, the next one is started too and the first success wins.
+# A brownout therefore costs about one p95 wait, not a full timeout plus
+# retries, and once a breaker trips traffic goes straight to the healthy
+# provider until a probe call succeeds.
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class AllProvidersFailed(Exception):
+    """No provider produced a result before the deadline; the message says why."""
+
+
+async def _close_result(result):
+    """Closes a result nobody will use, e.g. the chunk generator in open_gpt_stream's (first_chunk, chunks)."""
+    for item in result if isinstance(result, tuple) else (result,):
+        if hasattr(item, "aclose"):
+            await item.aclose()
+
+
+class CircuitBreaker:
+    """
+    Failure-rate breaker over the last `window` calls. Slow calls (over `slow_call_seconds`)
+    count against the provider like failures. After `open_seconds` one probe call is let
+    through; its outcome closes or reopens the breaker.
+    """
+
+    def __init__(self, name, window=20, min_calls=5, failure_ratio=0.5, slow_call_seconds=8.0,
+                 open_seconds=30.0, clock=time.monotonic):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.clock = clock
+        self.state = CLOSED
+        self.times_opened = 0
+        self._outcomes = deque(maxlen=window)  # True for a bad call (failed or slow)
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def available(self):
+        """Whether a call would be let through right now (without claiming the probe)."""
+        with self._lock:
+            if self.state == OPEN:
+                return self.clock() - self._opened_at >= self.open_seconds
+            return self.state == CLOSED or not self._probe_in_flight
+
+    def allow(self):
+        """Claims permission for one call; in the half-open state only one probe is allowed at a time."""
+        with self._lock:
+            if self.state == OPEN and self.clock() - self._opened_at >= self.open_seconds:
+                self.state = HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == HALF_OPEN:
+                if self._probe_in_flight:
+                    return False
+                self._probe_in_flight = True
+                return True
+            return self.state == CLOSED
+
+    def record(self, ok, seconds=0.0):
+        bad = not ok or seconds > self.slow_call_seconds
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probe_in_flight = False
+                if bad:
+                    self._open()
+                else:
+                    self.state = CLOSED
+                    self._outcomes.clear()
+                return
+            self._outcomes.append(bad)
+            if (self.state == CLOSED and len(self._outcomes) >= self.min_calls
+                    and sum(self._outcomes) / len(self._outcomes) >= self.failure_ratio):
+                self._open()
+
+    def release(self):
+        """The call was abandoned (e.g. it lost a hedge); a pending probe may be retried."""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probe_in_flight = False
+
+    def _open(self):
+        # Caller holds self._lock
+        self.state = OPEN
+        self._opened_at = self.clock()
+        self.times_opened += 1
+        print(f"[Router]: Circuit breaker for '{self.name}' opened.")
+
+
+class LatencyWindow:
+    """Recent latencies of one (provider, operation), for the hedging threshold."""
+
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q, min_samples):
+        with self._lock:
+            if len(self._samples) < min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class ProviderRouter:
+    """
+    Runs one logical LLM call against an ordered list of providers.
+    `telemetry`, if given, is a metrics.Telemetry that receives call, hedge and failure counters.
+    `ignored_errors` are exception types that say nothing about a provider's health (e.g. the
+    call was shed locally); they fail the attempt without counting against its breaker.
+    """
+
+    def __init__(self, providers, hedge_quantile=0.95, min_samples=20, default_hedge_delay=2.0,
+                 min_hedge_delay=0.3, breaker_factory=CircuitBreaker, telemetry=None, ignored_errors=()):
+        self.breakers = {name: breaker_factory(name) for name in providers}
+        self.hedge_quantile = hedge_quantile
+        self.min_samples = min_samples
+        self.default_hedge_delay = default_hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.telemetry = telemetry
+        self.ignored_errors = tuple(ignored_errors)
+        self._latencies = {}  # (provider, operation) -> LatencyWindow
+        self._lock = threading.Lock()
+
+    def hedge_delay(self, provider, operation):
+        """How long to wait for `provider` before also starting the next one: its recent p95."""
+        recent = self._window(provider, operation).quantile(self.hedge_quantile, self.min_samples)
+        return max(recent if recent is not None else self.default_hedge_delay, self.min_hedge_delay)
+
+    async def call(self, operation, attempts, deadline, hedge=True):
+        """
+        Returns (provider, result) from the first attempt that succeeds.
+        `attempts` is an ordered list of (provider, factory); `factory(timeout)` returns an awaitable.
+        `deadline` is a time.monotonic() value. Raises AllProvidersFailed.
+        """
+        queue = [(provider, factory) for provider, factory in attempts if self.breakers[provider].available()]
+        # With every breaker open, try the preferred provider anyway rather than fail outright
+        forced = not queue
+        if forced:
+            queue = attempts[:1]
+        pending = {}  # task -> (provider, start time)
+        failures = []  # "provider: error" of every attempt that failed, for the final error
+
+        def launch():
+            while queue:
+                provider, factory = queue.pop(0)
+                if not (self.breakers[provider].allow() or forced):
+                    continue
+                remaining = deadline - time.monotonic()
+                task = asyncio.ensure_future(asyncio.wait_for(factory(remaining), remaining))
+                pending[task] = (provider, time.monotonic())
+                return
+
+        launch()
+        try:
+            while pending:
+                now = time.monotonic()
+                wait_timeout = deadline - now
+                if hedge and queue:
+                    newest_provider, newest_start = list(pending.values())[-1]
+                    hedge_at = newest_start + self.hedge_delay(newest_provider, operation)
+                    wait_timeout = min(wait_timeout, hedge_at - now)
+                done, _ = await asyncio.wait(pending, timeout=max(wait_timeout, 0), return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    if time.monotonic() >= deadline:
+                        break
+                    self._count("router_hedges", operation=operation, provider=queue[0][0])
+                    launch()
+                    continue
+
+                winner = None
+                for task in done:
+                    provider, started = pending.pop(task)
+                    seconds = time.monotonic() - started
+                    if not task.cancelled() and task.exception() is None:
+                        if winner is not None:
+                            # Finished in the same instant as the winner: nobody will use it
+                            self.breakers[provider].release()
+                            await _close_result(task.result())
+                            continue
+                        self._window(provider, operation).add(seconds)
+                        self.breakers[provider].record(True, seconds)
+                        self._count("router_calls", operation=operation, provider=provider, outcome="ok")
+                        winner = provider, task.result()
+                        continue
+                    error = "cancelled" if task.cancelled() else repr(task.exception())
+                    print(f"[Router]: {operation} via {provider} failed after {seconds:.2f}s: {error}")
+                    failures.append(f"{provider}: {error}")
+                    if not task.cancelled() and isinstance(task.exception(), self.ignored_errors):
+                        self.breakers[provider].release()
+                        self._count("router_calls", operation=operation, provider=provider, outcome="shed")
+                    else:
+                        self.breakers[provider].record(False, seconds)
+                        self._count("router_calls", operation=operation, provider=provider, outcome="error")
+                if winner is not None:
+                    return winner
+                # Fail over at once instead of waiting for the hedge timer
+                if not pending and queue:
+                    launch()
+            if not pending:
+                if failures:
+                    raise AllProvidersFailed(f"{operation}: every provider failed ({'; '.join(failures)})")
+                raise AllProvidersFailed(f"{operation}: no provider available, circuit breakers open")
+            # Deadline passed with attempts still running: they count as timeouts
+            for provider, started in pending.values():
+                self.breakers[provider].record(False, time.monotonic() - started)
+                self._count("router_calls", operation=operation, provider=provider, outcome="timeout")
+            raise AllProvidersFailed(f"{operation}: no provider answered before the deadline")
+        finally:
+            for task in pending:
+                task.cancel()
+                self.breakers[pending[task][0]].release()
+
+    def record_failure(self, provider):
+        """For failures the router can't see, e.g. a stream that breaks after its first token."""
+        self.breakers[provider].record(False)
+
+    def metrics(self):
+        return {
+            name: {"open": int(breaker.state == OPEN), "half_open": int(breaker.state == HALF_OPEN),
+                   "times_opened": breaker.times_opened}
+            for name, breaker in self.breakers.items()
+        }
+
+    def _window(self, provider, operation):
+        with self._lock:
+            window = self._latencies.get((provider, operation))
+            if window is None:
+                window = self._latencies[(provider, operation)] = LatencyWindow()
+            return window
+
+    def _count(self, name, **labels):
+        if self.telemetry is not None:
+            self.telemetry.increment(name, **labels)
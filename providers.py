@@ -0,0 +1,278 @@
+import asyncio
+import importlib
+import math
+import random
+import threading
+import time
+import types
+
+# --- Provider backends ---
+# chatbot.py talks to three services: OpenAI (chat.completions), Anthropic
+# (messages) and Azure Speech. With PROVIDER_BACKEND=live the real clients are
+# used. They are created, and their SDKs imported, on first use, so importing
+# the app needs no keys. With PROVIDER_BACKEND=fake every call goes to the
+# local stand-ins below instead.
+# They have the same call shapes, configurable latency distributions and
+# failure rates, and canned Omani Arabic replies, so the whole pipeline can be
+# load-tested offline (see `python benchmark.py load`).
+
+LIVE = "live"
+FAKE = "fake"
+
+# Canned material for the stand-ins
+FAKE_USER_UTTERANCES = [
+    "والله اليوم كان يوم طويل في الدوام وأحس إني تعبان",
+    "ما نمت زين البارحة، فكري مشغول بالامتحانات",
+    "أحس بالقلق من كل شي هالأيام وما أعرف ليش",
+    "تضايقت من صاحبي لأنه ما رد علي من أسبوع",
+    "أبغى أتعلم كيف أرتاح قبل النوم",
+    "أحياناً أحس ما في امل أتحسن",
+]
+FAKE_GPT_REPLIES = [
+    "أفهم عليك، الدوام الطويل يتعب الواحد. شو أكثر شي ضايقك اليوم؟",
+    "قلة النوم تأثر على كل شي. جرب تكتب اللي في بالك قبل لا ترقد، وخبرني كيف تحس.",
+    "القلق شعور طبيعي يا عزيزي، وكلنا نمر فيه. متى بديت تلاحظ هالإحساس؟",
+    "زعلك من صاحبك مفهوم. يمكن عنده ظروف، شو رايك تسأله بهدوء؟",
+]
+FAKE_VALIDATION_ENHANCEMENTS = [
+    "وتذكر إنك مب بروحك، وأنا هني أسمعك.",
+    "وخذ وقتك، ما في شي يستعجلك.",
+]
+FAKE_SUMMARY = "يشعر المستخدم بالتعب والقلق بسبب ضغط الدوام وقلة النوم، وتمت مناقشة طرق للاسترخاء."
+
+FAKE_AUDIO_SAMPLE_RATE = 24000  # Matches the app's raw PCM TTS output format
+FAKE_SPEECH_SECONDS_PER_CHAR = 0.06  # Roughly the speaking rate of the Azure voice
+STREAMING_STT_TAIL_FRACTION = 0.3  # Share of the batch STT latency left after streaming recognition
+FAKE_WORDS_PER_SECOND = 3.0  # Interim hypotheses grow by this many words per second of streamed audio
+FAKE_INTERIM_LAG_SECONDS = 0.5  # Audio before the first interim hypothesis
+FAKE_FINAL_REVISION_RATE = 0.2  # Share of utterances whose final transcript differs from the last hypothesis
+FAKE_FINAL_REVISIONS = ["بس ما أعرف شو أسوي", "وما قدرت أكلم أحد"]
+
+
+class ProviderUnavailable(Exception):
+    """Raised by the stand-ins to simulate a failed provider call."""
+
+
+class LatencyModel:
+    """
+    Log-normal latency given its median and p95, in seconds, plus a failure rate.
+    `scale` multiplies every sample (0 turns the stand-in into a no-delay stub).
+    """
+
+    def __init__(self, median, p95, failure_rate=0.0, scale=1.0, rng=None):
+        self.median = median
+        self.sigma = math.log(p95 / median) / 1.645 if p95 > median else 0.0
+        self.failure_rate = failure_rate
+        self.scale = scale
+        self.rng = rng or random.Random()
+
+    def sample(self):
+        return self.median * math.exp(self.rng.gauss(0, self.sigma)) * self.scale
+
+    async def wait(self, call):
+        """Sleeps for one sampled latency, then fails the call at the configured rate."""
+        await asyncio.sleep(self.sample())
+        if self.rng.random() < self.failure_rate:
+            raise ProviderUnavailable(f"Simulated {call} failure")
+
+
+class LazyClient:
+    """Creates the real SDK client on first attribute access."""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._factory()
+        return getattr(self._client, name)
+
+
+class LazyModule:
+    """Imports a module on first attribute access, e.g. an SDK that only the live backend needs."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attribute):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attribute)
+
+
+def _usage_openai(prompt_tokens):
+    return types.SimpleNamespace(
+        prompt_tokens=prompt_tokens, completion_tokens=40,
+        prompt_tokens_details=types.SimpleNamespace(cached_tokens=0),
+    )
+
+
+def _estimate_tokens(messages):
+    return sum(len(str(msg.get('content', ''))) for msg in messages) // 3
+
+
+class _FakeChatStream:
+    def __init__(self, words, token_latency, usage):
+        self._words = words
+        self._token_latency = token_latency
+        self._usage = usage
+        self._closed = False
+
+    def __aiter__(self):
+        return self._events()
+
+    async def _events(self):
+        for word in self._words:
+            if self._closed:
+                return
+            await asyncio.sleep(self._token_latency.sample())
+            delta = types.SimpleNamespace(content=word)
+            yield types.SimpleNamespace(choices=[types.SimpleNamespace(delta=delta)], usage=None)
+        yield types.SimpleNamespace(choices=[], usage=self._usage)
+
+    async def close(self):
+        self._closed = True
+
+
+class FakeOpenAI:
+    """Stand-in for openai.AsyncOpenAI: `chat.completions.create`, streaming or not."""
+
+    def __init__(self, first_token_latency, token_latency, replies=FAKE_GPT_REPLIES, rng=None):
+        self.first_token_latency = first_token_latency
+        self.token_latency = token_latency
+        self.replies = replies
+        self.rng = rng or random.Random()
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self._create))
+
+    async def _create(self, model, messages, stream=False, **kwargs):
+        await self.first_token_latency.wait("chat completion")
+        is_summary = len(messages) == 1
+        reply = FAKE_SUMMARY if is_summary else self.rng.choice(self.replies)
+        usage = _usage_openai(_estimate_tokens(messages))
+        if stream:
+            words = [word + " " for word in reply.split(" ")]
+            return _FakeChatStream(words, self.token_latency, usage)
+        # A non-streamed reply arrives all at once, after every token is generated
+        await asyncio.sleep(sum(self.token_latency.sample() for _ in reply.split(" ")))
+        message = types.SimpleNamespace(content=reply)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=usage)
+
+
+class FakeAnthropic:
+    """Stand-in for anthropic.AsyncAnthropic: `messages.create` for fallbacks and validation."""
+
+    def __init__(self, latency, good_rate=0.7, rng=None):
+        self.latency = latency
+        self.good_rate = good_rate
+        self.rng = rng or random.Random()
+        self.messages = types.SimpleNamespace(create=self._create)
+
+    async def _create(self, model, messages, max_tokens, **kwargs):
+        await self.latency.wait("messages")
+        if max_tokens <= 100 and self.rng.random() < self.good_rate:  # The validation call
+            text = "good"
+        elif max_tokens <= 100:
+            text = self.rng.choice(FAKE_VALIDATION_ENHANCEMENTS)
+        else:
+            text = self.rng.choice(FAKE_GPT_REPLIES)
+        usage = types.SimpleNamespace(
+            input_tokens=_estimate_tokens(messages), cache_read_input_tokens=0, cache_creation_input_tokens=0
+        )
+        return types.SimpleNamespace(content=[types.SimpleNamespace(text=text)], usage=usage)
+
+
+def silent_pcm(seconds, sample_rate=FAKE_AUDIO_SAMPLE_RATE):
+    """Raw 16-bit mono PCM silence, like the app's TTS output format."""
+    return bytes(2 * int(seconds * sample_rate))
+
+
+class FakeTranscriber:
+    """
+    Same interface as streaming_stt.StreamingTranscriber. Interim hypotheses reveal the
+    utterance word by word as audio is pushed; now and then the final transcript revises it.
+    """
+
+    def __init__(self, speech, sample_rate):
+        self.speech = speech
+        self.sample_rate = sample_rate
+        self.bytes_pushed = 0
+        self.text = ""
+        self.last_result_time = None
+        self._words = speech.rng.choice(speech.utterances).split()
+        self._revised = speech.rng.random() < FAKE_FINAL_REVISION_RATE
+
+    def push(self, audio_bytes):
+        self.bytes_pushed += len(audio_bytes)
+        audio_seconds = self.bytes_pushed / (2 * self.sample_rate)
+        revealed = int(max(audio_seconds - FAKE_INTERIM_LAG_SECONDS, 0) * FAKE_WORDS_PER_SECOND)
+        text = " ".join(self._words[:revealed])
+        if text != self.text:
+            self.text = text
+            self.last_result_time = time.time()
+
+    def finish(self, timeout=3.0):
+        # Blocking like the real one. Only the tail of the utterance is left to recognize,
+        # so this takes a fraction of the batch latency.
+        latency = self.speech.stt_latency
+        time.sleep(latency.sample() * STREAMING_STT_TAIL_FRACTION)
+        if not self.bytes_pushed or latency.rng.random() < latency.failure_rate:
+            return None
+        transcript = " ".join(self._words)
+        if self._revised:
+            transcript = f"{transcript} {self.speech.rng.choice(FAKE_FINAL_REVISIONS)}"
+        return transcript
+
+    def cancel(self):
+        pass
+
+
+class FakeSpeech:
+    """
+    Stand-in for Azure Speech. `synthesize` returns silent PCM audio as long as the text
+    would take to say; `transcribe` returns a canned utterance. Failures return None,
+    like the Azure code paths do.
+    """
+
+    def __init__(self, tts_latency, stt_latency, utterances=FAKE_USER_UTTERANCES, rng=None):
+        self.tts_latency = tts_latency
+        self.stt_latency = stt_latency
+        self.utterances = utterances
+        self.rng = rng or random.Random()
+
+    async def synthesize(self, text):
+        try:
+            await self.tts_latency.wait("speech synthesis")
+        except ProviderUnavailable:
+            return None
+        return silent_pcm(len(text) * FAKE_SPEECH_SECONDS_PER_CHAR)
+
+    async def transcribe(self, audio_data, sample_rate):
+        try:
+            await self.stt_latency.wait("speech recognition")
+        except ProviderUnavailable:
+            return None
+        return self.rng.choice(self.utterances)
+
+    def create_transcriber(self, sample_rate):
+        return FakeTranscriber(self, sample_rate)
+
+
+def create_fake_providers(latency_scale=1.0, failure_rate=0.0, validation_good_rate=0.7, seed=None):
+    """
+    Returns (openai_client, anthropic_client, speech) stand-ins.
+    Default latencies are rough production figures (median, p95) for each service.
+    """
+    rng = random.Random(seed)
+
+    def latency(median, p95, failures=failure_rate):
+        return LatencyModel(median, p95, failures, latency_scale, random.Random(rng.random()))
+
+    openai_client = FakeOpenAI(latency(0.45, 1.2), latency(0.025, 0.06, 0.0), rng=random.Random(rng.random()))
+    anthropic_client = FakeAnthropic(latency(2.5, 6.0), validation_good_rate, rng=random.Random(rng.random()))
+    speech = FakeSpeech(latency(0.35, 0.9), latency(0.6, 1.5), rng=random.Random(rng.random()))
+    return openai_client, anthropic_client, speech
@@ -0,0 +1,280 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+
+# --- Shared provider rate limiting and priority scheduling ---
+# Every provider call from the app first takes a slot from the limiter for
+# its provider and model. The limiter enforces requests-per-minute and
+# tokens-per-minute token buckets plus a concurrency cap. When a bucket runs
+# dry, waiting calls are served strictly by priority class, so a live reply
+# never queues behind a background summary. Lower classes also leave part of
+# each bucket untouched for the classes above them, and are shed (RateLimited)
+# if they would wait longer than their class allows. Callers already treat a
+# failed validation or summary as "skip it this turn". The limiter is not
+# thread-safe; it is used from the event loop only.
+# Buckets live in process memory. When several app processes share one
+# account, each is given an equal share of the quotas (split_limits) rather
+# than coordinating through a shared store: no extra round trip per call,
+# at the cost of one process not borrowing another's idle share.
+
+LIVE_REPLY = "live_reply"
+CRISIS_FOLLOWUP = "crisis_followup"
+VALIDATION = "validation"
+SUMMARY = "summary"
+PRIORITY_CLASSES = (LIVE_REPLY, CRISIS_FOLLOWUP, VALIDATION, SUMMARY)  # Highest first
+
+# Fraction of each bucket a class may not use, kept for the classes above it
+DEFAULT_RESERVES = {LIVE_REPLY: 0.0, CRISIS_FOLLOWUP: 0.0, VALIDATION: 0.2, SUMMARY: 0.5}
+# Longest a class may wait for a slot before it is shed; None waits until the caller gives up
+DEFAULT_MAX_WAIT_SECONDS = {LIVE_REPLY: None, CRISIS_FOLLOWUP: None, VALIDATION: 2.0, SUMMARY: 60.0}
+BURST_SECONDS = 10.0  # Bucket capacity, in seconds' worth of the per-minute rate
+THROTTLE_PAUSE_SECONDS = 1.0  # Pause after a 429 that came without a Retry-After header
+
+
+def split_limits(limits, processes):
+    """Each process's share of account-wide `limits` when `processes` app processes use the same account."""
+    if processes <= 1:
+        return {key: dict(options) for key, options in limits.items()}
+    return {
+        key: {name: max(value // processes, 1) if name == "max_concurrency" else value / processes
+              for name, value in options.items()}
+        for key, options in limits.items()
+    }
+
+
+class RateLimited(Exception):
+    """The call was shed: its class would have waited too long for a slot."""
+
+
+class TokenBucket:
+    """Refills continuously at `per_minute / 60` per second, up to `capacity`."""
+
+    def __init__(self, per_minute, capacity=None, clock=time.monotonic):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or self.rate * BURST_SECONDS
+        self.clock = clock
+        self.level = self.capacity
+        self._updated = clock()
+
+    def refill(self):
+        now = self.clock()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def cost(self, amount):
+        # A single call bigger than the whole bucket would otherwise never be granted
+        return min(amount, self.capacity)
+
+    def seconds_until(self, amount, reserve_fraction=0.0):
+        """Time until `amount` can be taken while leaving `reserve_fraction` of the capacity."""
+        missing = self.cost(amount) + reserve_fraction * self.capacity - self.level
+        if missing <= 0:
+            return 0.0
+        # A reserve larger than the capacity allows would never clear; cap at one full refill
+        return min(missing, self.capacity) / self.rate
+
+    def take(self, amount):
+        self.level -= self.cost(amount)
+
+
+class _Waiter:
+    __slots__ = ("rank", "seq", "priority", "tokens", "future", "enqueued_at")
+
+    def __init__(self, rank, seq, priority, tokens, future):
+        self.rank = rank
+        self.seq = seq
+        self.priority = priority
+        self.tokens = tokens
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+    def __lt__(self, other):
+        return (self.rank, self.seq) < (other.rank, other.seq)
+
+
+class _ProviderQueue:
+    """Buckets, concurrency count and priority-ordered waiters of one provider/model."""
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None, max_concurrency=None, clock=time.monotonic):
+        self.requests = TokenBucket(requests_per_minute, clock=clock) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute, clock=clock) if tokens_per_minute else None
+        self.max_concurrency = max_concurrency
+        self.clock = clock
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.waiters = []  # Heap of _Waiter
+        self.timer = None
+
+    def seconds_until(self, tokens, reserve_fraction):
+        wait = max(self.paused_until - self.clock(), 0.0)
+        for bucket, amount in ((self.requests, 1), (self.tokens, tokens)):
+            if bucket is not None and amount:
+                bucket.refill()
+                wait = max(wait, bucket.seconds_until(amount, reserve_fraction))
+        return wait
+
+    def take(self, tokens):
+        if self.requests is not None:
+            self.requests.take(1)
+        if self.tokens is not None and tokens:
+            self.tokens.take(tokens)
+
+    def full(self):
+        return self.max_concurrency is not None and self.in_flight >= self.max_concurrency
+
+
+class RateLimiter:
+    """
+    `limits` maps a key (e.g. "openai:gpt-4o") to keyword arguments for its buckets:
+    requests_per_minute, tokens_per_minute, max_concurrency. Keys without limits pass through.
+    `telemetry`, if given, is a metrics.Telemetry that receives queue-wait histograms
+    (queue_wait_<class>) and shed counters.
+    """
+
+    def __init__(self, limits, reserves=DEFAULT_RESERVES, max_wait_seconds=DEFAULT_MAX_WAIT_SECONDS,
+                 telemetry=None, clock=time.monotonic):
+        self.queues = {key: _ProviderQueue(clock=clock, **options) for key, options in limits.items()}
+        self.reserves = reserves
+        self.max_wait_seconds = max_wait_seconds
+        self.telemetry = telemetry
+        self._ranks = {priority: rank for rank, priority in enumerate(PRIORITY_CLASSES)}
+        self._seq = itertools.count()
+
+    @asynccontextmanager
+    async def acquire(self, key, priority, tokens=0):
+        """
+        Holds one call's slot for `key`: waits for the buckets (and a free concurrency slot)
+        in priority order. Raises RateLimited if the class's maximum wait would be exceeded.
+        """
+        queue = self.queues.get(key)
+        if queue is None:
+            yield
+            return
+        max_wait = self.max_wait_seconds.get(priority)
+        # Shed right away if the buckets alone already rule out a slot in time
+        if max_wait is not None and queue.seconds_until(tokens, self.reserves.get(priority, 0.0)) > max_wait:
+            self._shed(key, priority)
+
+        waiter = _Waiter(self._ranks[priority], next(self._seq), priority, tokens,
+                         asyncio.get_running_loop().create_future())
+        heapq.heappush(queue.waiters, waiter)
+        self._dispatch(queue)
+        granted = False
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), max_wait)
+            granted = True
+        except asyncio.TimeoutError:
+            self._shed(key, priority)
+        finally:
+            if not granted:
+                # Gave up (timed out or cancelled): leave the queue, or hand back a slot granted meanwhile
+                if waiter.future.done() and not waiter.future.cancelled():
+                    queue.in_flight -= 1
+                waiter.future.cancel()
+                self._dispatch(queue)
+        self._observe(priority, time.monotonic() - waiter.enqueued_at)
+        try:
+            yield
+        finally:
+            queue.in_flight -= 1
+            self._dispatch(queue)
+
+    def try_acquire(self, key, priority, tokens=0):
+        """
+        Takes a slot for `key` without waiting; False if none is free now. For calls that outlive
+        the coroutine starting them (e.g. a streaming recognizer): the slot is held until release(key).
+        """
+        queue = self.queues.get(key)
+        if queue is None:
+            return True
+        if queue.waiters or queue.full() or queue.seconds_until(tokens, self.reserves.get(priority, 0.0)) > 0:
+            return False
+        queue.take(tokens)
+        queue.in_flight += 1
+        return True
+
+    def release(self, key):
+        """Hands back a slot taken by try_acquire."""
+        queue = self.queues.get(key)
+        if queue is None:
+            return
+        queue.in_flight -= 1
+        self._dispatch(queue)
+
+    def throttled(self, key, retry_after=None):
+        """The provider answered 429: nobody gets a slot for `key` until it says to retry."""
+        queue = self.queues.get(key)
+        if queue is None:
+            return
+        queue.paused_until = max(queue.paused_until, time.monotonic() + (retry_after or THROTTLE_PAUSE_SECONDS))
+        self._count("provider_throttled", key=key)
+
+    def _dispatch(self, queue):
+        while queue.waiters:
+            waiter = queue.waiters[0]
+            if waiter.future.done():
+                heapq.heappop(queue.waiters)
+                continue
+            if queue.full():
+                return  # A finishing call dispatches again
+            wait = queue.seconds_until(waiter.tokens, self.reserves.get(waiter.priority, 0.0))
+            if wait > 0:
+                self._schedule(queue, wait)
+                return
+            heapq.heappop(queue.waiters)
+            queue.take(waiter.tokens)
+            queue.in_flight += 1
+            waiter.future.set_result(None)
+
+    def _schedule(self, queue, delay):
+        loop = asyncio.get_running_loop()
+        if queue.timer is not None:
+            if queue.timer.when() <= loop.time() + delay:
+                return
+            queue.timer.cancel()
+        queue.timer = loop.call_later(delay, self._on_timer, queue)
+
+    def _on_timer(self, queue):
+        queue.timer = None
+        self._dispatch(queue)
+
+    def _shed(self, key, priority):
+        self._count("rate_limited", key=key, priority=priority)
+        raise RateLimited(f"{priority} call to {key} shed: no capacity within its wait limit")
+
+    def _observe(self, priority, seconds):
+        if self.telemetry is not None:
+            self.telemetry.observe(f"queue_wait_{priority}", seconds)
+
+    def _count(self, name, **labels):
+        if self.telemetry is not None:
+            self.telemetry.increment(name, **labels)
+
+    def metrics(self):
+        """Per key: bucket levels, calls in flight and waiting."""
+        snapshot = {}
+        for key, queue in self.queues.items():
+            entry = {"in_flight": queue.in_flight, "waiting": sum(not w.future.done() for w in queue.waiters)}
+            if queue.requests is not None:
+                entry["requests_available"] = round(queue.requests.level, 1)
+            if queue.tokens is not None:
+                entry["tokens_available"] = round(queue.tokens.level)
+            snapshot[key] = entry
+        return snapshot
+
+
+def retry_after_seconds(error):
+    """
+    For an SDK exception that is an HTTP 429 (OpenAI and Anthropic both expose `status_code`
+    and `response`): the Retry-After delay in seconds, or 0 if there was none.
+    Returns None for any other error.
+    """
+    if getattr(error, "status_code", None) != 429:
+        return None
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after", 0))
+    except (AttributeError, TypeError, ValueError):
+        return 0.0
@@ -0,0 +1,254 @@
+import os
+import socket
+from abc import ABC, abstractmethod
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+# --- Session persistence backends ---
+# SessionStore keeps live sessions (and their locks) in process, and writes
+# each one's serialized state to a backend at the end of every turn. With the
+# SQLite or Redis backend, any worker process can pick a conversation up
+# where another left off, and conversations survive a restart.
+# Every backend stores opaque bytes under the session id and forgets them
+# after `ttl_seconds` without a save.
+
+MEMORY = "memory"
+SQLITE = "sqlite"
+REDIS = "redis"
+
+
+class SessionBackend(ABC):
+    """Interface: load(session_id) -> bytes or None, save(session_id, data), delete(session_id)."""
+
+    name = None
+
+    @abstractmethod
+    def load(self, session_id):
+        """The stored bytes, or None if there are none or they expired."""
+
+    @abstractmethod
+    def save(self, session_id, data):
+        """Stores `data`, replacing what was there, and restarts its TTL."""
+
+    @abstractmethod
+    def delete(self, session_id):
+        """Forgets the session; deleting one that isn't stored is not an error."""
+
+    def close(self):
+        pass
+
+
+class MemoryBackend(SessionBackend):
+    """Single-process store. Nothing survives a restart; useful alone or for testing."""
+
+    name = MEMORY
+
+    def __init__(self, ttl_seconds=1800, max_entries=10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # session id -> (saved_at, data), least recently saved first
+        self._lock = threading.Lock()
+
+    def load(self, session_id):
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+                return None
+            return entry[1]
+
+    def save(self, session_id, data):
+        with self._lock:
+            self._entries[session_id] = (time.monotonic(), data)
+            self._entries.move_to_end(session_id)
+            cutoff = time.monotonic() - self.ttl_seconds
+            while self._entries and (
+                len(self._entries) > self.max_entries or next(iter(self._entries.values()))[0] < cutoff
+            ):
+                self._entries.popitem(last=False)
+
+    def delete(self, session_id):
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+
+class SQLiteBackend(SessionBackend):
+    """
+    One SQLite file shared by every worker on the host. WAL mode lets readers run
+    alongside the single writer; each thread gets its own connection.
+    """
+
+    name = SQLITE
+    PURGE_EVERY_SAVES = 500  # Expired rows are deleted every this many saves
+
+    def __init__(self, path="sessions.db", ttl_seconds=1800, busy_timeout_ms=5000):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        self._saves = 0
+        self._saves_lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, data BLOB NOT NULL, saved_at REAL NOT NULL)"
+        )
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            # With WAL, NORMAL only risks the last commits on power loss, never corruption
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def load(self, session_id):
+        row = self._connection().execute(
+            "SELECT data FROM sessions WHERE id = ? AND saved_at >= ?", (session_id, time.time() - self.ttl_seconds)
+        ).fetchone()
+        return bytes(row[0]) if row else None
+
+    def save(self, session_id, data):
+        connection = self._connection()
+        connection.execute(
+            "INSERT INTO sessions (id, data, saved_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET data = excluded.data, saved_at = excluded.saved_at",
+            (session_id, sqlite3.Binary(data), time.time())
+        )
+        with self._saves_lock:
+            self._saves += 1
+            purge = self._saves % self.PURGE_EVERY_SAVES == 0
+        if purge:
+            connection.execute("DELETE FROM sessions WHERE saved_at < ?", (time.time() - self.ttl_seconds,))
+
+    def delete(self, session_id):
+        self._connection().execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def close(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+
+class RedisError(Exception):
+    """An error reply from the Redis server."""
+
+
+class RedisConnection:
+    """
+    Minimal RESP2 client: just enough protocol for GET/SET/DEL/AUTH/SELECT/PING.
+    Not thread-safe; RedisBackend keeps one per thread.
+    """
+
+    def __init__(self, host, port, db=0, password=None, timeout=2.0, username=None):
+        self._sock = socket.create_connection((host, port), timeout=timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._reader = self._sock.makefile("rb")
+        if password and username:
+            self.command("AUTH", username, password)  # Redis 6+ ACL user
+        elif password:
+            self.command("AUTH", password)  # The "default" user
+        if db:
+            self.command("SELECT", db)
+
+    def command(self, *args):
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if isinstance(arg, str):
+                arg = arg.encode("utf-8")
+            elif isinstance(arg, int):
+                arg = str(arg).encode("ascii")
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        self._sock.sendall(b"".join(parts))
+        return self._read_reply()
+
+    def _read_reply(self):
+        line = self._reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Redis connection closed")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode("ascii")
+        if kind == b"-":
+            raise RedisError(payload.decode("utf-8", "replace"))
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self._reader.read(length + 2)
+            if len(data) != length + 2:
+                raise ConnectionError("Redis connection closed")
+            return data[:-2]
+        if kind == b"*":
+            count = int(payload)
+            return None if count < 0 else [self._read_reply() for _ in range(count)]
+        raise ConnectionError(f"Unexpected Redis reply: {line!r}")
+
+    def close(self):
+        self._reader.close()
+        self._sock.close()
+
+
+class RedisBackend(SessionBackend):
+    """Sessions in Redis (or anything speaking its protocol), shared by workers on any host."""
+
+    name = REDIS
+
+    def __init__(self, url="redis://127.0.0.1:6379/0", ttl_seconds=1800, key_prefix="sakina:session:", timeout=2.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.username = parsed.username or None
+        self.password = parsed.password
+        self.ttl_seconds = ttl_seconds
+        self.key_prefix = key_prefix
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _command(self, *args):
+        # One reconnect on a dropped connection (e.g. the server restarted); server errors are raised as is
+        for attempt in range(2):
+            connection = getattr(self._local, "connection", None)
+            if connection is None:
+                connection = RedisConnection(self.host, self.port, self.db, self.password, self.timeout,
+                                             self.username)
+                self._local.connection = connection
+            try:
+                return connection.command(*args)
+            except (ConnectionError, OSError):
+                connection.close()
+                self._local.connection = None
+                if attempt:
+                    raise
+
+    def load(self, session_id):
+        return self._command("GET", self.key_prefix + session_id)
+
+    def save(self, session_id, data):
+        self._command("SET", self.key_prefix + session_id, data, "EX", int(self.ttl_seconds))
+
+    def delete(self, session_id):
+        self._command("DEL", self.key_prefix + session_id)
+
+    def close(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+
+SESSION_BACKENDS = {backend.name: backend for backend in (MemoryBackend, SQLiteBackend, RedisBackend)}
+
+
+def create_session_backend(kind, **kwargs):
+    if kind not in SESSION_BACKENDS:
+        raise ValueError(f"Unknown session backend '{kind}', expected one of {sorted(SESSION_BACKENDS)}")
+    return SESSION_BACKENDS[kind](**kwargs)
@@ -0,0 +1,208 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from session_backends import MemoryBackend
+
+# --- Per-session conversation state for the Gradio app ---
+# Each browser session (keyed by Gradio's session hash) gets its own message
+# history, rolling summary and turn counter, so concurrent users never share
+# a prompt. Idle sessions are evicted by TTL and the store is capped by LRU.
+# Live sessions stay in process; their state is also loaded from and saved to
+# a backend (see session_backends.py) on every turn, so another worker or a
+# restarted process can carry on the conversation.
+
+SNAPSHOT_FORMAT = 1
+COMPRESS_MIN_BYTES = 512  # Smaller snapshots are stored as plain JSON
+_ROLE_CODES = {"system": "s", "user": "u", "assistant": "a"}
+_ROLES = {code: role for role, code in _ROLE_CODES.items()}
+
+
+def encode_snapshot(session, system_prompt):
+    """
+    Serializes a session compactly: a positional JSON list with one-letter roles, the
+    (shared, unchanging) system prompt left out, and zlib on top once it is worth it.
+    zlib also folds the summary, which appears twice, into one copy.
+    """
+    history = session.history
+    omit_prompt = bool(history) and history[0]['role'] == 'system' and history[0]['content'] == system_prompt
+    record = [
+        SNAPSHOT_FORMAT, session.revision, session.turns_since_summary, session.summary, int(omit_prompt),
+        [[_ROLE_CODES[msg['role']], msg['content']] for msg in history[int(omit_prompt):]],
+    ]
+    encoded = json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if len(encoded) < COMPRESS_MIN_BYTES:
+        return b"j" + encoded
+    return b"z" + zlib.compress(encoded, 6)
+
+
+def decode_snapshot(data, system_prompt):
+    """Inverse of encode_snapshot: {"revision", "turns_since_summary", "summary", "history"}."""
+    kind, payload = data[:1], data[1:]
+    if kind == b"z":
+        payload = zlib.decompress(payload)
+    elif kind != b"j":
+        raise ValueError(f"Unknown session snapshot encoding {kind!r}")
+    snapshot_format, revision, turns_since_summary, summary, omit_prompt, messages = json.loads(payload)
+    if snapshot_format != SNAPSHOT_FORMAT:
+        raise ValueError(f"Unsupported session snapshot format {snapshot_format}")
+    history = [{"role": "system", "content": system_prompt}] if omit_prompt else []
+    history += [{"role": _ROLES[code], "content": content} for code, content in messages]
+    return {"revision": revision, "turns_since_summary": turns_since_summary, "summary": summary, "history": history}
+
+
+class ConversationSession:
+    """
+    Conversation state for one Gradio session.
+    Hold `lock` (an asyncio.Lock) for the whole turn so two requests from the same
+    session never interleave.
+    """
+
+    def __init__(self, session_id, initial_history):
+        self.session_id = session_id
+        self.history = [dict(msg) for msg in initial_history]
+        self.summary = ""
+        self.turns_since_summary = 0
+        self.lock = asyncio.Lock()
+        self.save_lock = asyncio.Lock()  # Keeps backend writes in snapshot order
+        self.revision = None  # Token of the snapshot last saved or loaded; None if never persisted
+        self.last_active = time.monotonic()
+
+    def restore(self, snapshot):
+        self.history = snapshot["history"]
+        self.summary = snapshot["summary"]
+        self.turns_since_summary = snapshot["turns_since_summary"]
+        self.revision = snapshot["revision"]
+
+    def history_bytes(self):
+        return sum(len(msg['content'].encode("utf-8")) for msg in self.history)
+
+    def enforce_budget(self, max_messages, max_bytes):
+        """
+        Drops the oldest user/assistant messages until the history fits the budget.
+        System messages (the prompt and the rolling summary) are always kept.
+        """
+        dropped = 0
+        while len(self.history) > max_messages or self.history_bytes() > max_bytes:
+            oldest = next((i for i, msg in enumerate(self.history) if msg['role'] != 'system'), None)
+            # Never drop the message the current turn is answering
+            if oldest is None or oldest == len(self.history) - 1:
+                break
+            del self.history[oldest]
+            dropped += 1
+        if dropped:
+            print(f"[Session {self.session_id[:8]}]: Budget exceeded, dropped {dropped} old messages.")
+        return dropped
+
+
+class SessionStore:
+    """
+    Thread-safe map of session id -> ConversationSession with TTL and LRU eviction,
+    persisted through `backend` (a session_backends.SessionBackend).
+    Backend calls run in worker threads; if the backend fails, the in-process state is used.
+    """
+
+    def __init__(self, initial_history, max_sessions=1000, idle_ttl_seconds=1800,
+                 max_messages=40, max_bytes=64 * 1024, backend=None):
+        self.initial_history = initial_history
+        self.max_sessions = max_sessions
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.backend = backend or MemoryBackend(ttl_seconds=idle_ttl_seconds, max_entries=max_sessions)
+        self.system_prompt = initial_history[0]['content']
+        self._sessions = OrderedDict()  # Least recently used first
+        self._lock = threading.Lock()
+        self._metrics = {"loads": 0, "restored": 0, "load_errors": 0, "saves": 0, "save_errors": 0, "saved_bytes": 0}
+
+    def get(self, session_id):
+        """Returns the session for this id, creating it on first use."""
+        with self._lock:
+            self._evict_idle()
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = ConversationSession(session_id, self.initial_history)
+                self._sessions[session_id] = session
+                while len(self._sessions) > self.max_sessions:
+                    evicted_id, _ = self._sessions.popitem(last=False)
+                    print(f"[SessionStore]: LRU evicted session {evicted_id[:8]}")
+            else:
+                self._sessions.move_to_end(session_id)
+            session.last_active = time.monotonic()
+            return session
+
+    async def load(self, session):
+        """
+        Replaces the session's state with the stored one if that was written elsewhere (another
+        worker, or before a restart). Call with session.lock held, at the start of a turn.
+        """
+        try:
+            data = await asyncio.to_thread(self.backend.load, session.session_id)
+            snapshot = decode_snapshot(data, self.system_prompt) if data is not None else None
+        except Exception as e:
+            print(f"[SessionStore]: Loading session {session.session_id[:8]} failed: {e}")
+            self._count("load_errors")
+            return False
+        self._count("loads")
+        if snapshot is None or snapshot["revision"] == session.revision:
+            return False
+        session.restore(snapshot)
+        self._count("restored")
+        print(f"[SessionStore]: Restored session {session.session_id[:8]} ({len(session.history)} messages)")
+        return True
+
+    async def save(self, session):
+        """Writes the session's current state to the backend."""
+        # Snapshot synchronously, so it is the state at the time of the call
+        previous_revision = session.revision
+        session.revision = revision = os.urandom(6).hex()
+        data = encode_snapshot(session, self.system_prompt)
+        async with session.save_lock:
+            try:
+                await asyncio.to_thread(self.backend.save, session.session_id, data)
+            except Exception as e:
+                print(f"[SessionStore]: Saving session {session.session_id[:8]} failed: {e}")
+                self._count("save_errors")
+                # The stored snapshot is still the previous one; don't let load() mistake it for newer
+                if session.revision == revision:
+                    session.revision = previous_revision
+                return
+        self._count("saves")
+        self._count("saved_bytes", len(data))
+
+    async def remove(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+        try:
+            await asyncio.to_thread(self.backend.delete, session_id)
+        except Exception as e:
+            print(f"[SessionStore]: Deleting session {session_id[:8]} failed: {e}")
+
+    def metrics(self):
+        with self._lock:
+            return {"active": len(self._sessions), **self._metrics}
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._metrics[name] += amount
+
+    def enforce_budget(self, session):
+        return session.enforce_budget(self.max_messages, self.max_bytes)
+
+    def _evict_idle(self):
+        # Sessions are ordered by last use, so stop at the first one that is still fresh
+        cutoff = time.monotonic() - self.idle_ttl_seconds
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session.last_active >= cutoff:
+                break
+            del self._sessions[session_id]
+            print(f"[SessionStore]: Evicted idle session {session_id[:8]}")
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
@@ -0,0 +1,195 @@
+import asyncio
+import threading
+import time
+
+from crisis_detector import normalize_arabic
+
+# --- Speculative replies from interim transcripts ---
+# With streaming recognition the transcript is mostly known before recording
+# stops, but the reply used to start only after the final result. When the
+# speaker pauses on a stable interim hypothesis, a streamed reply (and the
+# audio of its first sentence) is started for it right away. Once the final
+# transcript arrives the speculation is kept if the transcript barely changed
+# (normalized Arabic edit distance) and the conversation is still the one it
+# was generated for; otherwise it is cancelled and the reply starts over.
+# A hit saves the time the speculation already ran; a miss costs the tokens
+# it had used, so both are counted for tuning.
+
+TRANSCRIPT_CHANGED = "transcript_changed"  # The final transcript differs too much from the hypothesis
+HISTORY_CHANGED = "history_changed"  # The conversation changed under it (summary swapped in, reload, ...)
+CRISIS = "crisis"  # The turn took the crisis fast path, which replies with a different prompt
+FAILED = "failed"  # The speculative generation itself failed
+RESTARTED = "restarted"  # The speaker went on and a newer hypothesis replaced it
+ABANDONED = "abandoned"  # No turn used it (no transcript, session ended)
+MISS_REASONS = (TRANSCRIPT_CHANGED, HISTORY_CHANGED, CRISIS, FAILED, RESTARTED, ABANDONED)
+
+
+def transcript_distance(a, b):
+    """
+    Levenshtein distance between two transcripts after normalize_arabic, divided by the
+    longer one's length: 0.0 for the same words, 1.0 for nothing in common.
+    """
+    a, b = normalize_arabic(a), normalize_arabic(b)
+    if a == b:
+        return 0.0
+    if len(a) < len(b):
+        a, b = b, a
+    if not b:
+        return 1.0
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1] / len(a)
+
+
+class SpeculativeReply:
+    """
+    A reply being generated for an interim transcript. `generate(history)` is an async iterator
+    of (provider, sentence_chunk); `synthesize(text)` returns the audio of the first chunk.
+    """
+
+    def __init__(self, transcript, history, generate, synthesize):
+        self.transcript = transcript
+        self.history = history  # Conversation before the user's message, as it was when speculation started
+        self.started_at = time.monotonic()
+        self.chunks = []  # (provider, chunk) generated so far
+        self.first_audio = None  # Task synthesizing the first chunk
+        self.done = False
+        self._updated = asyncio.Event()
+        self._task = asyncio.create_task(self._run(generate, synthesize))
+
+    async def _run(self, generate, synthesize):
+        try:
+            async for provider, chunk in generate(self.history + [{"role": "user", "content": self.transcript}]):
+                self.chunks.append((provider, chunk))
+                if self.first_audio is None:
+                    self.first_audio = asyncio.create_task(synthesize(chunk))
+                self._notify()
+        finally:
+            self.done = True
+            self._notify()
+
+    def _notify(self):
+        self._updated.set()
+        self._updated = asyncio.Event()
+
+    @property
+    def failed(self):
+        # stream_reply-style generators yield (None, apology) when no provider answered
+        return bool(self.chunks) and self.chunks[0][0] is None
+
+    @property
+    def generated_chars(self):
+        return sum(len(chunk) for _, chunk in self.chunks)
+
+    async def replay(self):
+        """Yields (provider, chunk): everything generated so far, then the rest as it arrives."""
+        index = 0
+        try:
+            while True:
+                if index < len(self.chunks):
+                    yield self.chunks[index]
+                    index += 1
+                elif self.done:
+                    return
+                else:
+                    await self._updated.wait()
+        finally:
+            # Closed early (e.g. the client left): stop generating
+            if not self.done:
+                self._task.cancel()
+
+    def cancel(self):
+        self._task.cancel()
+        if self.first_audio is not None:
+            self.first_audio.cancel()
+
+
+class Speculator:
+    """
+    Decides when to speculate and whether a speculation is kept, and counts hits, misses
+    and the tokens spent on misses. `estimate_tokens(messages)` estimates a prompt's size.
+    `telemetry`, if given, is a metrics.Telemetry that receives the head start of every hit.
+    """
+
+    def __init__(self, estimate_tokens, chars_per_token=3.0, pause_seconds=0.4, max_distance=0.1, min_chars=10,
+                 telemetry=None):
+        self.estimate_tokens = estimate_tokens
+        self.chars_per_token = chars_per_token
+        self.pause_seconds = pause_seconds
+        self.max_distance = max_distance
+        self.min_chars = min_chars
+        self.telemetry = telemetry
+        self._lock = threading.Lock()
+        self._metrics = {"started": 0, "hits": 0, "wasted_tokens": 0, "wasted_tts_chars": 0,
+                         **{f"miss_{reason}": 0 for reason in MISS_REASONS}}
+
+    def should_start(self, hypothesis, seconds_since_change, current=None):
+        """
+        Whether to speculate on `hypothesis`: the speaker has paused on it and it is long enough.
+        With a speculation already running (`current`), only if the hypothesis has moved on from it.
+        """
+        if seconds_since_change < self.pause_seconds or len(hypothesis.strip()) < self.min_chars:
+            return False
+        return current is None or transcript_distance(current.transcript, hypothesis) > self.max_distance
+
+    def start(self, hypothesis, history, generate, synthesize):
+        with self._lock:
+            self._metrics["started"] += 1
+        # Copies, so a message edited in place later (e.g. a deferred enhancement) shows up as a change
+        return SpeculativeReply(hypothesis, [dict(message) for message in history], generate, synthesize)
+
+    def check(self, speculation, final_transcript, history):
+        """
+        Returns `speculation` if it can stand in for the reply to `final_transcript` given the
+        conversation `history` (without the user's message); otherwise cancels it and returns None.
+        Counts nothing for a speculation that fits; resolve() does once the turn commits to it.
+        """
+        if speculation is None:
+            return None
+        if speculation.failed:
+            return self.discard(speculation, FAILED)
+        if transcript_distance(speculation.transcript, final_transcript) > self.max_distance:
+            return self.discard(speculation, TRANSCRIPT_CHANGED)
+        if speculation.history != history:
+            return self.discard(speculation, HISTORY_CHANGED)
+        return speculation
+
+    def resolve(self, speculation, final_transcript, history):
+        """check(), then counts a hit and its head start for a speculation that is kept."""
+        speculation = self.check(speculation, final_transcript, history)
+        if speculation is None:
+            return None
+        head_start = time.monotonic() - speculation.started_at
+        print(f"[Speculation]: Hit, {head_start:.2f}s head start on '{final_transcript[:40]}'")
+        with self._lock:
+            self._metrics["hits"] += 1
+        if self.telemetry is not None:
+            self.telemetry.observe("speculation_head_start", head_start)
+        return speculation
+
+    def discard(self, speculation, reason):
+        """Cancels a speculation nobody will use and counts what it cost. Returns None."""
+        if speculation is None:
+            return None
+        speculation.cancel()
+        # The prompt was billed in full; the reply only as far as it had streamed before the cancel
+        prompt = speculation.history + [{"role": "user", "content": speculation.transcript}]
+        wasted_tokens = self.estimate_tokens(prompt) + int(speculation.generated_chars / self.chars_per_token)
+        print(f"[Speculation]: Miss ({reason}), ~{wasted_tokens} tokens wasted")
+        with self._lock:
+            self._metrics[f"miss_{reason}"] += 1
+            self._metrics["wasted_tokens"] += wasted_tokens
+            if speculation.first_audio is not None:
+                self._metrics["wasted_tts_chars"] += len(speculation.chunks[0][1])
+        return None
+
+    def metrics(self):
+        with self._lock:
+            misses = sum(self._metrics[f"miss_{reason}"] for reason in MISS_REASONS)
+            resolved = self._metrics["hits"] + misses
+            return {**self._metrics, "misses": misses,
+                    "hit_rate": round(self._metrics["hits"] / resolved, 3) if resolved else 0.0}
@@ -0,0 +1,219 @@
+import queue
+import threading
+import time
+
+from providers import LazyModule
+
+# --- Pooled Azure Speech clients ---
+# Building a SpeechSynthesizer and letting it connect on the first speak call
+# costs a TLS/websocket handshake every time. The pool keeps a bounded set of
+# synthesizers whose connections are opened ahead of time and hands them out
+# one caller at a time.
+
+speechsdk = LazyModule("azure.cognitiveservices.speech")  # Imported on first use
+
+
+class PooledSynthesizer:
+    """A synthesizer plus its pre-opened connection and health flag."""
+
+    def __init__(self, speech_config):
+        self.synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=None)
+        self.connection = speechsdk.Connection.from_speech_synthesizer(self.synthesizer)
+        self.connected = False
+        self.disconnected = False
+        self.healthy = True
+        self.connection.connected.connect(self._on_connected)
+        self.connection.disconnected.connect(self._on_disconnected)
+        self.created_at = time.time()
+        self.uses = 0
+
+    def _on_connected(self, evt):
+        self.connected = True
+        self.disconnected = False
+
+    def _on_disconnected(self, evt):
+        self.connected = False
+        self.disconnected = True
+
+    def open(self):
+        # Opening is asynchronous; the `connected` event fires when the handshake is done
+        self.disconnected = False
+        self.connection.open(True)
+
+    def close(self):
+        try:
+            self.connection.close()
+        except Exception as e:
+            print(f"[SynthesizerPool]: Error closing connection: {e}")
+
+
+class SynthesizerPool:
+    """
+    Bounded pool of warm SpeechSynthesizers with a checkout/return API. Both calls block
+    (checkout may wait for a free synthesizer, checkin of an entry marked unhealthy closes it
+    and connects a replacement), so async callers run them in an executor.
+
+    Usage:
+        entry = pool.checkout()
+        result = entry.synthesizer.speak_text_async(text).get()
+        if result.reason == speechsdk.ResultReason.Canceled:
+            entry.healthy = False  # Replaced with a fresh connection on return
+        pool.checkin(entry)
+    """
+
+    def __init__(self, speech_config_factory, size=4, checkout_timeout=5.0, name="tts"):
+        self.speech_config_factory = speech_config_factory
+        self.size = size
+        self.checkout_timeout = checkout_timeout
+        self.name = name
+        self._idle = queue.LifoQueue()  # Most recently used first, so its connection is the warmest
+        self._created = 0
+        self._lock = threading.Lock()
+        self._metrics = {
+            "checkouts": 0,
+            "checkout_timeouts": 0,
+            "created": 0,
+            "reconnects": 0,
+            "health_check_failures": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+        }
+
+    def warm_up(self):
+        """Creates every synthesizer up front and opens its connection."""
+        entries = []
+        while True:
+            entry = self._create_if_below_limit()
+            if entry is None:
+                break
+            entries.append(entry)
+        for entry in entries:
+            self._idle.put(entry)
+        print(f"[SynthesizerPool:{self.name}]: Warmed up {len(entries)} synthesizers.")
+
+    def checkout(self):
+        start_time = time.time()
+        try:
+            entry = self._idle.get_nowait()
+        except queue.Empty:
+            entry = self._create_if_below_limit()
+            if entry is None:
+                try:
+                    entry = self._idle.get(timeout=self.checkout_timeout)
+                except queue.Empty:
+                    self._count("checkout_timeouts")
+                    raise TimeoutError(f"No {self.name} synthesizer available after {self.checkout_timeout}s")
+
+        entry = self._health_check(entry)
+        entry.uses += 1
+        entry.healthy = True
+        wait = time.time() - start_time
+        with self._lock:
+            self._metrics["checkouts"] += 1
+            self._metrics["wait_seconds_total"] += wait
+            self._metrics["wait_seconds_max"] = max(self._metrics["wait_seconds_max"], wait)
+        return entry
+
+    def checkin(self, entry):
+        if entry.healthy:
+            self._idle.put(entry)
+            return
+        # A canceled synthesis usually means the websocket dropped; replace it with a fresh one
+        print(f"[SynthesizerPool:{self.name}]: Reconnecting unhealthy synthesizer.")
+        entry.close()
+        self._count("reconnects")
+        try:
+            self._idle.put(self._new_entry())
+        except Exception as e:
+            # Give the slot back; the next checkout will try to create it again
+            print(f"[SynthesizerPool:{self.name}]: Reconnect failed: {e}")
+            with self._lock:
+                self._created -= 1
+
+    def connected_count(self):
+        """Idle synthesizers whose connection handshake has completed."""
+        with self._idle.mutex:
+            return sum(1 for entry in self._idle.queue if entry.connected)
+
+    def metrics(self):
+        with self._lock:
+            snapshot = dict(self._metrics)
+            snapshot["size"] = self._created
+        snapshot["idle"] = self._idle.qsize()
+        snapshot["in_use"] = snapshot["size"] - snapshot["idle"]
+        return snapshot
+
+    def _health_check(self, entry):
+        if not entry.disconnected:
+            return entry
+        # The service closes idle connections; reopen before handing it out
+        self._count("health_check_failures")
+        try:
+            entry.open()
+            return entry
+        except Exception as e:
+            print(f"[SynthesizerPool:{self.name}]: Reopen failed ({e}), replacing synthesizer.")
+            entry.close()
+            self._count("reconnects")
+            try:
+                return self._new_entry()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+    def _create_if_below_limit(self):
+        with self._lock:
+            if self._created >= self.size:
+                return None
+            self._created += 1
+        try:
+            return self._new_entry()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    def _new_entry(self):
+        entry = PooledSynthesizer(self.speech_config_factory())
+        entry.open()
+        self._count("created")
+        return entry
+
+    def _count(self, key):
+        with self._lock:
+            self._metrics[key] += 1
+
+
+class RecognizerConfigs:
+    """
+    Reusable recognition configs. A SpeechRecognizer is bound to its audio stream,
+    so recognizers are still created per utterance, but the SpeechConfig and the
+    language auto-detection config are built once and shared.
+    """
+
+    def __init__(self, speech_config_factory, languages):
+        self.speech_config_factory = speech_config_factory
+        self.languages = languages
+        self.speech_config = None
+        self.auto_detect_source_language_config = None
+        self.recognizers_created = 0
+
+    def create_recognizer(self, audio_config):
+        if self.speech_config is None:
+            # Built on first use so importing the app doesn't require Azure credentials
+            self.speech_config = self.speech_config_factory()
+            self.auto_detect_source_language_config = speechsdk.AutoDetectSourceLanguageConfig(languages=self.languages)
+        self.recognizers_created += 1
+        recognizer = speechsdk.SpeechRecognizer(
+            speech_config=self.speech_config,
+            auto_detect_source_language_config=self.auto_detect_source_language_config,
+            audio_config=audio_config
+        )
+        # No explicit Connection.open() here: if that pre-connect fails, the SDK rejects the
+        # recognition start with an invalid-state error instead of connecting again.
+        # Streaming recognition starts on the first microphone chunk, which hides the handshake anyway.
+        return recognizer
+
+    def metrics(self):
+        return {"recognizers_created": self.recognizers_created}
@@ -0,0 +1,71 @@
+import asyncio
+import threading
+import time
+
+# --- Startup warm-up and readiness ---
+# A fresh worker would otherwise make its first user pay for DNS/TLS to every
+# provider, the first Azure synthesizer connection and the synthesis of fixed
+# phrases. Warm-up checks do that work up front, all at the same time, and
+# the worker only reports ready (GET /ready) once every check has succeeded,
+# so a load balancer keeps traffic away until then. A failed check is retried
+# with backoff rather than leaving the worker unready for good.
+
+
+class WarmUp:
+    """Named async warm-up checks, run concurrently and each retried until it succeeds."""
+
+    def __init__(self, timeout_seconds=20.0, retry_initial_seconds=1.0, retry_max_seconds=30.0):
+        self.timeout_seconds = timeout_seconds
+        self.retry_initial_seconds = retry_initial_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self._checks = {}  # name -> coroutine function
+        self._status = {}  # name -> {"ok", "attempts", "seconds", "error"}
+        self._started_at = None
+        self._ready_after = None  # Seconds from start until every check had passed
+        self._lock = threading.Lock()
+
+    def add(self, name, check):
+        """`check` is called with no arguments and returns an awaitable; raising means failure."""
+        self._checks[name] = check
+        self._status[name] = {"ok": False, "attempts": 0, "seconds": None, "error": None}
+
+    async def run(self):
+        self._started_at = time.monotonic()
+        await asyncio.gather(*(self._run_check(name, check) for name, check in self._checks.items()))
+        self._ready_after = time.monotonic() - self._started_at
+        print(f"[WarmUp]: Ready after {self._ready_after:.2f}s.")
+
+    async def _run_check(self, name, check):
+        delay = self.retry_initial_seconds
+        while True:
+            start_time = time.monotonic()
+            try:
+                await asyncio.wait_for(check(), self.timeout_seconds)
+            except Exception as e:
+                error = repr(e) if not isinstance(e, asyncio.TimeoutError) else f"timed out after {self.timeout_seconds}s"
+                with self._lock:
+                    self._status[name].update(attempts=self._status[name]["attempts"] + 1, error=error)
+                print(f"[WarmUp]: '{name}' failed ({error}), retrying in {delay:.0f}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.retry_max_seconds)
+                continue
+            with self._lock:
+                self._status[name].update(
+                    ok=True, attempts=self._status[name]["attempts"] + 1,
+                    seconds=round(time.monotonic() - start_time, 3), error=None
+                )
+            print(f"[WarmUp]: '{name}' done in {time.monotonic() - start_time:.2f}s")
+            return
+
+    def status(self):
+        with self._lock:
+            return {
+                "ready": all(status["ok"] for status in self._status.values()),
+                "ready_after_seconds": self._ready_after,
+                "checks": {name: dict(status) for name, status in self._status.items()},
+            }
+
+    def metrics(self):
+        with self._lock:
+            return {"ready": int(all(status["ok"] for status in self._status.values())),
+                    "failed_attempts": sum(s["attempts"] - int(s["ok"]) for s in self._status.values())}
@@ -0,0 +1,101 @@
+import threading
+import time
+
+from providers import LazyModule
+
+# --- Streaming speech recognition ---
+# Microphone chunks are pushed into an Azure push stream while the user is
+# still talking, and continuous recognition turns them into interim and final
+# results as they go. When recording stops, only the tail of the utterance is
+# left to recognize, and long utterances are no longer cut at the first pause.
+
+speechsdk = LazyModule("azure.cognitiveservices.speech")  # Imported on first use
+
+
+class StreamingTranscriber:
+    """
+    Continuous recognition for one utterance, fed chunk by chunk.
+    Azure calls its event handlers on SDK threads, so shared state is guarded by a lock.
+    """
+
+    def __init__(self, recognizer_configs, sample_rate):
+        self.sample_rate = sample_rate
+        self.stream = speechsdk.audio.PushAudioInputStream(
+            stream_format=speechsdk.audio.AudioStreamFormat(samples_per_second=sample_rate, bits_per_sample=16, channels=1)
+        )
+        self.recognizer = recognizer_configs.create_recognizer(speechsdk.audio.AudioConfig(stream=self.stream))
+        self.final_segments = []
+        self.interim_text = ""
+        self.last_result_time = None  # When the latest interim/final result arrived
+        self.error = None
+        self.bytes_pushed = 0
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._session_stopped = threading.Event()
+        self._closed = False
+
+        self.recognizer.recognizing.connect(self._on_recognizing)
+        self.recognizer.recognized.connect(self._on_recognized)
+        self.recognizer.canceled.connect(self._on_canceled)
+        self.recognizer.session_stopped.connect(self._on_session_stopped)
+        # Returns a future; recognition runs in the background from here on
+        self.recognizer.start_continuous_recognition_async()
+
+    def push(self, audio_bytes):
+        if self._closed or not audio_bytes:
+            return
+        self.stream.write(audio_bytes)
+        self.bytes_pushed += len(audio_bytes)
+
+    @property
+    def text(self):
+        """Final segments so far, plus the current interim hypothesis."""
+        with self._lock:
+            return " ".join(self.final_segments + ([self.interim_text] if self.interim_text else []))
+
+    def finish(self, timeout=3.0):
+        """
+        Closes the stream and waits for the last final result. Blocking; returns the full
+        transcript, or None if nothing was recognized.
+        """
+        self._closed = True
+        self.stream.close()  # End of stream makes Azure flush the last segment as a final result
+        if not self._session_stopped.wait(timeout):
+            print(f"[Streaming STT]: No end of session after {timeout}s, using results so far.")
+        self.recognizer.stop_continuous_recognition_async().get()
+
+        with self._lock:
+            segments = list(self.final_segments)
+            # Keep a trailing hypothesis that never became final rather than dropping words
+            if self.interim_text:
+                segments.append(self.interim_text)
+        transcript = " ".join(segments).strip()
+        if self.error:
+            print(f"[Streaming STT]: Recognition error: {self.error}")
+        return transcript or None
+
+    def cancel(self):
+        """Stops recognition without waiting for results (e.g. the session went away)."""
+        self._closed = True
+        self.stream.close()
+        self.recognizer.stop_continuous_recognition_async()
+
+    def _on_recognizing(self, evt):
+        with self._lock:
+            self.interim_text = evt.result.text
+            self.last_result_time = time.time()
+
+    def _on_recognized(self, evt):
+        with self._lock:
+            if evt.result.reason == speechsdk.ResultReason.RecognizedSpeech and evt.result.text:
+                self.final_segments.append(evt.result.text)
+            self.interim_text = ""
+            self.last_result_time = time.time()
+
+    def _on_canceled(self, evt):
+        if evt.cancellation_details.reason == speechsdk.CancellationReason.Error:
+            self.error = evt.cancellation_details.error_details
+        self._session_stopped.set()
+
+    def _on_session_stopped(self, evt):
+        self._session_stopped.set()
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from audio_preprocessing import (MicrophoneStreamPreprocessor, Resampler, preprocess_recording, resample,
+                                 to_float_mono, trim_silence)
+
+
+def tone(frequency, seconds, sample_rate, amplitude=0.5):
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    return (amplitude * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+
+
+def dominant_frequency(samples, sample_rate):
+    spectrum = np.abs(np.fft.rfft(samples * np.hanning(len(samples))))
+    return np.argmax(spectrum) * sample_rate / len(samples)
+
+
+def test_to_float_mono_scales_and_downmixes():
+    stereo = np.array([[32767, -32768], [16384, 16384]], dtype=np.int16)
+    np.testing.assert_allclose(to_float_mono(stereo), [0.0, 0.5], atol=1e-4)
+    np.testing.assert_allclose(to_float_mono(np.array([0, 128, 255], dtype=np.uint8)), [-1.0, 0.0, 127 / 128])
+    assert to_float_mono(np.zeros(4, dtype=np.float64)).dtype == np.float32
+
+
+@pytest.mark.parametrize("from_rate", [48000, 44100, 22050])
+def test_resample_keeps_length_and_pitch(from_rate):
+    output = resample(tone(440, 1.0, from_rate), from_rate, 16000)
+    assert len(output) == 16000
+    assert dominant_frequency(output, 16000) == pytest.approx(440, abs=2)
+    assert np.max(np.abs(output[1000:-1000])) == pytest.approx(0.5, abs=0.02)
+
+
+def test_resample_filters_out_what_the_lower_rate_cannot_hold():
+    # 10 kHz is above the 8 kHz Nyquist of the output and would otherwise alias to 6 kHz
+    output = resample(tone(10000, 1.0, 48000), 48000, 16000)
+    assert np.max(np.abs(output[1000:-1000])) < 0.01
+
+
+def test_chunked_resampling_matches_one_call():
+    samples = np.random.default_rng(0).uniform(-1, 1, 48000).astype(np.float32)
+    whole = Resampler(48000, 16000).process(samples)
+    resampler = Resampler(48000, 16000)
+    chunked = np.concatenate([resampler.process(samples[i:i + 1234]) for i in range(0, len(samples), 1234)])
+    np.testing.assert_allclose(chunked, whole, atol=1e-5)
+
+
+def test_trim_silence_keeps_speech_with_padding():
+    rate = 16000
+    quiet = np.random.default_rng(0).normal(0, 1e-4, rate).astype(np.float32)
+    samples = np.concatenate((quiet, tone(300, 0.5, rate), quiet))
+    trimmed = trim_silence(samples, rate)
+    padding = int(0.2 * rate)
+    assert len(trimmed) == pytest.approx(rate // 2 + 2 * padding, abs=int(0.02 * rate))
+
+
+def test_trim_silence_returns_nothing_for_silence():
+    assert len(trim_silence(np.zeros(16000, dtype=np.float32), 16000)) == 0
+
+
+def test_preprocess_recording_returns_16k_int16():
+    recording = (tone(300, 1.0, 48000) * 32767).astype(np.int16)
+    pcm = preprocess_recording(recording, 48000)
+    assert pcm.dtype == np.int16 and len(pcm) == 16000
+
+
+def test_stream_preprocessor_matches_the_resampler():
+    recording = (tone(300, 0.5, 48000) * 32767).astype(np.int16)
+    preprocessor = MicrophoneStreamPreprocessor(48000)
+    streamed = np.concatenate([preprocessor.process(recording[i:i + 9600]) for i in range(0, len(recording), 9600)])
+    assert streamed.dtype == np.int16 and len(streamed) == 8000
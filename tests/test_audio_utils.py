@@ -0,0 +1,84 @@
+import io
+import wave
+
+import numpy as np
+import pytest
+
+from audio_utils import PCMBuffer, crossfade, fade_out, pcm_array, pcm_sample_rate, pcm_to_wav, split_tail
+
+
+def pcm(*samples):
+    return np.array(samples, dtype=np.int16).tobytes()
+
+
+def test_pcm_sample_rate():
+    assert pcm_sample_rate("Raw24Khz16BitMonoPcm") == 24000
+    with pytest.raises(ValueError):
+        pcm_sample_rate("Riff24Khz16BitMonoPcm")
+
+
+def test_buffer_concatenates_segments_in_order():
+    buffer = PCMBuffer(24000, pcm(1, 2), None, b"", pcm(3), PCMBuffer(24000, pcm(4, 5)))
+    buffer.append(pcm(6))
+    assert buffer.to_array().tolist() == [1, 2, 3, 4, 5, 6]
+    assert buffer.num_bytes == 12
+    assert buffer.duration == pytest.approx(6 / 24000)
+
+
+def test_odd_sized_segment_does_not_shift_later_samples():
+    buffer = PCMBuffer(24000, pcm(1, 2) + b"\x07", pcm(3))
+    assert buffer.to_array().tolist() == [1, 2, 3]
+
+
+def test_single_segment_is_not_copied():
+    data = bytearray(pcm(1, 2, 3))
+    array = PCMBuffer(24000, data).to_array()
+    data[0:2] = pcm(9)
+    assert array[0] == 9
+
+
+def test_empty_buffer():
+    buffer = PCMBuffer(24000, None, b"")
+    assert not buffer and buffer.to_gradio() is None
+    sample_rate, samples = PCMBuffer(16000, pcm(1)).to_gradio()
+    assert sample_rate == 16000 and samples.tolist() == [1]
+
+
+def test_pcm_to_wav_header_describes_the_samples():
+    wav = pcm_to_wav(pcm(1, -2, 3) + b"\x00", 24000)
+    assert wav[:4] == b"RIFF" and wav[8:12] == b"WAVE"
+    with wave.open(io.BytesIO(wav)) as reader:
+        assert (reader.getnchannels(), reader.getsampwidth(), reader.getframerate()) == (1, 2, 24000)
+        assert reader.getnframes() == 3
+        assert np.frombuffer(reader.readframes(3), dtype=np.int16).tolist() == [1, -2, 3]
+    assert int.from_bytes(wav[4:8], "little") == len(wav) - 8
+
+
+def test_split_tail():
+    body, tail = split_tail(pcm(*range(10)), seconds=0.3, sample_rate=10)
+    assert pcm_array(body).tolist() == list(range(7))
+    assert pcm_array(tail).tolist() == [7, 8, 9]
+    body, tail = split_tail(pcm(1, 2), seconds=5, sample_rate=10)
+    assert len(body) == 0 and pcm_array(tail).tolist() == [1, 2]
+
+
+def test_fade_out_ends_in_silence():
+    faded = pcm_array(fade_out(pcm(1000, 1000, 1000)))
+    assert faded.tolist() == [1000, 500, 0]
+
+
+def test_crossfade_blends_tail_into_head():
+    tail = pcm(*[10000] * 100)
+    head = pcm(*[10000] * 150)
+    mixed = pcm_array(crossfade(tail, head))
+    assert len(mixed) == 150
+    assert mixed[0] == 10000  # All tail
+    assert mixed[-1] == 10000  # All head, after the overlap
+    # Equal-power curves: the middle of the overlap is louder than either clip alone, not quieter
+    assert mixed[50] > 10000
+    assert mixed.max() <= 32767
+
+
+def test_crossfade_without_head_fades_the_tail_out():
+    mixed = pcm_array(crossfade(pcm(*[10000] * 10), b""))
+    assert len(mixed) == 10 and mixed[0] == 10000 and abs(int(mixed[-1])) < 10
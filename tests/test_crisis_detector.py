@@ -0,0 +1,70 @@
+import pytest
+
+from crisis_detector import HIGH, MEDIUM, CrisisDetector, normalize_arabic
+
+detector = CrisisDetector()
+
+
+def test_normalize_arabic_folds_spelling_variants():
+    assert normalize_arabic("أُريدُ  الموتَ!!") == "اريد الموت"
+    assert normalize_arabic("إنتحـــار") == "انتحار"
+    assert normalize_arabic("رسالة") == normalize_arabic("رساله")
+    assert normalize_arabic("ابغى") == normalize_arabic("ابغي")
+    assert normalize_arabic("مسؤول ٩٩٩٩") == "مسوول 9999"
+    assert normalize_arabic("I DON'T want to live") == "i dont want to live"
+
+
+@pytest.mark.parametrize("text", [
+    "والله تعبت، أبغى أموت",
+    "أفكر في الإنتحار",
+    "بالانتحار",  # Prefix clitic
+    "انتحرت",  # Suffix clitic
+    "ما أبي أعيش",
+    "كتبت رسالة وداع",  # Taa marbuta
+    "I want to kill myself",
+    "I don't want to live anymore",
+])
+def test_emergencies_are_detected(text):
+    assert detector.is_emergency(text)
+
+
+@pytest.mark.parametrize("text", [
+    "اشتريت موتر جديد",  # "الموت" must not match inside "الموتر"
+    "the suicidesquad movie",  # English phrases match whole words only
+    "تعبت من الشغل اليوم",
+    "",
+])
+def test_ordinary_speech_is_not_an_emergency(text):
+    assert not detector.is_emergency(text)
+
+
+def test_medium_severity_is_risky_but_not_an_emergency():
+    assert detector.is_risky("حاس ما في امل")
+    assert not detector.is_emergency("حاس ما في امل")
+    assert [match.severity for match in detector.find("حاس ما في امل")] == [MEDIUM]
+
+
+def test_overlapping_phrases_are_all_reported():
+    matches = detector.find("ابي اقتل نفسي")
+    assert {match.phrase for match in matches} == {"ابي اقتل نفسي", "اقتل نفسي"}
+    assert all(match.severity == HIGH for match in matches)
+    # Positions are in the normalized text
+    text = normalize_arabic("ابي اقتل نفسي")
+    assert all(text[match.start:match.end] == match.phrase for match in matches)
+
+
+def test_one_match_per_phrase_after_normalization():
+    # "ابغى اموت" and "ابغي اموت" are listed separately but normalize to the same phrase
+    matches = detector.find("ابغى اموت")
+    assert len(matches) == 1 and matches[0].category == "suicidal_ideation"
+
+
+def test_is_emergency_reuses_matches():
+    text = "عادي"
+    assert detector.is_emergency(text, matches=detector.find("ابغى اموت"))
+
+
+def test_custom_phrases():
+    custom = CrisisDetector({"test": (HIGH, ["كلمة سر"])})
+    assert custom.is_emergency("قال كلمة سر")
+    assert not custom.is_emergency("ابغى اموت")
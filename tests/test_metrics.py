@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+from metrics import LatencyHistogram, Telemetry
+
+
+def test_percentile_interpolates_within_the_bucket():
+    histogram = LatencyHistogram(buckets=(1.0, 2.0, 4.0))
+    for seconds in (0.5, 1.5, 1.5, 3.0):
+        histogram.observe(seconds)
+    assert histogram.percentile(0.25) == pytest.approx(1.0)  # All of the first bucket
+    assert histogram.percentile(0.5) == pytest.approx(1.5)  # Halfway through the second
+    assert histogram.percentile(1.0) == pytest.approx(3.0)  # Never above the largest value seen
+    assert (histogram.count, histogram.sum, histogram.max) == (4, 6.5, 3.0)
+
+
+def test_percentile_above_the_largest_bucket_and_when_empty():
+    histogram = LatencyHistogram(buckets=(1.0,))
+    assert histogram.percentile(0.5) == 0.0
+    histogram.observe(10.0)
+    assert histogram.percentile(0.99) == pytest.approx(1.0 + 9.0 * 0.99)  # Between the last bound and the max
+    assert histogram.percentile(1.0) == 10.0
+
+
+def test_finish_turn_feeds_histograms_and_counts_turns():
+    telemetry = Telemetry(buckets=(0.1, 1.0))
+    trace = telemetry.start_turn("session-1")
+    trace["stt"] = 0.05
+    trace["llm"] = 0.5
+    telemetry.finish_turn(trace)
+    snapshot = telemetry.snapshot()
+    assert snapshot["stages"]["stt"]["count"] == 1 and snapshot["stages"]["llm"]["max"] == 0.5
+    assert snapshot["counters"]["turns"] == 1
+
+
+def test_render_prometheus():
+    telemetry = Telemetry(namespace="t", buckets=(0.1, 1.0))
+    telemetry.observe("stt", 0.05)
+    telemetry.observe("stt", 0.5)
+    telemetry.increment("provider_errors", provider="azure", call="tts")
+    telemetry.increment("provider_errors", 2, provider="azure", call="tts")
+    telemetry.register_gauges("pool", lambda: {"idle": 3, "mode": "text is skipped"})
+    telemetry.register_gauges("router", lambda: {"openai": {"open": 0}, "anthropic": {"open": 1}}, label="provider")
+    telemetry.register_gauges("broken", lambda: 1 / 0)
+    lines = telemetry.render_prometheus().splitlines()
+
+    assert "# TYPE t_stage_latency_seconds histogram" in lines
+    assert 't_stage_latency_seconds_bucket{stage="stt",le="0.1"} 1' in lines
+    assert 't_stage_latency_seconds_bucket{stage="stt",le="1.0"} 2' in lines  # Cumulative
+    assert 't_stage_latency_seconds_bucket{stage="stt",le="+Inf"} 2' in lines
+    assert 't_stage_latency_seconds_count{stage="stt"} 2' in lines
+    assert 't_stage_latency_seconds_sum{stage="stt"} 0.55' in lines
+    assert any(line.startswith('t_stage_latency_quantile_seconds{stage="stt",quantile="0.5"}') for line in lines)
+    assert lines.count("# TYPE t_provider_errors_total counter") == 1
+    assert 't_provider_errors_total{call="tts",provider="azure"} 3' in lines
+    assert "t_pool_idle 3" in lines and not any("mode" in line for line in lines)
+    assert 't_router_open{provider="anthropic"} 1' in lines
+    assert not any(line.startswith("t_broken") for line in lines)
+
+
+def test_traces_are_written_as_json_lines(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    telemetry = Telemetry(trace_path=str(path))
+    for turn in range(3):
+        trace = telemetry.start_turn("abcdefghijkl")
+        trace["stt"] = 0.1 * turn
+        trace.attributes["crisis"] = turn == 2
+        telemetry.finish_turn(trace)
+    telemetry.close()
+    records = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert len(records) == 3
+    assert records[2]["session"] == "abcdefgh" and records[2]["crisis"] is True
+    assert records[1]["spans"] == {"stt": 0.1}
@@ -0,0 +1,64 @@
+import types
+
+from prompt_context import EPHEMERAL, PromptCacheStats, build_anthropic_request, split_history
+
+SYSTEM = {"role": "system", "content": "prompt"}
+SUMMARY = {"role": "system", "content": "summary"}
+
+
+def breakpoints(system, messages):
+    blocks = system + [block for msg in messages if isinstance(msg["content"], list) for block in msg["content"]]
+    return sum("cache_control" in block for block in blocks)
+
+
+def test_split_history_separates_leading_system_messages_and_notes():
+    note = {"role": "system", "content": "crisis note"}
+    user = {"role": "user", "content": "hi"}
+    assert split_history([SYSTEM, SUMMARY, user, note]) == ([SYSTEM, SUMMARY], [user], ["crisis note"])
+
+
+def test_prompt_and_summary_are_separate_cached_blocks():
+    history = [SYSTEM, SUMMARY, {"role": "user", "content": "a"}, {"role": "assistant", "content": "b"},
+               {"role": "user", "content": "c"}]
+    system, messages = build_anthropic_request(history)
+    assert system == [{"type": "text", "text": "prompt", "cache_control": EPHEMERAL},
+                      {"type": "text", "text": "summary", "cache_control": EPHEMERAL}]
+    # The breakpoint sits on the last history message, so the next turn reads it all from cache
+    assert messages[:2] == [{"role": "user", "content": "a"}, {"role": "assistant", "content": "b"}]
+    assert messages[-1] == {"role": "user", "content": [{"type": "text", "text": "c", "cache_control": EPHEMERAL}]}
+    assert breakpoints(system, messages) == 3
+
+
+def test_notes_go_after_the_cached_blocks_uncached():
+    history = [SYSTEM, {"role": "user", "content": "a"}, {"role": "system", "content": "note"},
+               {"role": "user", "content": "b"}]
+    system, messages = build_anthropic_request(history)
+    assert system[0]["cache_control"] == EPHEMERAL
+    assert system[-1] == {"type": "text", "text": "note"}
+    assert [msg["role"] for msg in messages] == ["user", "user"]
+
+
+def test_trailing_message_is_not_cached_and_history_is_not_modified():
+    history = [SYSTEM, {"role": "user", "content": "a"}]
+    system, messages = build_anthropic_request(history, trailing_user_message="validate this")
+    assert messages[-1] == {"role": "user", "content": "validate this"}
+    assert messages[0]["content"][0]["cache_control"] == EPHEMERAL
+    assert history[1] == {"role": "user", "content": "a"}
+    assert breakpoints(system, messages) <= 4
+
+
+def test_empty_history():
+    assert build_anthropic_request([], trailing_user_message="ping") == ([], [{"role": "user", "content": "ping"}])
+
+
+def test_cache_stats_totals_and_hit_ratio():
+    stats = PromptCacheStats()
+    stats.record_anthropic("claude", types.SimpleNamespace(
+        input_tokens=100, cache_read_input_tokens=800, cache_creation_input_tokens=100))
+    details = types.SimpleNamespace(cached_tokens=512)
+    stats.record_openai("gpt", types.SimpleNamespace(prompt_tokens=1024, prompt_tokens_details=details))
+    stats.record_openai("gpt", None)
+    metrics = stats.metrics()
+    assert metrics["claude"] == {"calls": 1, "input_tokens": 1000, "cached_tokens": 800, "cache_write_tokens": 100,
+                                 "hit_ratio": 0.8}
+    assert metrics["gpt"]["hit_ratio"] == 0.5 and metrics["gpt"]["calls"] == 1
@@ -0,0 +1,142 @@
+import asyncio
+import time
+
+import pytest
+
+from provider_router import CLOSED, HALF_OPEN, OPEN, AllProvidersFailed, CircuitBreaker, ProviderRouter
+
+
+def test_breaker_opens_on_failure_ratio_and_recovers_through_one_probe():
+    now = 0.0
+    breaker = CircuitBreaker("p", window=4, min_calls=4, failure_ratio=0.5, open_seconds=10, clock=lambda: now)
+    for ok in (True, False, True, False):
+        assert breaker.allow()
+        breaker.record(ok)
+    assert breaker.state == OPEN and not breaker.allow()
+    now = 10.0
+    assert breaker.allow() and breaker.state == HALF_OPEN
+    assert not breaker.allow()  # One probe at a time
+    breaker.release()  # The probe lost a hedge: another may go
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state == CLOSED
+
+
+def test_slow_calls_count_as_failures():
+    breaker = CircuitBreaker("p", min_calls=2, slow_call_seconds=1.0)
+    breaker.record(True, seconds=2.0)
+    breaker.record(True, seconds=2.0)
+    assert breaker.state == OPEN
+
+
+def call(router, attempts, timeout=1.0, **kwargs):
+    return asyncio.run(router.call("reply", attempts, time.monotonic() + timeout, **kwargs))
+
+
+async def answer(value, delay=0.0):
+    await asyncio.sleep(delay)
+    return value
+
+
+async def fail(delay=0.0):
+    await asyncio.sleep(delay)
+    raise ValueError("boom")
+
+
+def test_fails_over_at_once_when_the_first_provider_errors():
+    router = ProviderRouter(["a", "b"], default_hedge_delay=5.0)
+    start = time.monotonic()
+    assert call(router, [("a", lambda t: fail()), ("b", lambda t: answer("from b"))]) == ("b", "from b")
+    assert time.monotonic() - start < 1.0
+
+
+def test_hedges_a_slow_provider_and_cancels_the_loser():
+    router = ProviderRouter(["a", "b"], default_hedge_delay=0.05, min_hedge_delay=0.0)
+    cancelled = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append("a")
+            raise
+
+    assert call(router, [("a", lambda t: slow()), ("b", lambda t: answer("from b"))]) == ("b", "from b")
+    assert cancelled == ["a"]
+
+
+def test_results_finishing_alongside_the_winner_are_closed():
+    router = ProviderRouter(["a", "b"], default_hedge_delay=0.0, min_hedge_delay=0.0)
+    closed = []
+    started = []
+    both_started = asyncio.Event()
+
+    async def chunks(name):
+        try:
+            yield "first"
+            yield "more"
+        finally:
+            closed.append(name)
+
+    async def open_stream(name):
+        # Both answer in the same event loop iteration, so the router sees them done together
+        started.append(name)
+        if len(started) == 2:
+            both_started.set()
+        await both_started.wait()
+        rest = chunks(name)
+        return await rest.__anext__(), rest
+
+    async def scenario():
+        provider, (_, winner_chunks) = await router.call(
+            "reply_stream", [("a", lambda t: open_stream("a")), ("b", lambda t: open_stream("b"))],
+            time.monotonic() + 1
+        )
+        loser = "b" if provider == "a" else "a"
+        assert closed == [loser]
+        assert await winner_chunks.__anext__() == "more"
+        return loser
+
+    loser = asyncio.run(scenario())
+    assert router.breakers[loser].state == CLOSED
+
+
+def test_reports_why_every_provider_failed():
+    router = ProviderRouter(["a", "b"])
+    with pytest.raises(AllProvidersFailed, match=r"every provider failed \(a: ValueError\('boom'\); b: "):
+        call(router, [("a", lambda t: fail()), ("b", lambda t: fail())])
+
+
+def test_reports_the_deadline():
+    router = ProviderRouter(["a"])
+    with pytest.raises(AllProvidersFailed, match="before the deadline"):
+        call(router, [("a", lambda t: answer("late", delay=5))], timeout=0.05)
+
+
+def test_reports_open_breakers():
+    router = ProviderRouter(["a", "b"])
+    router.breakers["a"].allow = lambda: False  # e.g. a half-open probe already in flight
+    router.breakers["b"].available = lambda: False
+    with pytest.raises(AllProvidersFailed, match="circuit breakers open"):
+        call(router, [("a", lambda t: answer("a")), ("b", lambda t: answer("b"))])
+
+
+def test_ignored_errors_do_not_count_against_the_breaker():
+    router = ProviderRouter(["a", "b"], ignored_errors=(KeyError,),
+                            breaker_factory=lambda name: CircuitBreaker(name, min_calls=1))
+
+    async def shed():
+        raise KeyError("shed")
+
+    assert call(router, [("a", lambda t: shed()), ("b", lambda t: answer("b"))]) == ("b", "b")
+    assert router.breakers["a"].state == CLOSED
+    with pytest.raises(AllProvidersFailed):
+        call(router, [("a", lambda t: fail())])
+    assert router.breakers["a"].state == OPEN
+
+
+def test_every_breaker_open_still_tries_the_preferred_provider():
+    router = ProviderRouter(["a", "b"], breaker_factory=lambda name: CircuitBreaker(name, min_calls=1))
+    for name in ("a", "b"):
+        router.record_failure(name)
+    assert call(router, [("a", lambda t: answer("a")), ("b", lambda t: answer("b"))]) == ("a", "a")
@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+
+from rate_limiter import (CRISIS_FOLLOWUP, LIVE_REPLY, SUMMARY, VALIDATION, RateLimited, RateLimiter, TokenBucket,
+                          retry_after_seconds, split_limits)
+
+
+def test_token_bucket_refills_up_to_capacity():
+    now = 0.0
+    bucket = TokenBucket(60, capacity=5, clock=lambda: now)
+    bucket.take(5)
+    assert bucket.seconds_until(1) == pytest.approx(1.0)
+    now = 2.0
+    bucket.refill()
+    assert bucket.level == pytest.approx(2.0)
+    now = 100.0
+    bucket.refill()
+    assert bucket.level == 5
+    # Keeping a 40% reserve (2 of 5), taking 1 more from 2 waits for 1 to refill
+    bucket.take(3)
+    assert bucket.seconds_until(1, reserve_fraction=0.4) == pytest.approx(1.0)
+
+
+def test_waiters_are_served_by_priority():
+    async def scenario():
+        limiter = RateLimiter({"k": {"max_concurrency": 1}})
+        order = []
+
+        async def call(name, priority):
+            async with limiter.acquire("k", priority):
+                order.append(name)
+                await asyncio.sleep(0.01)
+
+        first = asyncio.create_task(call("first", SUMMARY))
+        await asyncio.sleep(0)
+        await asyncio.gather(call("summary", SUMMARY), call("validation", VALIDATION),
+                             call("crisis", CRISIS_FOLLOWUP), call("live", LIVE_REPLY), first)
+        return order
+
+    assert asyncio.run(scenario()) == ["first", "live", "crisis", "validation", "summary"]
+
+
+def test_lower_classes_are_shed_when_the_bucket_is_dry():
+    async def scenario():
+        limiter = RateLimiter({"k": {"requests_per_minute": 60}})  # 10-request burst
+        for _ in range(10):
+            async with limiter.acquire("k", LIVE_REPLY):
+                pass
+        # A validation would wait 3s for a request plus its class's reserve, over its 2s limit
+        with pytest.raises(RateLimited):
+            async with limiter.acquire("k", VALIDATION):
+                pass
+        assert limiter.metrics()["k"]["in_flight"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        limiter = RateLimiter({"k": {"max_concurrency": 1}})
+        release = asyncio.Event()
+
+        async def hold():
+            async with limiter.acquire("k", LIVE_REPLY):
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        release.set()
+        await holder
+        assert limiter.metrics()["k"] == {"in_flight": 0, "waiting": 0}
+
+    asyncio.run(scenario())
+
+
+def test_try_acquire_holds_a_concurrency_slot_until_released():
+    async def scenario():
+        limiter = RateLimiter({"k": {"max_concurrency": 1}})
+        assert limiter.try_acquire("k", LIVE_REPLY)
+        assert not limiter.try_acquire("k", LIVE_REPLY)
+        granted = []
+
+        async def wait_for_slot():
+            async with limiter.acquire("k", LIVE_REPLY):
+                granted.append(True)
+
+        waiter = asyncio.create_task(wait_for_slot())
+        await asyncio.sleep(0)
+        assert not granted
+        limiter.release("k")
+        await waiter
+        assert granted and limiter.metrics()["k"]["in_flight"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_unlimited_keys_pass_through():
+    async def scenario():
+        limiter = RateLimiter({})
+        assert limiter.try_acquire("other", LIVE_REPLY)
+        limiter.release("other")
+        async with limiter.acquire("other", SUMMARY):
+            pass
+
+    asyncio.run(scenario())
+
+
+def test_retry_after_seconds():
+    class Response:
+        headers = {"retry-after": "1.5"}
+
+    class Throttled(Exception):
+        status_code = 429
+        response = Response()
+
+    assert retry_after_seconds(Throttled()) == 1.5
+    assert retry_after_seconds(ValueError()) is None
+
+
+def test_split_limits_gives_each_process_an_equal_share():
+    limits = {"k": {"requests_per_minute": 600, "tokens_per_minute": 1000, "max_concurrency": 10}}
+    assert split_limits(limits, 4) == {"k": {"requests_per_minute": 150, "tokens_per_minute": 250,
+                                             "max_concurrency": 2}}
+    # Every process can still make a call
+    assert split_limits({"k": {"max_concurrency": 3}}, 8) == {"k": {"max_concurrency": 1}}
+    single = split_limits(limits, 1)
+    assert single == limits and single["k"] is not limits["k"]
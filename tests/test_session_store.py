@@ -0,0 +1,116 @@
+import asyncio
+
+from session_backends import MemoryBackend
+from session_store import ConversationSession, SessionStore, decode_snapshot, encode_snapshot
+
+SYSTEM_PROMPT = "أنت سكينة"
+INITIAL_HISTORY = [{"role": "system", "content": SYSTEM_PROMPT}]
+
+
+def test_snapshot_round_trip_leaves_out_the_system_prompt():
+    session = ConversationSession("s", INITIAL_HISTORY)
+    session.history.append({"role": "user", "content": "مرحبا"})
+    session.summary = "ملخص"
+    session.turns_since_summary = 3
+    session.revision = "abc"
+    data = encode_snapshot(session, SYSTEM_PROMPT)
+    assert data.startswith(b"j") and SYSTEM_PROMPT.encode("utf-8") not in data
+    assert decode_snapshot(data, SYSTEM_PROMPT) == {
+        "revision": "abc", "turns_since_summary": 3, "summary": "ملخص", "history": session.history,
+    }
+
+
+def test_large_snapshots_are_compressed():
+    session = ConversationSession("s", INITIAL_HISTORY)
+    session.history += [{"role": "assistant", "content": "كلام طويل " * 20}] * 10
+    data = encode_snapshot(session, SYSTEM_PROMPT)
+    assert data.startswith(b"z")
+    assert decode_snapshot(data, SYSTEM_PROMPT)["history"] == session.history
+
+
+def test_another_worker_picks_up_the_saved_conversation():
+    async def scenario():
+        backend = MemoryBackend()
+        worker_a = SessionStore(INITIAL_HISTORY, backend=backend)
+        worker_b = SessionStore(INITIAL_HISTORY, backend=backend)
+
+        session_a = worker_a.get("s")
+        session_a.history.append({"role": "user", "content": "أول رسالة"})
+        await worker_a.save(session_a)
+
+        session_b = worker_b.get("s")
+        assert await worker_b.load(session_b)
+        assert session_b.history == session_a.history
+        assert session_b.revision == session_a.revision
+        # Nothing new was saved since: the in-process state is kept
+        assert not await worker_b.load(session_b)
+
+        session_b.history.append({"role": "assistant", "content": "رد"})
+        await worker_b.save(session_b)
+        assert session_b.revision != session_a.revision
+        assert await worker_a.load(session_a)
+        assert session_a.history[-1]["content"] == "رد"
+        # A worker's own save is already its in-process state
+        assert not await worker_b.load(session_b)
+
+    asyncio.run(scenario())
+
+
+def test_failed_save_keeps_the_previous_revision():
+    class BrokenBackend(MemoryBackend):
+        def save(self, session_id, data):
+            raise OSError("disk full")
+
+    async def scenario():
+        store = SessionStore(INITIAL_HISTORY, backend=BrokenBackend())
+        session = store.get("s")
+        await store.save(session)
+        assert session.revision is None
+        assert store.metrics()["save_errors"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_sessions_are_kept_apart():
+    store = SessionStore(INITIAL_HISTORY)
+    store.get("a").history.append({"role": "user", "content": "أ"})
+    assert store.get("b").history == INITIAL_HISTORY
+    assert store.get("a") is store.get("a")
+    # Each session copies the initial messages, so none of them edits the shared list
+    assert INITIAL_HISTORY == [{"role": "system", "content": SYSTEM_PROMPT}]
+
+
+def test_least_recently_used_session_is_evicted():
+    store = SessionStore(INITIAL_HISTORY, max_sessions=2)
+    first = store.get("a")
+    store.get("b")
+    store.get("a")
+    store.get("c")
+    assert len(store) == 2
+    assert "b" not in store._sessions
+    assert store.get("a") is first
+
+
+def test_idle_sessions_expire(monkeypatch):
+    import session_store
+    now = 1000.0
+    monkeypatch.setattr(session_store.time, "monotonic", lambda: now)
+    store = SessionStore(INITIAL_HISTORY, idle_ttl_seconds=60)
+    stale = store.get("a")
+    now += 61
+    store.get("b")
+    assert len(store) == 1
+    assert store.get("a") is not stale
+
+
+def test_budget_drops_oldest_messages_but_keeps_system_and_current():
+    session = ConversationSession("s", INITIAL_HISTORY)
+    session.history.append({"role": "system", "content": "ملخص"})
+    for i in range(5):
+        session.history.append({"role": "user", "content": f"رسالة {i}"})
+    assert session.enforce_budget(max_messages=4, max_bytes=10_000) == 3
+    assert [msg["content"] for msg in session.history] == [SYSTEM_PROMPT, "ملخص", "رسالة 3", "رسالة 4"]
+    # The message being answered stays even when it alone is over the byte budget
+    session.enforce_budget(max_messages=10, max_bytes=1)
+    assert session.history[-1]["content"] == "رسالة 4"
+    assert [msg["role"] for msg in session.history] == ["system", "system", "user"]
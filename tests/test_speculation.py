@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+from speculation import ABANDONED, HISTORY_CHANGED, TRANSCRIPT_CHANGED, Speculator, transcript_distance
+
+
+@pytest.mark.parametrize("a, b, expected", [
+    ("", "", 0.0),
+    ("abc", "", 1.0),
+    ("kitten", "sitting", 3 / 7),
+    ("abcd", "abcx", 0.25),
+])
+def test_transcript_distance(a, b, expected):
+    assert transcript_distance(a, b) == pytest.approx(expected)
+    assert transcript_distance(b, a) == pytest.approx(expected)
+
+
+def test_transcript_distance_ignores_spelling_variants():
+    # Hamza forms, ta marbuta, punctuation and spacing are what interim and final results differ in
+    assert transcript_distance("أنا تعبانة!", "انا  تعبانه") == 0.0
+    assert transcript_distance("أنا تعبانة", "انا فرحانه") > 0.1
+
+
+def test_should_start_waits_for_a_pause_on_a_long_enough_hypothesis():
+    speculator = Speculator(lambda messages: 0, pause_seconds=0.4, min_chars=10)
+    assert not speculator.should_start("أحس بضيق من أمس", 0.1)
+    assert not speculator.should_start("مرحبا", 1.0)
+    assert speculator.should_start("أحس بضيق من أمس", 0.5)
+
+
+async def generate(messages):
+    for chunk in ("جملة أولى.", "جملة ثانية."):
+        yield "openai", chunk
+
+
+async def synthesize(text):
+    return b"audio"
+
+
+def test_resolve_keeps_a_matching_speculation_and_replays_it():
+    async def scenario():
+        speculator = Speculator(lambda messages: 0)
+        history = [{"role": "system", "content": "p"}]
+        speculation = speculator.start("أحس بضيق من أمس", history, generate, synthesize)
+        assert speculator.resolve(speculation, "احس بضيق من امس", history) is speculation
+        return [chunk async for _, chunk in speculation.replay()], speculator.metrics()
+
+    chunks, metrics = asyncio.run(scenario())
+    assert chunks == ["جملة أولى.", "جملة ثانية."]
+    assert metrics["hits"] == 1 and metrics["hit_rate"] == 1.0
+
+
+@pytest.mark.parametrize("final, history_change, reason", [
+    ("ما عندي شي أقوله اليوم", False, TRANSCRIPT_CHANGED),
+    ("أحس بضيق من أمس", True, HISTORY_CHANGED),
+])
+def test_resolve_discards_a_speculation_that_no_longer_fits(final, history_change, reason):
+    async def scenario():
+        speculator = Speculator(lambda messages: 100, chars_per_token=1.0)
+        history = [{"role": "system", "content": "p"}]
+        speculation = speculator.start("أحس بضيق من أمس", history, generate, synthesize)
+        if history_change:
+            history = history + [{"role": "system", "content": "summary"}]
+        assert speculator.resolve(speculation, final, history) is None
+        return speculator.metrics()
+
+    metrics = asyncio.run(scenario())
+    assert metrics[f"miss_{reason}"] == 1 and metrics["wasted_tokens"] >= 100
+
+
+def test_discard_counts_an_unused_speculation():
+    async def scenario():
+        speculator = Speculator(lambda messages: 10)
+        speculation = speculator.start("أحس بضيق من أمس", [], generate, synthesize)
+        assert speculator.discard(speculation, ABANDONED) is None
+        assert speculator.discard(None, ABANDONED) is None
+        return speculator.metrics()
+
+    metrics = asyncio.run(scenario())
+    assert metrics["miss_abandoned"] == 1 and metrics["misses"] == 1 and metrics["hit_rate"] == 0.0
+
+
+def test_check_counts_nothing_until_resolve():
+    async def scenario():
+        speculator = Speculator(lambda messages: 0)
+        speculation = speculator.start("أحس بضيق من أمس", [], generate, synthesize)
+        assert speculator.check(speculation, "أحس بضيق من أمس", []) is speculation
+        before = speculator.metrics()
+        assert speculator.resolve(speculation, "أحس بضيق من أمس", []) is speculation
+        speculation.cancel()
+        return before, speculator.metrics()
+
+    before, after = asyncio.run(scenario())
+    assert before["hits"] == 0 and before["misses"] == 0
+    assert after["hits"] == 1
@@ -0,0 +1,72 @@
+import asyncio
+import os
+
+from tts_cache import TTSCache
+
+VOICE = "ar-OM-AyshaNeural"
+FORMAT = "raw-24khz-16bit-mono-pcm"
+
+
+def test_keys_ignore_spacing_but_not_voice_or_format():
+    assert TTSCache.make_key(" مرحبا   بك ", VOICE, FORMAT) == TTSCache.make_key("مرحبا بك", VOICE, FORMAT)
+    assert TTSCache.make_key("مرحبا", VOICE, FORMAT) != TTSCache.make_key("مرحبا", "other-voice", FORMAT)
+    assert TTSCache.make_key("مرحبا", VOICE, FORMAT) != TTSCache.make_key("مرحبا", VOICE, "other-format")
+
+
+def test_lru_evicts_least_recently_used_within_the_byte_cap():
+    cache = TTSCache(max_bytes=10)
+    cache.put("a", VOICE, FORMAT, b"1234")
+    cache.put("b", VOICE, FORMAT, b"1234")
+    assert cache.get("a", VOICE, FORMAT) == b"1234"  # Now most recently used
+    cache.put("c", VOICE, FORMAT, b"1234")
+    assert cache.get("b", VOICE, FORMAT) is None
+    assert cache.get("a", VOICE, FORMAT) == b"1234"
+    cache.put("huge", VOICE, FORMAT, b"x" * 11)  # Bigger than the whole cache: not kept
+    assert cache.get("huge", VOICE, FORMAT) is None
+    metrics = cache.metrics()
+    assert metrics["bytes"] == 8 and metrics["evictions"] == 1
+
+
+def test_pinned_phrases_survive_eviction_and_only_they_reach_disk(tmp_path):
+    calls = []
+
+    async def synthesize(text):
+        calls.append(text)
+        return text.encode("utf-8") * 10
+
+    cache = TTSCache(max_bytes=10, disk_dir=str(tmp_path))
+    failed = asyncio.run(cache.presynthesize(["أهلا", "مع السلامة"], synthesize, VOICE, FORMAT))
+    assert failed == [] and len(calls) == 2
+    cache.put("reply sentence", VOICE, FORMAT, b"private")
+    for i in range(5):
+        cache.put(f"filler {i}", VOICE, FORMAT, b"123456")
+    assert cache.get("أهلا", VOICE, FORMAT) == "أهلا".encode("utf-8") * 10
+    assert cache.metrics()["pinned"] == 2
+    stored = [name for _, _, files in os.walk(tmp_path) for name in files]
+    assert len(stored) == 2  # Reply audio is never written to disk
+
+
+def test_restart_loads_fixed_phrases_from_disk(tmp_path):
+    async def synthesize(text):
+        return b"audio"
+
+    async def must_not_synthesize(text):
+        raise AssertionError("synthesized again")
+
+    asyncio.run(TTSCache(disk_dir=str(tmp_path)).presynthesize(["أهلا"], synthesize, VOICE, FORMAT))
+    restarted = TTSCache(disk_dir=str(tmp_path))
+    assert asyncio.run(restarted.presynthesize(["أهلا"], must_not_synthesize, VOICE, FORMAT)) == []
+    assert restarted.get("أهلا", VOICE, FORMAT) == b"audio"
+    assert restarted.metrics()["disk_hits"] == 1
+
+
+def test_presynthesize_reports_failed_phrases():
+    async def synthesize(text):
+        if text == "bad":
+            raise RuntimeError("Azure down")
+        return None if text == "empty" else b"audio"
+
+    cache = TTSCache()
+    assert asyncio.run(cache.presynthesize(["ok", "bad", "empty"], synthesize, VOICE, FORMAT)) == ["bad", "empty"]
+    assert cache.get("ok", VOICE, FORMAT) == b"audio"
+    assert cache.get("bad", VOICE, FORMAT) is None
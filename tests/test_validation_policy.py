@@ -0,0 +1,54 @@
+import pytest
+
+from validation_policy import (BLOCKING, DEFERRED, SKIP, ValidationPolicy, contains_risk_terms,
+                               create_validation_policy)
+
+
+@pytest.mark.parametrize("text", [
+    "أفكر في الإنتحار",  # Hamza on the alef
+    "ما فـــي أمل",  # Tatweel
+    "اليَأْس قاتلني",  # Diacritics
+    "I want to DIE",
+    "رقم الطوارئ ٩٩٩٩",  # Arabic-Indic digits
+    "thinking about self-harm",
+])
+def test_risk_terms_match_spelling_variants(text):
+    assert contains_risk_terms(text)
+
+
+def test_routine_text_is_not_risky():
+    assert not contains_risk_terms("اليوم كان يوم حلو في الشغل")
+    assert contains_risk_terms("حبوب", risk_terms=["حبوب"])
+    assert not contains_risk_terms("حبوب", risk_terms=["سكين"])
+
+
+@pytest.mark.parametrize("mode, routine", [
+    ("always", BLOCKING), ("risk_gated", SKIP), ("async", DEFERRED),
+])
+def test_modes_decide_routine_turns_and_always_validate_risky_ones(mode, routine):
+    policy = create_validation_policy(mode)
+    assert policy.decide("كيفك اليوم", "الحمد لله") == routine
+    assert policy.decide("أبغى أموت", "الحمد لله") == BLOCKING
+    # The reply is checked too
+    assert policy.decide("كيفك اليوم", "لا تفكر في الانتحار") == BLOCKING
+    metrics = policy.metrics()
+    assert metrics["mode"] == mode and metrics["risky"] == 2 and metrics[BLOCKING] >= 2
+
+
+def test_sampled_mode_validates_the_sampled_fraction():
+    draws = iter([0.1, 0.5, 0.19])
+    policy = create_validation_policy("sampled", sample_rate=0.2, rng=lambda: next(draws))
+    assert [policy.decide("كيفك", "زين") for _ in range(3)] == [BLOCKING, SKIP, BLOCKING]
+
+
+def test_custom_risk_scorer():
+    policy = create_validation_policy("risk_gated", risk_scorer=lambda text: "flag" in text)
+    assert policy.decide("flag", "") == BLOCKING
+    assert policy.decide("أبغى أموت", "") == SKIP
+
+
+def test_unknown_mode_and_abstract_base():
+    with pytest.raises(ValueError, match="Unknown validation mode"):
+        create_validation_policy("never")
+    with pytest.raises(TypeError):
+        ValidationPolicy()
@@ -0,0 +1,142 @@
+import asyncio
+import hashlib
+import os
+import threading
+import unicodedata
+from collections import OrderedDict
+
+# --- Content-addressed TTS audio cache ---
+# Phrases like the greeting, the fallback apology and the crisis numbers are
+# spoken verbatim again and again. Audio is cached by (normalized text, voice,
+# output format) in a byte-capped in-memory LRU. The fixed phrases rendered at
+# startup are pinned in memory and, optionally, kept on disk so a restart
+# doesn't synthesize them again. Reply sentences come from private
+# conversations, so they are only ever cached in memory.
+
+
+def normalize_tts_text(text):
+    """Canonical form used for cache keys only; the original text is what gets synthesized."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class TTSCache:
+    def __init__(self, max_bytes=32 * 1024 * 1024, disk_dir=None):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()  # key -> audio bytes, least recently used first
+        self._pinned = {}  # key -> audio bytes of the fixed phrases, never evicted
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._metrics = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(text, voice_name, output_format):
+        key_source = "\x1f".join([normalize_tts_text(text), voice_name, output_format])
+        return hashlib.sha256(key_source.encode("utf-8")).hexdigest()
+
+    def get(self, text, voice_name, output_format):
+        """Memory only, so it never blocks the event loop."""
+        key = self.make_key(text, voice_name, output_format)
+        with self._lock:
+            audio_data = self._pinned.get(key)
+            if audio_data is None:
+                audio_data = self._entries.get(key)
+                if audio_data is not None:
+                    self._entries.move_to_end(key)
+            self._metrics["memory_hits" if audio_data is not None else "misses"] += 1
+            return audio_data
+
+    def put(self, text, voice_name, output_format, audio_data):
+        """Caches audio in the in-memory LRU only; see presynthesize for what is kept on disk."""
+        if not audio_data:
+            return
+        key = self.make_key(text, voice_name, output_format)
+        with self._lock:
+            self._store(key, audio_data)
+
+    async def presynthesize(self, phrases, synthesize, voice_name, output_format):
+        """
+        Pins a list of fixed phrases in memory at startup, synthesizing them concurrently.
+        `synthesize` is an async function called only for phrases that are neither in memory
+        nor on disk. Newly synthesized phrases are written to disk (in a worker thread).
+        Returns the phrases that could not be synthesized.
+        """
+        keys = {phrase: self.make_key(phrase, voice_name, output_format) for phrase in phrases}
+        audio = {phrase: self.get(phrase, voice_name, output_format) for phrase in phrases}
+        for phrase in [phrase for phrase in phrases if audio[phrase] is None]:
+            audio[phrase] = await asyncio.to_thread(self._read_from_disk, keys[phrase])
+            if audio[phrase] is not None:
+                with self._lock:
+                    self._metrics["disk_hits"] += 1
+
+        missing = [phrase for phrase in phrases if audio[phrase] is None]
+        results = await asyncio.gather(*(synthesize(phrase) for phrase in missing), return_exceptions=True)
+        failed = []
+        for phrase, audio_data in zip(missing, results):
+            if isinstance(audio_data, Exception) or not audio_data:
+                failed.append(phrase)
+                continue
+            audio[phrase] = audio_data
+            await asyncio.to_thread(self._write_to_disk, keys[phrase], audio_data)
+        with self._lock:
+            for phrase in phrases:
+                if audio[phrase] is not None:
+                    self._pinned[keys[phrase]] = audio[phrase]
+        print(f"[TTSCache]: {len(phrases) - len(failed)}/{len(phrases)} fixed phrases ready "
+              f"({len(missing) - len(failed)} newly synthesized).")
+        return failed
+
+    def metrics(self):
+        with self._lock:
+            snapshot = dict(self._metrics)
+            snapshot["entries"] = len(self._entries)
+            snapshot["bytes"] = self._bytes
+            snapshot["pinned"] = len(self._pinned)
+        return snapshot
+
+    def _store(self, key, audio_data):
+        # Caller holds self._lock
+        if len(audio_data) > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= len(previous)
+        self._entries[key] = audio_data
+        self._bytes += len(audio_data)
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+            self._metrics["evictions"] += 1
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], f"{key}.audio")
+
+    def _read_from_disk(self, key):
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._disk_path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            print(f"[TTSCache]: Could not read cached audio: {e}")
+            return None
+
+    def _write_to_disk(self, key, audio_data):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        if os.path.exists(path):
+            return
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temp file first so readers never see a half-written clip
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(audio_data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"[TTSCache]: Could not write cached audio: {e}")
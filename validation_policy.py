@@ -0,0 +1,115 @@
+import random
+import threading
+from abc import ABC, abstractmethod
+from functools import lru_cache
+
+from crisis_detector import normalize_arabic
+
+# --- Validation policies ---
+# Claude Opus validation is the slowest and most expensive call in a turn.
+# A policy decides, per turn, whether the GPT-4o reply is validated before
+# the turn completes ("blocking"), after the reply has been played with any
+# enhancement queued as a follow-up segment ("deferred"), or not at all ("skip").
+# Turns that look crisis-adjacent always get blocking validation.
+
+BLOCKING = "blocking"
+DEFERRED = "deferred"
+SKIP = "skip"
+
+# Minimal default risk vocabulary; pass a better `risk_scorer` to the policy where available
+DEFAULT_RISK_TERMS = [
+    "انتحر", "انتحار", "اقتل نفسي", "اذي نفسي", "اموت", "الموت", "ابغى اموت", "ودي اموت",
+    "اختفي", "ما في امل", "مافي امل", "يأس", "ياس", "مخدرات", "حبوب", "9999", "24 607 555",
+    "suicide", "kill myself", "hurt myself", "self harm", "self-harm", "want to die", "end it all",
+    "hopeless", "overdose",
+]
+
+@lru_cache(maxsize=8)
+def _normalized_terms(risk_terms):
+    return tuple(normalize_arabic(term) for term in risk_terms)
+
+
+def contains_risk_terms(text, risk_terms=DEFAULT_RISK_TERMS):
+    """Substring match after the crisis detector's normalization, so the same spelling variants are caught."""
+    normalized = normalize_arabic(text)
+    return any(term in normalized for term in _normalized_terms(tuple(risk_terms)))
+
+
+class ValidationPolicy(ABC):
+    """
+    Base policy. Subclasses implement `routine_decision` for turns that are not risky;
+    risky turns are always validated in full.
+    """
+
+    name = "base"
+
+    def __init__(self, risk_scorer=contains_risk_terms):
+        self.risk_scorer = risk_scorer
+        self._lock = threading.Lock()
+        self._decisions = {BLOCKING: 0, DEFERRED: 0, SKIP: 0, "risky": 0}
+
+    def decide(self, user_text, reply_text):
+        risky = self.risk_scorer(user_text) or self.risk_scorer(reply_text)
+        decision = BLOCKING if risky else self.routine_decision()
+        with self._lock:
+            self._decisions[decision] += 1
+            if risky:
+                self._decisions["risky"] += 1
+        return decision
+
+    @abstractmethod
+    def routine_decision(self):
+        """BLOCKING, DEFERRED or SKIP for a turn that is not risky."""
+
+    def metrics(self):
+        with self._lock:
+            return {"mode": self.name, **self._decisions}
+
+
+class AlwaysValidate(ValidationPolicy):
+    """The original behaviour: every reply waits for validation."""
+    name = "always"
+
+    def routine_decision(self):
+        return BLOCKING
+
+
+class SampledValidation(ValidationPolicy):
+    """Validates a random fraction of routine turns, e.g. for quality monitoring."""
+    name = "sampled"
+
+    def __init__(self, sample_rate=0.2, risk_scorer=contains_risk_terms, rng=random.random):
+        super().__init__(risk_scorer)
+        self.sample_rate = sample_rate
+        self.rng = rng
+
+    def routine_decision(self):
+        return BLOCKING if self.rng() < self.sample_rate else SKIP
+
+
+class RiskGatedValidation(ValidationPolicy):
+    """Only risky turns are validated."""
+    name = "risk_gated"
+
+    def routine_decision(self):
+        return SKIP
+
+
+class AsyncValidation(ValidationPolicy):
+    """Routine turns are validated after playback; enhancements become a follow-up segment."""
+    name = "async"
+
+    def routine_decision(self):
+        return DEFERRED
+
+
+VALIDATION_POLICIES = {
+    policy.name: policy
+    for policy in (AlwaysValidate, SampledValidation, RiskGatedValidation, AsyncValidation)
+}
+
+
+def create_validation_policy(mode, **kwargs):
+    if mode not in VALIDATION_POLICIES:
+        raise ValueError(f"Unknown validation mode '{mode}', expected one of {sorted(VALIDATION_POLICIES)}")
+    return VALIDATION_POLICIES[mode](**kwargs)